@@ -0,0 +1,197 @@
+# CacheIntervals: Memoization with interval parameters
+#
+# Copyright (C) Cyril Godart
+#
+# This file is part of CacheIntervals.
+#
+# @author = 'Cyril Godart'
+# @email = 'cyril.godart@gmail.com'
+'''
+Benchmarks of the planning and of the cached reads of MemoizationWithIntervals,
+on a table with the layout of test1 built by SetupTests.py, or generated.
+For each workload, each interval recorder and each of their strategies
+of reuse of the intervals stored, reports:
+- the overhead per call: the time spent binding, planning, looking up
+  the cache and aggregating, i.e. everything but fetching;
+- the throughput in requests and in rows per second;
+- the peak of the memory allocated, measured by tracemalloc in a second run.
+    python Ancillaries/Benchmarks.py --rows 1000000 --calls 200 --csv benchmarks.csv
+'''
+import argparse
+import itertools
+import random
+import sqlite3
+import time
+import tracemalloc
+
+import klepto
+import numpy as np
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals, Metrics
+from CacheIntervals.KeyMaps import FastKeyMap
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+start_year = pd.Timestamp(2021, 1, 1)
+end_year = pd.Timestamp(2022, 1, 1)
+day = pd.Timedelta(days=1)
+recorders = {
+    'portion': RecordIntervalsPandas,
+    'indexed': RecordIntervalsIndexedPandas,
+    'numpy': RecordIntervalsNumpy,
+}
+# the parameters of the recorders selecting the strategy
+strategies = {
+    'default': {},
+    'subintervals': {'subintervals_requiredQ': True},
+    'subintervals min': {'subintervals_requiredQ': True, 'subinterval_minQ': True},
+}
+
+
+def generate_table(conn, n_rows, name_table='test1', seed=0):
+    '''
+    Write a table with the columns of test1, dates over 2021
+    :param conn: a sqlite3 connection
+    :param n_rows: the number of rows
+    '''
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, int((end_year - start_year).total_seconds()), n_rows))
+    df = pd.DataFrame({
+        'date': (start_year + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'currency': rng.choice(['EUR', 'JPY', 'CNH', 'USD'], n_rows),
+        'amount_in_eur': rng.integers(1, 10_000, n_rows),
+    })
+    df.to_sql(name_table, conn, if_exists='replace')
+    conn.execute(f'Create index if not exists ix_{name_table}_date on {name_table} (date)')
+
+
+def get_records(conn, name_table, key=None, n_keys=1, period=pd.Interval(start_year, start_year + 30 * day)):
+    '''
+    The rows of a period, for the rows of a key if not None
+    '''
+    query = f"Select date, currency, amount_in_eur From {name_table} " \
+            f"Where date > '{period.left}' and date <= '{period.right}'"
+    if key is not None:
+        query += f" and amount_in_eur % {n_keys} = {key}"
+    df = pd.read_sql(query + ' Order by date', conn)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+#                Workloads: lists of pairs (key, period)
+def sliding(n_calls, width=30):
+    return [(None, pd.Interval(start_year + k * day, start_year + (k + width) * day)) for k in range(n_calls)]
+
+
+def expanding(n_calls):
+    return [(None, pd.Interval(start_year, start_year + (k + 1) * day)) for k in range(n_calls)]
+
+
+def random_ranges(n_calls, seed=0):
+    draw = random.Random(seed)
+    calls = []
+    for _ in range(n_calls):
+        lower = draw.randrange(0, 360)
+        calls.append((None, pd.Interval(start_year + lower * day,
+                                        start_year + draw.randrange(lower + 1, 366) * day)))
+    return calls
+
+
+def many_keys(n_calls, n_keys=50, seed=0):
+    draw = random.Random(seed)
+    calls = []
+    for _ in range(n_calls):
+        lower = draw.randrange(0, 330)
+        calls.append((draw.randrange(n_keys), pd.Interval(start_year + lower * day,
+                                                          start_year + (lower + draw.randrange(1, 35)) * day)))
+    return calls
+
+
+workloads = {
+    'sliding': sliding,
+    'expanding': expanding,
+    'random': random_ranges,
+    'many keys': many_keys,
+}
+
+
+def run(conn, classrecorder, strategy, calls, n_keys=50):
+    '''
+    Serve the calls from a new memoization
+    :param strategy: the parameters of the recorders, see strategies
+    :return: the Metrics of the memoization, the rows served
+             and the wall clock time
+    '''
+    metrics = Metrics()
+    get_records_cached = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=pd.concat,
+        trim_on='date',
+        memoization=klepto.inf_cache(cache=klepto.archives.dict_archive(), keymap=FastKeyMap()),
+        metrics=metrics,
+        **strategy)(get_records)
+    rows = 0
+    start = time.perf_counter()
+    for key, period in calls:
+        rows += len(get_records_cached(conn, 'test1', key, n_keys, period))
+    return metrics, rows, time.perf_counter() - start
+
+
+def benchmark(conn, n_calls):
+    '''
+    :return: a DataFrame of the measures, by workload, recorder and strategy
+    '''
+    measures = []
+    for name_workload, workload in workloads.items():
+        calls = workload(n_calls)
+        for (name_recorder, classrecorder), (name_strategy, strategy) in \
+                itertools.product(recorders.items(), strategies.items()):
+            metrics, rows, seconds = run(conn, classrecorder, strategy, calls)
+            latencies = metrics.latencies()
+            info = metrics.info()
+            overhead = sum(latencies[stage].total for stage in ['bind', 'plan', 'lookup', 'aggregate'])
+            tracemalloc.start()
+            run(conn, classrecorder, strategy, calls)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            measures.append({
+                'workload': name_workload,
+                'recorder': name_recorder,
+                'strategy': name_strategy,
+                'overhead per call (us)': 1e6 * overhead / n_calls,
+                'plan per call (us)': 1e6 * latencies['plan'].total / n_calls,
+                'plan p99 (us)': 1e6 * latencies['plan'].p99,
+                'fetch (s)': latencies['fetch'].total,
+                'requests per s': n_calls / seconds,
+                'rows per s': rows / seconds,
+                'coverage': info.coverage,
+                'misses': info.misses,
+                'peak memory (MB)': peak / 2 ** 20,
+            })
+    return pd.DataFrame(measures).set_index(['workload', 'recorder', 'strategy'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of MemoizationWithIntervals')
+    parser.add_argument('--db', default=None,
+                        help='the sqlite file with the test1 table of SetupTests.py, '
+                             'by default a table generated in memory')
+    parser.add_argument('--rows', type=int, default=100_000, help='the number of rows generated')
+    parser.add_argument('--calls', type=int, default=100, help='the number of calls of each workload')
+    parser.add_argument('--csv', default=None, help='a file to write the measures to')
+    options = parser.parse_args()
+
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+    if options.db is not None:
+        conn = sqlite3.connect(options.db)
+    else:
+        conn = sqlite3.connect(':memory:')
+        generate_table(conn, options.rows)
+    measures = benchmark(conn, options.calls)
+    print(measures.round(2))
+    if options.csv is not None:
+        measures.to_csv(options.csv)
@@ -0,0 +1,215 @@
+import functools
+import threading
+
+import pandas as pd
+import portion
+
+from CacheIntervals.Intervals import interval_bounds
+
+
+class AggregateTree:
+    '''
+    A segment tree of the partial aggregates of the buckets of a grid,
+    indexed by their integer positions, with no bound on them.
+    The node of level l and index j holds the aggregate of the buckets
+    j * 2 ** l to (j + 1) * 2 ** l excluded, and exists only when all of
+    them are stored: a range of buckets is the combination of the nodes
+    of its decomposition in such dyadic blocks, O(log n) of them,
+    whatever the number of buckets. The buckets missing are found by
+    descending from the blocks that are not stored.
+    The aggregation only needs to be associative: the nodes are combined
+    in the order of the buckets.
+    '''
+
+    def __init__(self, combine):
+        '''
+        :param combine: the function of two aggregates returning the
+               aggregate of their buckets, e.g. DataFrame.add
+        '''
+        self.combine = combine
+        # (level, index) -> aggregate
+        self.nodes = {}
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        with self.lock:
+            return sum(1 for level, _ in self.nodes if level == 0)
+
+    def add(self, k, value):
+        '''
+        Store the aggregate of a bucket and of the blocks it completes
+        :param k: the position of the bucket
+        :param value: its aggregate
+        '''
+        with self.lock:
+            self.nodes[(0, k)] = value
+            level, index = 0, k
+            while (level, index ^ 1) in self.nodes:
+                left, right = (index, index ^ 1) if index % 2 == 0 else (index ^ 1, index)
+                value = self.combine(self.nodes[(level, left)], self.nodes[(level, right)])
+                level, index = level + 1, index >> 1
+                self.nodes[(level, index)] = value
+
+    def remove(self, k):
+        '''
+        Forget the aggregate of a bucket and of the blocks including it
+        '''
+        with self.lock:
+            level = 0
+            while self.nodes.pop((level, k >> level), None) is not None:
+                level += 1
+
+    @staticmethod
+    def blocks(a, b):
+        '''
+        :return: the decomposition of the positions a to b excluded
+                 in dyadic blocks (level, index), in order
+        '''
+        blocks = []
+        while a < b:
+            level = 0
+            while a % 2 ** (level + 1) == 0 and a + 2 ** (level + 1) <= b:
+                level += 1
+            blocks.append((level, a >> level))
+            a += 2 ** level
+        return blocks
+
+    def query(self, a, b):
+        '''
+        :param a, b: the positions of the first bucket and
+               of the bucket after the last one
+        :return: the aggregate of the buckets stored in the range,
+                 None if none is, and the positions of those missing
+        '''
+        parts = []
+        missing = []
+
+        def visit(level, index):
+            if (level, index) in self.nodes:
+                parts.append(self.nodes[(level, index)])
+            elif level == 0:
+                missing.append(index)
+            else:
+                visit(level - 1, 2 * index)
+                visit(level - 1, 2 * index + 1)
+
+        with self.lock:
+            for level, index in self.blocks(a, b):
+                visit(level, index)
+        if len(parts) == 0: return None, missing
+        return functools.reduce(self.combine, parts), missing
+
+
+class PartialAggregates:
+    '''
+    The aggregation-aware mode of MemoizationWithIntervals, passed as
+    its partials parameter, for functions returning an aggregate over
+    their interval, e.g. sums by group, whose aggregates over adjacent
+    intervals combine associatively, e.g. by DataFrame.add.
+    The interval is cut in buckets of a fixed width: the aggregate of
+    each bucket is fetched once, by a call of its own, and stored in
+    an AggregateTree by set of the other arguments. A request is then
+    served by combining O(log n) nodes of the tree rather than the
+    aggregates of all its buckets. The intervals requested must be
+    aligned on the grid and half-open, closed on the left or on the
+    right: the buckets are then closed as the interval requested, and
+    adjacent buckets share no bound. The intervals closed on the left
+    and those closed on the right have trees of their own.
+    Buckets of whole days of tz-aware dates are cut on the wall clock
+    of the time zone of the intervals: they start at local midnight
+    and the days of the changes of daylight saving time last 23 or
+    25 hours. Shorter buckets are cut on the absolute time.
+    '''
+
+    def __init__(self, width, combine=lambda x, y: x.add(y, fill_value=0), origin=None):
+        '''
+        :param width: the width of the buckets, an integer for integer
+               intervals, a Timedelta or its alias for dates, e.g. 'D'
+        :param combine: the function of the aggregates of two adjacent
+               intervals returning the aggregate of their union
+        :param origin: a point of the grid, by default 0 or the epoch,
+               read on the wall clock for buckets of whole days
+        '''
+        if isinstance(width, str):
+            width = pd.Timedelta(pd.tseries.frequencies.to_offset(width).nanos)
+        self.width = width if isinstance(width, int) else pd.Timedelta(width)
+        self.combine = combine
+        self.origin = origin
+        self.dailyQ = not isinstance(self.width, int) and self.width % pd.Timedelta(days=1) == pd.Timedelta(0)
+
+    def tree(self):
+        return AggregateTree(self.combine)
+
+    def zero(self, value):
+        if self.origin is not None: return self.wall(self.origin)
+        if isinstance(self.width, int): return 0
+        return pd.Timestamp(0, tz=getattr(value, 'tz', None))
+
+    def wall(self, value):
+        '''
+        :param value: a bound of an interval
+        :return: the bound on the grid: a tz-aware date is
+                 its local time for buckets of whole days
+        '''
+        if self.dailyQ and getattr(value, 'tz', None) is not None:
+            return value.tz_localize(None)
+        return value
+
+    @staticmethod
+    def closed(i):
+        '''
+        :param i: a pandas interval or an atomic portion interval
+        :return: 'left' or 'right', the side on which it is closed
+        '''
+        _, _, closed_left, closed_right = interval_bounds(i)
+        if closed_left == closed_right:
+            raise Exception(f'The interval {i} is not half-open: its buckets would share their bounds')
+        return 'left' if closed_left else 'right'
+
+    def positions(self, i):
+        '''
+        :param i: a half-open pandas interval or atomic portion interval
+        :return: the positions of its first bucket and of the
+                 bucket following its last one
+        '''
+        self.closed(i)
+        lower, upper, _, _ = interval_bounds(i)
+        lower, upper = self.wall(lower), self.wall(upper)
+        a, rest_lower = divmod(lower - self.zero(lower), self.width)
+        b, rest_upper = divmod(upper - self.zero(upper), self.width)
+        if rest_lower or rest_upper:
+            raise Exception(f'The interval {i} is not aligned on the buckets of width {self.width}')
+        return int(a), int(b)
+
+    def bucket(self, i, k):
+        '''
+        :param i: an interval requested
+        :param k: the position of a bucket
+        :return: the interval of the bucket, closed as i
+        '''
+        tz = getattr(interval_bounds(i)[0], 'tz', None)
+        lower = self.zero(self.wall(interval_bounds(i)[0])) + k * self.width
+        upper = lower + self.width
+        if self.dailyQ and tz is not None:
+            lower, upper = lower.tz_localize(tz), upper.tz_localize(tz)
+        if isinstance(i, pd.Interval):
+            return pd.Interval(lower, upper, closed=i.closed)
+        return portion.Interval.from_atomic(i.left, lower, upper, i.right)
+
+
+if __name__ == "__main__":
+    tree = AggregateTree(lambda x, y: x + y)
+    for k in range(-3, 13):
+        if k != 6: tree.add(k, k)
+    print(AggregateTree.blocks(-3, 13))
+    print(tree.query(-3, 13))
+    print(tree.query(0, 6))
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import os
+import time
+import weakref
+
+from CacheIntervals.MemoizationIntervals import MemoizationWithIntervals
+
+
+class AsyncMemoizationWithIntervals(MemoizationWithIntervals):
+    '''
+    The counterpart of MemoizationWithIntervals for coroutine
+    functions, e.g. async data loaders.
+    The calls are planned with the same interval recorders.
+    The intervals already cached are served directly, while the
+    missing ones are awaited concurrently, then stored in the cache.
+    A call already being awaited by another request of the same
+    event loop is not made again: its result is awaited instead.
+    The decorated function is itself a coroutine function.
+    '''
+
+    def __init__(self,
+                 *args,
+                 max_concurrency=None,
+                 **kwargs):
+        '''
+        :param max_concurrency: if not None, the maximum number
+               of calls to the function awaited at the same time,
+               over all the requests served by the decorated function
+               in an event loop
+        see MemoizationWithIntervals for the other parameters
+        '''
+        super().__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency
+        # a semaphore is bound to the loop it is first awaited in:
+        # event loop -> its semaphore, forgotten with the loop
+        self.semaphores = weakref.WeakKeyDictionary()
+        # event loop -> the futures of the calls being fetched, by key
+        self.inflight = weakref.WeakKeyDictionary()
+
+    async def flight(self, f, f_cached, call):
+        '''
+        Fetch a call missing the cache and store its result,
+        unless the same call is being fetched in the event loop,
+        whose result is then awaited, as SingleFlight does
+        :param f: the coroutine function memoized
+        :param f_cached: the memoized function
+        :param call: a pair args, kwargs
+        :return: the result of the call
+        '''
+        loop = asyncio.get_running_loop()
+        key = f_cached.key(*call[0], **call[1])
+        with self.lock:
+            inflight = self.inflight.setdefault(loop, {})
+        future = inflight.get(key)
+        if future is not None:
+            # shielded: a request cancelled does not cancel the others
+            return await asyncio.shield(future)
+        # the call may have been stored since it was planned
+        if self.cachedQ(f_cached, call):
+            return self.lookup(f_cached, call)
+        future = inflight[key] = loop.create_future()
+        try:
+            result = self.store(f_cached, call, await self.fetch(f, call))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieved, even if no other request awaits it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del inflight[key]
+
+    async def fetch(self, f, call):
+        '''
+        Await a call to the function, within the concurrency limit
+        :param f: the coroutine function memoized
+        :param call: a pair args, kwargs
+        '''
+        if self.max_concurrency is None:
+            return await self.timed(f, call)
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            semaphore = self.semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            return await self.timed(f, call)
+
+    async def timed(self, f, call):
+        '''
+        Await a call, measuring its duration for
+        the cost model of the coalescing of the gaps
+        '''
+        if self.coalescing is None or not self.coalescing.measuredQ():
+            return await f(*call[0], **call[1])
+        start = time.perf_counter()
+        result = await f(*call[0], **call[1])
+        self.observe(call, time.perf_counter() - start)
+        return result
+
+    def __call__(self, f):
+        '''
+        :param f: the coroutine function to memoize
+        :return: the coroutine wrapper to the memoized function
+        '''
+        f_cached = self.memoize(f)
+        if not hasattr(f_cached, 'key') or not hasattr(f_cached, '__cache__'):
+            raise Exception('The memoization of a coroutine function must give access to its cache and keys')
+        if self.partials is not None:
+            raise Exception('The partial aggregates are not available for coroutine functions')
+        if self.prefetching is not None:
+            raise Exception('The prefetching is not available for coroutine functions')
+        if self.index_path is not None and os.path.exists(self.index_path):
+            self.load_index(f_cached)
+
+        async def wrapper(*args, **kwargs):
+            if kwargs.get('get_function_cachedQ', False):
+                return f_cached
+            # planning and serving the cached intervals happen
+            # without awaiting: no other request can interleave
+            request = self.metrics.request() if self.metrics is not None else None
+            calls = self.plan(f_cached, args, kwargs, request)
+            if request is not None: start = time.perf_counter()
+            results = [None] * len(calls)
+            misses = []
+            for k, call in enumerate(calls):
+                if self.cachedQ(f_cached, call):
+                    results[k] = self.lookup(f_cached, call)
+                else:
+                    misses.append(k)
+            if request is not None: start = request.lap('lookup', start)
+            fetched = await asyncio.gather(*[self.flight(f, f_cached, calls[k]) for k in misses])
+            for k, result in zip(misses, fetched):
+                results[k] = result
+            if request is not None: request.lap('fetch', start)
+            if self.index_path is not None and self.dirtyQ:
+                self.save_index()
+            if self.compact_above is not None and len(calls) > self.compact_above:
+                self.compact(f_cached, backgroundQ=True)
+            if request is not None: start = time.perf_counter()
+            results = self.trim(args, kwargs, results)
+            if request is not None:
+                # the rows served are those within the intervals requested
+                for k, result in enumerate(results):
+                    request.served(result, k not in misses)
+                request.coverage = self.coverage(calls, set(misses), self.binder.bind(*args, **kwargs)[2])
+            result = self.aggregation(results)
+            if request is not None:
+                request.lap('aggregate', start)
+                self.metrics.commit(request)
+            return result
+
+        wrapper.metrics = self.metrics
+        wrapper.compact = functools.partial(self.compact, f_cached)
+        wrapper.close = self.close
+        return wrapper
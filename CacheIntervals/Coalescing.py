@@ -0,0 +1,151 @@
+import threading
+
+from CacheIntervals.Intervals import interval_bounds, interval_length
+
+
+def as_length(width):
+    '''
+    :param width: a length, e.g. a number or a Timedelta
+    :return: the float length, in seconds for Timedeltas,
+             as interval_length
+    '''
+    if hasattr(width, 'total_seconds'): return width.total_seconds()
+    return float(width)
+
+
+def contiguousQ(i, j):
+    '''
+    :param i, j: two intervals, i before j
+    :return: whether j starts where i ends, without a gap
+    '''
+    _, upper, _, closed_right = interval_bounds(i)
+    lower, _, closed_left, _ = interval_bounds(j)
+    return upper > lower or (upper == lower and (closed_right or closed_left))
+
+
+class GapCoalescing:
+    '''
+    A cost model of the calls to a function memoized with intervals,
+    passed as the coalescing parameter of MemoizationWithIntervals.
+    A call costs a fixed overhead, e.g. a database round trip, plus
+    a cost per unit of width of its interval. Two gaps separated by
+    intervals already cached are fetched by a single call spanning
+    them when refetching the cached intervals in between costs less
+    than a call: their width times the cost per unit is below the
+    overhead. The interval recorder then stores the span fetched and
+    the intervals cached in between are removed from the cache.
+    The costs are either configured or, if None, measured by a linear
+    regression of the duration of the calls on their width. Until
+    min_samples calls are measured, gaps are not coalesced.
+    '''
+
+    def __init__(self, per_call=None, per_unit=None, unit=1, max_island=None, min_samples=8):
+        '''
+        :param per_call: the fixed cost of a call, e.g. in seconds,
+               None to measure it
+        :param per_unit: the cost of a call per unit of width of
+               its interval, None to measure it
+        :param unit: the unit of width, e.g. pd.Timedelta(days=1)
+        :param max_island: if not None, the widest interval cached
+               fetched again to join two gaps, whatever the costs
+        :param min_samples: the number of calls measured before
+               the costs measured are used
+        '''
+        self.per_call = per_call
+        self.per_unit = per_unit
+        self.unit = as_length(unit)
+        self.max_island = as_length(max_island) if max_island is not None else None
+        self.min_samples = min_samples
+        # the sums of the linear regression of the durations on the widths
+        self.n = 0
+        self.sum_width = 0.
+        self.sum_seconds = 0.
+        self.sum_width2 = 0.
+        self.sum_width_seconds = 0.
+        self.lock = threading.Lock()
+
+    def measuredQ(self):
+        '''
+        :return: whether the durations of the calls are measured
+        '''
+        return self.per_call is None or self.per_unit is None
+
+    def observe(self, width, seconds):
+        '''
+        Account for the duration of a call
+        :param width: the length of its interval
+        :param seconds: its duration
+        '''
+        width = width / self.unit
+        with self.lock:
+            self.n += 1
+            self.sum_width += width
+            self.sum_seconds += seconds
+            self.sum_width2 += width * width
+            self.sum_width_seconds += width * seconds
+
+    def costs(self):
+        '''
+        :return: the cost of a call and the cost per unit of width,
+                 those configured or measured, or None if not known yet
+        '''
+        if not self.measuredQ(): return self.per_call, self.per_unit
+        with self.lock:
+            n = self.n
+            if n < self.min_samples: return None
+            variance = n * self.sum_width2 - self.sum_width ** 2
+            if variance <= 0:
+                per_unit = 0.
+            else:
+                per_unit = max(0., (n * self.sum_width_seconds - self.sum_width * self.sum_seconds) / variance)
+            per_call = max(0., (self.sum_seconds - per_unit * self.sum_width) / n)
+        return (self.per_call if self.per_call is not None else per_call,
+                self.per_unit if self.per_unit is not None else per_unit)
+
+    def __call__(self, tiles, missesQ, max_width=None):
+        '''
+        :param tiles: the sorted intervals planned for a request,
+               gaps and intervals cached
+        :param missesQ: whether each of them is a gap
+        :param max_width: if not None, the maximum width of a call,
+               e.g. the max_width of the recorder
+        :return: the tiles grouped in lists of indices: a group of
+                 more than one tile is a single call of their span
+        '''
+        max_width = as_length(max_width) if max_width is not None else None
+        groups = [[k] for k in range(len(tiles))]
+        costs = self.costs()
+        if costs is None: return groups
+        per_call, per_unit = costs
+        coalesced = []
+        # the tiles cached since the last gap
+        islands = []
+        for k in range(len(tiles)):
+            if k and not contiguousQ(tiles[k - 1], tiles[k]):
+                coalesced.extend([k_island] for k_island in islands)
+                islands = []
+                coalesced.append([k])
+                continue
+            if not missesQ[k]:
+                islands.append(k)
+                continue
+            previous = coalesced[-1] if len(coalesced) else []
+            width = sum(interval_length(tiles[k_island]) for k_island in islands) / self.unit
+            if len(previous) and missesQ[previous[-1]] and per_unit * width < per_call and \
+                    (self.max_island is None or width * self.unit <= self.max_island) and \
+                    (max_width is None or self.span(tiles[previous[0]], tiles[k]) <= max_width):
+                previous.extend(islands + [k])
+            else:
+                coalesced.extend([k_island] for k_island in islands)
+                coalesced.append([k])
+            islands = []
+        coalesced.extend([k_island] for k_island in islands)
+        return coalesced
+
+    @staticmethod
+    def span(first, last):
+        '''
+        :return: the length of the span from an interval to a later one
+        '''
+        length = interval_bounds(last)[1] - interval_bounds(first)[0]
+        return as_length(length)
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from klepto.tools import CacheInfo
+
+from CacheIntervals.KeyMaps import FastKeyMap
+from CacheIntervals.Intervals import interval_bounds
+
+
+def as_table(result):
+    '''
+    :param result: a DataFrame or an Arrow table
+    :return: the Arrow table, converted, i.e. copied, from a DataFrame
+    '''
+    if isinstance(result, pd.DataFrame):
+        return pa.Table.from_pandas(result, preserve_index=False)
+    return result
+
+
+def concat_tables(results):
+    '''
+    An aggregation of the Arrow tables of the calls, passed as the
+    aggregation parameter of MemoizationWithIntervals: the result is
+    a table whose columns are chunked on the buffers of the tables
+    aggregated, which are not copied, e.g. memory-mapped from the
+    files of a ColumnarCache. The DataFrames are converted first.
+    Converting the result with to_pandas is left to the caller.
+    :param results: the list of the results
+    :return: an Arrow table
+    '''
+    tables = [as_table(result) for result in results if result is not None]
+    if len(tables) == 0: raise Exception('Nothing to aggregate')
+    return pa.concat_tables(tables, promote_options='default')
+
+
+def trim_table(table, on, interval):
+    '''
+    Slice an Arrow table to the rows within an interval
+    :param table: an Arrow table
+    :param on: the name of the column holding the values
+    :param interval: a pandas or portion interval
+    :return: the rows of the table within the interval, a slice
+             sharing its buffers if the rows are contiguous,
+             e.g. sorted, a copy of them otherwise
+    '''
+    if on not in table.column_names:
+        raise Exception(f'No column named {on} to trim on')
+    lower, upper, closed_left, closed_right = interval_bounds(interval)
+    values = table[on]
+    inside = pc.and_(pc.greater_equal(values, lower) if closed_left else pc.greater(values, lower),
+                     pc.less_equal(values, upper) if closed_right else pc.less(values, upper))
+    count = pc.sum(inside).as_py() or 0
+    if count == 0: return table.slice(0, 0)
+    start = pc.index(inside, True).as_py()
+    if pc.all(inside.slice(start, count)).as_py():
+        return table.slice(start, count)
+    return table.filter(inside)
+
+
+class ColumnarStore:
+    '''
+    A dictionary-like store of the results of a function, keyed by
+    the keys of a keymap:
+    - the DataFrames are written as uncompressed Feather (Arrow IPC)
+      files, partitioned in sub-directories by the hash of their key,
+      and read back memory-mapped: the columns are not unpickled on
+      the heap but paged in from the file when used;
+    - the other values, e.g. lists, are kept in memory and are lost
+      with the process.
+    The interval recorders are not stored here: MemoizationWithIntervals
+    keeps them in a registry of its own, saved in its index_path
+    to plan against the files after a restart.
+    The key is saved in the metadata of each file, so that a store
+    opened on an existing directory finds the DataFrames written before.
+    Arrow tables are stored as well, and with arrowQ the files are read
+    back as Arrow tables rather than DataFrames.
+    '''
+
+    def __init__(self, directory, memory_mapQ=True, arrowQ=False):
+        '''
+        :param directory: the directory of the files
+        :param memory_mapQ: whether the files are read memory-mapped
+        :param arrowQ: whether the files are read as Arrow tables
+        '''
+        self.directory = directory
+        self.memory_mapQ = memory_mapQ
+        self.arrowQ = arrowQ
+        self.memory = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        '''
+        :param key: a key of the store
+        :return: the path of the file of a DataFrame stored with that key
+        '''
+        digest = hashlib.sha1((key if isinstance(key, str) else repr(key)).encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f'{digest}.feather')
+
+    def paths(self):
+        '''
+        :return: the paths of all the files in the store
+        '''
+        for partition in sorted(os.listdir(self.directory)):
+            path_partition = os.path.join(self.directory, partition)
+            if not os.path.isdir(path_partition): continue
+            for name in sorted(os.listdir(path_partition)):
+                if name.endswith('.feather'):
+                    yield os.path.join(path_partition, name)
+
+    def ondiskQ(self, key):
+        return os.path.exists(self.path(key))
+
+    def __contains__(self, key):
+        return key in self.memory or self.ondiskQ(key)
+
+    def __getitem__(self, key):
+        if key in self.memory: return self.memory[key]
+        try:
+            table = feather.read_table(self.path(key), memory_map=self.memory_mapQ)
+        except FileNotFoundError:
+            raise KeyError(key)
+        if self.arrowQ:
+            metadata = dict(table.schema.metadata)
+            del metadata[b'key']
+            return table.replace_schema_metadata(metadata)
+        # split_blocks avoids consolidating the columns,
+        # which would copy them out of the memory map
+        return table.to_pandas(split_blocks=True)
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, (pd.DataFrame, pa.Table)):
+            self.memory[key] = value
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(value) if isinstance(value, pd.DataFrame) else value
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'key'] = pickle.dumps(key)
+        table = table.replace_schema_metadata(metadata)
+        # readers never see a partially written file
+        path_tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        # a single chunk per column is read back without a copy
+        feather.write_feather(table, path_tmp, compression='uncompressed', chunksize=max(len(table), 1))
+        os.replace(path_tmp, path)
+
+    def __delitem__(self, key):
+        if key in self.memory:
+            del self.memory[key]
+            return
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def keys(self):
+        keys = list(self.memory)
+        for path in self.paths():
+            schema = pa.ipc.open_file(pa.memory_map(path)).schema
+            keys.append(pickle.loads(schema.metadata[b'key']))
+        return keys
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.memory) + len(list(self.paths()))
+
+    def archived(self):
+        # the files are the store itself, not an archive of it
+        return False
+
+    def clear(self):
+        for key in self.keys():
+            del self[key]
+
+
+class ColumnarCache:
+    '''
+    A memoization storing the DataFrames returned by a function
+    in a ColumnarStore. It is passed in place of the klepto
+    memoization to MemoizationWithIntervals, and gives the same
+    access to the memoized function: key, lookup, __cache__, info
+    and clear.
+    As the keys do not hold the function, each function
+    memoized needs its own directory.
+    There is no limit on the size of the store.
+    With arrowQ, the results are Arrow tables memory-mapped from the
+    files, also those just fetched, for concat_tables to aggregate
+    them without a copy.
+    '''
+
+    def __init__(self,
+                 directory,
+                 keymap=None,
+                 memory_mapQ=True,
+                 arrowQ=False):
+        '''
+        :param directory: the directory of the files
+        :param keymap: the keymap of the arguments,
+               by default a FastKeyMap as MemoizationWithIntervals
+        :param memory_mapQ: whether the files are read memory-mapped
+        :param arrowQ: whether the results are Arrow tables
+        '''
+        self.directory = directory
+        self.keymap = keymap if keymap is not None else FastKeyMap()
+        self.memory_mapQ = memory_mapQ
+        self.arrowQ = arrowQ
+
+    def __call__(self, user_function):
+        keymap = self.keymap
+        cache = ColumnarStore(self.directory, self.memory_mapQ, self.arrowQ)
+        stats = [0, 0, 0]
+        HIT, MISS, LOAD = 0, 1, 2
+        lock = threading.Lock()
+
+        def wrapper(*args, **kwds):
+            key = keymap(*args, **kwds)
+            try:
+                memoryQ = key in cache.memory
+                result = cache[key]
+                with lock:
+                    stats[HIT if memoryQ else LOAD] += 1
+            except KeyError:
+                result = user_function(*args, **kwds)
+                cache[key] = result
+                if self.arrowQ and key not in cache.memory:
+                    result = cache[key]
+                with lock:
+                    stats[MISS] += 1
+            return result
+
+        def key(*args, **kwds):
+            '''Get the cache key for the given *args,**kwds'''
+            return keymap(*args, **kwds)
+
+        def lookup(*args, **kwds):
+            '''Get the stored value for the given *args,**kwds'''
+            return cache[keymap(*args, **kwds)]
+
+        def info():
+            '''Report cache statistics'''
+            return CacheInfo(stats[HIT], stats[MISS], stats[LOAD], None, len(cache))
+
+        def clear(keepstats=False):
+            '''Clear the cache and the statistics'''
+            cache.clear()
+            if not keepstats:
+                stats[:] = [0, 0, 0]
+
+        wrapper.__wrapped__ = user_function
+        wrapper.key = key
+        wrapper.lookup = lookup
+        wrapper.info = info
+        wrapper.clear = clear
+        wrapper.__cache__ = lambda: cache
+        # the statistics are locked and the files replaced atomically:
+        # the hits are served concurrently
+        wrapper.threadsafeQ = True
+        return wrapper
+
+
+if __name__ == "__main__":
+    import logging
+    import tempfile
+    import daiquiri
+    import numpy as np
+    import pickle
+    from CacheIntervals import MemoizationWithIntervals
+    from CacheIntervals.utils.Timer import Timer
+
+    daiquiri.setup(logging.INFO)
+
+    #                Reading a large frame: pickle versus memory-mapped Feather
+    if True:
+        df = pd.DataFrame(np.random.randn(10_000_000, 4), columns=list('abcd'))
+        with tempfile.TemporaryDirectory() as directory:
+            store = ColumnarStore(directory)
+            store['frame'] = df
+            path_pickle = os.path.join(directory, 'frame.pkl')
+            with open(path_pickle, 'wb') as f:
+                pickle.dump(df, f)
+            with Timer() as timer_pickle:
+                with open(path_pickle, 'rb') as f:
+                    pickle.load(f)
+            with Timer() as timer_feather:
+                store['frame']
+            print(f'pickle {timer_pickle.interval:.3f}s, memory-mapped feather {timer_feather.interval:.3f}s')
+
+    #                Plugging into MemoizationWithIntervals
+    if True:
+        with tempfile.TemporaryDirectory() as directory:
+            @MemoizationWithIntervals(
+                [], ['period'],
+                aggregation=pd.concat,
+                memoization=ColumnarCache(directory))
+            def get_records(name, period=pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 1, 2))):
+                dates = pd.date_range(period.left, period.right, freq='h', inclusive='right')
+                return pd.DataFrame({'name': name, 'date': dates, 'value': np.arange(len(dates))})
+
+            get_records('A', pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1)))
+            print(get_records('A', pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 3, 1))))
+            print(get_records(get_function_cachedQ=True).info())
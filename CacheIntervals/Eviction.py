@@ -0,0 +1,78 @@
+import collections
+import threading
+
+from CacheIntervals.utils import sizeof
+
+BudgetInfo = collections.namedtuple('BudgetInfo', ['nbytes', 'max_bytes', 'size', 'evictions'])
+
+
+class ByteBudget:
+    '''
+    An eviction policy for MemoizationWithIntervals bounding the
+    size in bytes of the results stored, rather than their number
+    as klepto.lru_cache does: a one-row fragment and a ten-million-row
+    one do not weigh the same.
+    The least recently used results are evicted first.
+    The memoization evicting them from the cache also removes
+    their intervals from the interval recorders, so that only
+    the ranges evicted are fetched again.
+    '''
+
+    def __init__(self, max_bytes, sizeof=sizeof):
+        '''
+        :param max_bytes: the budget in bytes of the results stored
+        :param sizeof: the function measuring the size of a result,
+               by default DataFrame.memory_usage(deep=True)
+        '''
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> (size, call), least recently used first
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def add(self, key, result, call):
+        '''
+        Account for a result stored
+        :param key: the key of the result in the cache
+        :param result: the result
+        :param call: the pair args, kwargs of the result
+        :return: the calls to evict to remain within the budget,
+                 least recently used first. It may be the call added
+                 if its result alone exceeds the budget
+        '''
+        size = self.sizeof(result)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[0]
+            self.entries[key] = (size, call)
+            self.nbytes += size
+            evicted = []
+            while self.nbytes > self.max_bytes and len(self.entries):
+                _, (size_evicted, call_evicted) = self.entries.popitem(last=False)
+                self.nbytes -= size_evicted
+                evicted.append(call_evicted)
+            self.evictions += len(evicted)
+        return evicted
+
+    def touch(self, key):
+        '''
+        Mark a result as used
+        '''
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+    def remove(self, key):
+        '''
+        Stop accounting for a result removed from the cache
+        '''
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[0]
+
+    def info(self):
+        with self.lock:
+            return BudgetInfo(self.nbytes, self.max_bytes, len(self.entries), self.evictions)
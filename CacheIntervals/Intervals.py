@@ -1,6 +1,7 @@
 import portion as po
 import numpy as np
 import pandas as pd
+import pendulum as pdl
 
 def pd2po(i):
     '''
@@ -55,6 +56,79 @@ def po2pd(i):
     if closed is not None:
         return pd.Interval(left=left, right=right, closed=closed)
 
+def interval_bounds(i):
+    '''
+    :param i: a pandas interval or an atomic portion interval
+    :return: lower bound, upper bound, closed left, closed right
+    '''
+    if isinstance(i, pd.Interval):
+        return i.left, i.right, i.closed_left, i.closed_right
+    return infpo2np(i.lower), infpo2np(i.upper), i.left == po.CLOSED, i.right == po.CLOSED
+
+
+def interval_length(i):
+    '''
+    :param i: a pandas interval or an atomic portion interval
+    :return: its length as a float, in seconds for intervals of dates
+    '''
+    lower, upper, _, _ = interval_bounds(i)
+    length = upper - lower
+    if hasattr(length, 'total_seconds'): return length.total_seconds()
+    return float(length)
+
+
+def overlap_length(i, j):
+    '''
+    :param i, j: pandas intervals or atomic portion intervals
+    :return: the length of their intersection, see interval_length
+    '''
+    i, j = (pd2po(s) if isinstance(s, pd.Interval) else s for s in (i, j))
+    overlap = i & j
+    return 0. if overlap.empty else interval_length(overlap)
+
+
+def snap(value, bucket, upQ=False):
+    '''
+    Snap a bound to a grid
+    :param value: an integer, a Timestamp or a datetime
+    :param bucket: an integer for integers, a pandas offset or its
+           alias for dates, e.g. 'h', 'D', 'B' or 'MS'
+    :param upQ: if True, the first point of the grid at or after
+           the value, else the last one at or before it
+    :return: the point of the grid, of the type of the value
+    '''
+    if isinstance(value, (int, np.integer)):
+        return -(-value // bucket) * bucket if upQ else (value // bucket) * bucket
+    offset = pd.tseries.frequencies.to_offset(bucket)
+    ts = pd.Timestamp(value)
+    if isinstance(offset, pd.offsets.Tick):
+        snapped = ts.ceil(offset) if upQ else ts.floor(offset)
+    else:
+        # the points of calendar grids are midnights on offset
+        snapped = ts.normalize()
+        if not upQ:
+            snapped = offset.rollback(snapped)
+        elif snapped != ts or not offset.is_on_offset(snapped):
+            snapped = offset.rollforward(snapped + pd.offsets.Day(1))
+    if isinstance(value, pd.Timestamp): return snapped
+    if isinstance(value, pdl.DateTime): return pdl.instance(snapped.to_pydatetime())
+    return snapped.to_pydatetime()
+
+
+def snap_interval(i, bucket):
+    '''
+    :param i: a pandas interval or an atomic portion interval
+    :param bucket: see snap
+    :return: the interval with its bounds snapped outward to the grid
+    '''
+    if isinstance(i, pd.Interval):
+        return pd.Interval(snap(i.left, bucket), snap(i.right, bucket, upQ=True), closed=i.closed)
+    if i.empty: return i
+    lower = i.lower if i.lower == -po.inf else snap(i.lower, bucket)
+    upper = i.upper if i.upper == po.inf else snap(i.upper, bucket, upQ=True)
+    return po.Interval.from_atomic(i.left, lower, upper, i.right)
+
+
 
 if __name__ == "__main__":
     import logging
@@ -0,0 +1,213 @@
+import hashlib
+import itertools
+import threading
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+class FastKeyMap:
+    '''
+    A keymap for klepto memoizations building the cache keys
+    as tuples, without the str() of every argument done by
+    klepto.keymaps.stringmap on every lookup:
+    - ints, floats, strings... are kept as they are;
+      they are compared by value, as the keys of dictionaries;
+    - Timestamps are their int64 nanoseconds (and time zone),
+      Intervals the tuple of their encoded bounds and closedness;
+    - tuples, lists, dicts and sets are encoded item by item;
+    - DataFrames, Series and arrays by a digest of their content;
+    - objects compared by identity, e.g. database connections, by a
+      token given to each object seen, unless a token function is
+      registered for their type.
+    The tokens given to the objects are unique to the keymap: a
+    persistent cache or index_path needs a token function for these
+    types, the keys holding such tokens are never found again by
+    another process.
+    The keys are hashable but not strings: the archives
+    requiring string keys need a klepto keymap.
+    '''
+
+    def __init__(self, tokens=None):
+        '''
+        :param tokens: a dictionary from types to functions returning
+               the token of their instances in the keys, e.g. the path
+               of the database of a connection. Unlike the identity
+               tokens, they are the same across processes, for
+               persistent caches
+        '''
+        self.tokens = dict(tokens) if tokens is not None else {}
+        self.atoms = {int, float, str, bytes, type(None)}
+        self.encoders = {
+            # True and 1 are equal, but not as arguments
+            bool: self.encode_bool,
+            pd.Timestamp: self.encode_timestamp,
+            pd.Interval: self.encode_interval,
+            tuple: self.encode_tuple,
+            list: self.encode_list,
+            dict: self.encode_dict,
+            set: self.encode_set,
+            frozenset: self.encode_set,
+            pd.DataFrame: self.encode_pandas,
+            pd.Series: self.encode_pandas,
+            np.ndarray: self.encode_array,
+        }
+        # identity tokens are unique to this keymap: they cannot
+        # be mistaken for those of another process in a persistent cache
+        self.session = uuid.uuid4().hex
+        self.serials = itertools.count()
+        self.identities = weakref.WeakKeyDictionary()
+        # the encoders found for the other types
+        self.resolved = {}
+        # objects not supporting weak references are kept alive,
+        # not to have their id reused by another object
+        self.pinned = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwds):
+        encode = self.encode
+        return tuple(map(encode, args)), tuple([(name, encode(value)) for name, value in kwds.items()])
+
+    def register(self, cls, token):
+        '''
+        :param cls: a type
+        :param token: a function returning the token in the keys
+               of the instances of that type
+        '''
+        self.tokens[cls] = token
+        self.resolved.clear()
+
+    def encode(self, obj):
+        '''
+        :param obj: an argument
+        :return: its hashable encoding
+        '''
+        cls = type(obj)
+        if cls in self.atoms: return obj
+        encoder = self.encoders.get(cls) or self.resolved.get(cls) or self.resolve(cls)
+        return encoder(obj)
+
+    def resolve(self, cls):
+        '''
+        :param cls: a type without an encoder of its own
+        :return: the encoder of its instances, which is remembered
+        '''
+        encoder = None
+        for cls_token, token in self.tokens.items():
+            if issubclass(cls, cls_token):
+                encoder = lambda obj, name=cls_token.__qualname__, token=token: ('K', name, token(obj))
+                break
+        if encoder is None:
+            for cls_encoded, encoder_cls in self.encoders.items():
+                if issubclass(cls, cls_encoded):
+                    encoder = encoder_cls
+                    break
+        if encoder is None:
+            if cls.__eq__ is object.__eq__:
+                encoder = self.encode_weak if cls.__weakrefoffset__ else self.encode_pinned
+            elif cls.__hash__ is None:
+                encoder = self.encode_repr
+            else:
+                encoder = self.encode_hashable
+        self.resolved[cls] = encoder
+        return encoder
+
+    def encode_bool(self, b):
+        return 'B', b
+
+    def encode_timestamp(self, ts):
+        return 'T', ts.value, ts.tzinfo
+
+    def encode_interval(self, i):
+        left, right = i.left, i.right
+        if type(left) is pd.Timestamp:
+            return 'I', left.value, right.value, i.closed, left.tzinfo
+        return 'I', self.encode(left), self.encode(right), i.closed
+
+    # tagged as the other containers, ('L', ('a',)) not being ['a']
+    def encode_tuple(self, t):
+        return 't', tuple(map(self.encode, t))
+
+    def encode_list(self, l):
+        return 'L', tuple(map(self.encode, l))
+
+    # the items are sorted for the keys to be the
+    # same across processes, for persistent caches
+    def encode_dict(self, d):
+        return 'D', tuple(sorted(((self.encode(key), self.encode(value)) for key, value in d.items()), key=repr))
+
+    def encode_set(self, s):
+        return 'S', tuple(sorted(map(self.encode, s), key=repr))
+
+    def encode_pandas(self, obj):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        columns = tuple(map(self.encode, obj.columns)) if isinstance(obj, pd.DataFrame) else obj.name
+        return 'F', type(obj).__name__, columns, digest.hexdigest()
+
+    def encode_array(self, a):
+        if a.dtype == object:
+            return 'a', a.shape, tuple(map(self.encode, a.ravel()))
+        digest = hashlib.sha1(np.ascontiguousarray(a).tobytes())
+        return 'A', a.dtype.str, a.shape, digest.hexdigest()
+
+    def encode_weak(self, obj):
+        '''
+        :return: the token of an object compared by identity
+        '''
+        serial = self.identities.get(obj)
+        if serial is None:
+            with self.lock:
+                serial = self.identities.setdefault(obj, next(self.serials))
+        return 'O', type(obj).__qualname__, self.session, serial
+
+    def encode_pinned(self, obj):
+        '''
+        :return: the token of an object compared by identity,
+                 not supporting weak references
+        '''
+        entry = self.pinned.get(id(obj))
+        if entry is None:
+            with self.lock:
+                entry = self.pinned.setdefault(id(obj), (obj, next(self.serials)))
+        return 'O', type(obj).__qualname__, self.session, entry[1]
+
+    def encode_hashable(self, obj):
+        try:
+            hash(obj)
+        except TypeError:
+            return self.encode_repr(obj)
+        return obj
+
+    def encode_repr(self, obj):
+        return 'R', type(obj).__qualname__, repr(obj)
+
+
+if __name__ == "__main__":
+    import logging
+    import sqlite3
+    import timeit
+    import daiquiri
+    import klepto.keymaps
+
+    daiquiri.setup(logging.INFO)
+
+    #                Benchmark against klepto's stringmap
+    if True:
+        con = sqlite3.connect(':memory:')
+        period = pd.Interval(pd.Timestamp(2021, 1, 1, tz='UTC'), pd.Timestamp(2021, 1, 31, tz='UTC'))
+        calls = {
+            'connection and interval': ((con, 'test1', 'EUR'), {'period': period}),
+            'strings and integers': (('test1', 'EUR', 3), {'n': 10}),
+            'list of names': ((['EUR', 'USD', 'GBP', 'JPY'],), {'period': period}),
+        }
+        keymaps = {
+            'stringmap': klepto.keymaps.stringmap(typed=False, flat=False),
+            'FastKeyMap': FastKeyMap(),
+        }
+        n = 20_000
+        for name_call, (args, kwargs) in calls.items():
+            for name_keymap, keymap in keymaps.items():
+                t = timeit.timeit(lambda: keymap(*args, **kwargs), number=n)
+                print(f'{name_call:>24} {name_keymap:>10}: {1e6 * t / n:.2f}us per key')
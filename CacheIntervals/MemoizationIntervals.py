@@ -1,5 +1,15 @@
 import pendulum as pdl
+import pandas as pd
 import sys
+import threading
+import os
+import atexit
+import weakref
+import pickle
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(".")
 # the memoization-related library
@@ -16,15 +26,43 @@ import CacheIntervals as ci
 from CacheIntervals.utils import flatten
 from CacheIntervals.utils import pdl2pd, pd2pdl
 from CacheIntervals.utils import Timer
+from CacheIntervals.utils import Binder
+from CacheIntervals.utils import SingleFlight
+from CacheIntervals.utils import trim_frame
 
-from CacheIntervals.Intervals import pd2po, po2pd
+from CacheIntervals.Intervals import pd2po, po2pd, interval_length, overlap_length
 from CacheIntervals.RecordInterval  import RecordIntervals, RecordIntervalsPandas
+from CacheIntervals.KeyMaps import FastKeyMap
+from CacheIntervals.Registry import RecorderRegistry
 
 class QueryRecorder:
     '''
     A helper class
     '''
-    pass
+    # the keys of the interval recorders do not
+    # depend on the instance, nor on the process
+    def __repr__(self):
+        return 'QueryRecorder()'
+
+    def __eq__(self, other):
+        return isinstance(other, QueryRecorder)
+
+    def __hash__(self):
+        return hash(QueryRecorder)
+
+# marks the absence of a result fetched outside the memoized function
+NotFetched = object()
+
+
+def close_at_exit(reference):
+    '''
+    Save the index pending of a memoization still alive at exit
+    :param reference: a weak reference to the memoization
+    '''
+    memoization = reference()
+    if memoization is not None:
+        memoization.close()
+
 
 class MemoizationWithIntervals(object):
     '''
@@ -42,7 +80,7 @@ class MemoizationWithIntervals(object):
     With a new interval:
     -
     '''
-    keymapper = klepto.keymaps.stringmap(typed=False, flat=False)
+    keymapper = FastKeyMap()
 
     def __init__(self,
                  pos_args=None,
@@ -54,9 +92,18 @@ class MemoizationWithIntervals(object):
                  #     cache=klepto.archives.hdf_archive(
                  #         f'{pdl.today().to_date_string()}_memoization.hdf5'),
                  #     keymap=keymapper),
-                 memoization=klepto.lru_cache(
-                     cache=klepto.archives.dict_archive(),
-                     keymap=keymapper),
+                 memoization=None,
+                 max_workers=None,
+                 trim_on=None,
+                 compact_above=None,
+                 index_path=None,
+                 index_delay=1.,
+                 eviction=None,
+                 max_recorders=None,
+                 metrics=None,
+                 coalescing=None,
+                 partials=None,
+                 prefetching=None,
                  **kwargs):
         '''
 
@@ -65,8 +112,64 @@ class MemoizationWithIntervals(object):
             :param names_kwarg: the name of the named parameters
                      that will be handled as intervals
             :param classrecorder: the interval recorder type
-                                we want to use
-            :param memoization: a memoization algorithm
+                                we want to use. With RecordBoxes,
+                                a single recorder plans the boxes
+                                of all the interval parameters
+            :param memoization: a memoization algorithm, by default
+                   a klepto.lru_cache of its own
+            :param max_workers: if not None, the calls to
+                   the function not already cached are made
+                   concurrently by a pool of threads of that size
+            :param trim_on: if not None, the name of the column
+                   or of the index of the DataFrames returned
+                   on which each result is sliced to the interval
+                   requested. It trims the larger intervals stored
+                   of the default strategy. For several interval
+                   parameters, a dictionary from their positions
+                   or names to the columns
+            :param compact_above: if not None, a request split
+                   in more calls than this number triggers the
+                   compaction of the cache in the background
+            :param index_path: if not None, the file where the
+                   interval recorders are saved after new results
+                   are stored, and loaded from when decorating.
+                   It lets a persistent memoization be planned
+                   against after a restart. The arguments compared
+                   by identity, e.g. connections, need a token
+                   function registered in the FastKeyMap for their
+                   keys to be the same after the restart
+            :param index_delay: the seconds the index is saved after
+                   the first results stored since the last save, in
+                   the background: the results stored meanwhile are
+                   saved at once. The index pending is saved at exit
+                   or by close. With None, it is saved after each
+                   request storing results
+            :param eviction: if not None, an eviction policy, e.g.
+                   ByteBudget, deciding which results to evict from
+                   the cache when storing a new one. Their intervals
+                   are removed from the interval recorders
+            :param max_recorders: if not None, the maximum number
+                   of sets of non-interval arguments whose interval
+                   recorders are kept, the least recently used being
+                   dropped. They are kept apart from the results
+            :param metrics: if not None, a Metrics collecting the
+                   hits and misses, the rows and bytes served, the
+                   coverage and the latencies by stage of each request.
+                   Without it, the requests are not instrumented
+            :param coalescing: if not None, a GapCoalescing cost model
+                   deciding when gaps separated by intervals cached
+                   are fetched by a single call spanning them. It
+                   applies to functions with one interval parameter
+            :param partials: if not None, a PartialAggregates: the
+                   function returns an aggregate over its interval,
+                   fetched bucket by bucket and stored in a tree of
+                   partial aggregates combined for each request, in
+                   place of the memoization and of the aggregation.
+                   It applies to functions with one interval parameter
+            :param prefetching: if not None, a StridePrefetcher
+                   predicting the next intervals requested from the
+                   strides of the last ones, whose gaps are fetched
+                   and stored in the background
             '''
         # A dictionary of positional arguments indices
         # that are intervals
@@ -83,6 +186,11 @@ class MemoizationWithIntervals(object):
         #         self.kwargsi[namedarg] = classrecorder(**kwargs)
         self.names_kwargs_itvl = names_kwarg if names_kwarg is not None else {}
         #print(self.kwargs)
+        # the default memoization is created for each function: its
+        # keys do not include the function, one cache shared by all
+        # the functions decorated would mix their results
+        if memoization is None:
+            memoization = klepto.lru_cache(cache=klepto.archives.dict_archive(), keymap=self.keymapper)
         self.memoization = memoization
         self.aggregation = aggregation
         self.debugQ = debug
@@ -90,9 +198,791 @@ class MemoizationWithIntervals(object):
         self.kwargsdflt = None
         self.time_last_call = pdl.today()
         self.classrecorder = classrecorder
+        # whether a single recorder takes all the intervals
+        self.boxesQ = getattr(classrecorder, 'boxesQ', False)
         self.kwargsrecorder = kwargs
-        self.argssolver = None
         self.query_recorder = QueryRecorder()
+        # binds the calls, generated from the signature of the function
+        self.binder = None
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers) if max_workers is not None else None
+        # results fetched outside the memoized function
+        # and passed to it to be stored
+        self.fetched = threading.local()
+        # the memoized function is not thread-safe
+        self.lock = threading.RLock()
+        # concurrent fetches of a same call are coalesced
+        self.flights = SingleFlight()
+        if trim_on is not None and len(self.pos_args_itvl) + len(self.names_kwargs_itvl) == 0:
+            raise ValueError('trim_on requires an interval parameter to trim on')
+        if trim_on is not None and not isinstance(trim_on, dict):
+            first_interval = (list(self.pos_args_itvl) + list(self.names_kwargs_itvl))[0]
+            trim_on = {first_interval: trim_on}
+        self.trim_on = trim_on
+        self.compact_above = compact_above
+        # the compactions run one at a time in their own thread
+        self.compactor = None
+        self.compaction = None
+        # the interval recorders, by key of the non-interval
+        # arguments: they cannot be evicted with the results
+        self.index = RecorderRegistry(max_recorders)
+        self.index_path = index_path
+        self.index_delay = index_delay
+        # the saves are made one at a time, in order
+        self.index_lock = threading.Lock()
+        # the save pending, if any
+        self.index_timer = None
+        if index_path is not None:
+            atexit.register(close_at_exit, weakref.ref(self))
+        # whether results were stored since the index was saved
+        self.dirtyQ = False
+        # the recorders loaded from index_path, by key, until a request
+        # gives them the non-interval arguments, which are not saved
+        self.loaded = {}
+        self.eviction = eviction
+        self.metrics = metrics
+        self.coalescing = coalescing
+        self.partials = partials
+        # the trees of partial aggregates, by key
+        # of the non-interval arguments
+        self.trees = RecorderRegistry(max_recorders)
+        self.prefetching = prefetching
+
+    def trim(self, args, kwargs, results):
+        '''
+        Slice the results to the intervals requested
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :param results: the results of the calls
+        :return: the trimmed results
+        '''
+        if self.trim_on is None: return results
+        intervals = self.binder.bind(*args, **kwargs)[2]
+        for interval_param, on in self.trim_on.items():
+            interval = intervals[self.binder.slots.index((not isinstance(interval_param, int), interval_param))]
+            results = [trim_frame(result, on, interval) for result in results]
+        return results
+
+    @staticmethod
+    def introspectableQ(f_cached):
+        '''
+        :param f_cached: the memoized function
+        :return: whether the memoization gives access to
+                 its keys and its cache, as klepto's do
+        '''
+        return hasattr(f_cached, 'key') and hasattr(f_cached, '__cache__')
+
+    @staticmethod
+    def cachedQ(f_cached, call):
+        '''
+        :param f_cached: the memoized function
+        :param call: a pair of args, kwargs
+        :return: whether the call is a cache hit. Memoizations
+                 that cannot be introspected are assumed to hit.
+        '''
+        try:
+            key = f_cached.key(*call[0], **call[1])
+            cache = f_cached.__cache__()
+        except AttributeError:
+            return True
+        if key in cache: return True
+        return cache.archived() and key in cache.archive
+
+    def store(self, f_cached, call, result):
+        '''
+        Store in the cache a result fetched outside
+        the memoized function
+        :param f_cached: the memoized function
+        :param call: a pair of args, kwargs
+        :param result: the result of the call
+        :return: the cached result
+        '''
+        with self.lock:
+            self.dirtyQ = True
+            self.fetched.result = result
+            try:
+                result = f_cached(*call[0], **call[1])
+            finally:
+                self.fetched.result = NotFetched
+        if self.eviction is not None:
+            # outside the lock: the recorders are locked
+            # before the memoization by the compaction
+            for call_evicted in self.eviction.add(f_cached.key(*call[0], **call[1]), result, call):
+                self.evict(f_cached, call_evicted)
+        return result
+
+    def discard(self, f_cached, call):
+        '''
+        Remove a call from the cache and from its archive
+        '''
+        key = f_cached.key(*call[0], **call[1])
+        cache = f_cached.__cache__()
+        if self.eviction is not None:
+            self.eviction.remove(key)
+        with self.lock:
+            try:
+                del cache[key]
+            except KeyError:
+                pass
+            if cache.archived():
+                try:
+                    del cache.archive[key]
+                except KeyError:
+                    pass
+
+    def evict(self, f_cached, call):
+        '''
+        Remove a call from the cache and its intervals
+        from the interval recorders
+        '''
+        self.discard(f_cached, call)
+        args, kwargs = self.binder.call(call[0], call[1], [self.query_recorder] * len(self.binder.slots))
+        entry = self.index.peek(self.recorders_key(f_cached, args, kwargs))
+        if entry is None: return
+        args_with_ri, kwargs_with_ri = entry
+        if self.boxesQ:
+            self.box_recorder(args_with_ri, kwargs_with_ri).remove(self.box(call[0], call[1]))
+            return
+        for i in self.pos_args_itvl:
+            args_with_ri[i].remove(call[0][i])
+        for name in self.names_kwargs_itvl:
+            kwargs_with_ri[name].remove(call[1][name])
+
+    def observe(self, call, seconds):
+        '''
+        Account for the duration of a call in the cost
+        model of the coalescing of the gaps
+        '''
+        if len(self.binder.slots) != 1: return
+        namedQ, slot = self.binder.slots[0]
+        self.coalescing.observe(interval_length(call[1 if namedQ else 0][slot]), seconds)
+
+    def lookup(self, f_cached, call):
+        '''
+        Serve a call hitting the cache. The klepto memoizations update
+        their queue of recent keys and their statistics unlocked,
+        so their hits are served one at a time, while the memoizations
+        locking their own bookkeeping, e.g. ColumnarCache, are read
+        concurrently.
+        '''
+        if self.eviction is not None:
+            self.eviction.touch(f_cached.key(*call[0], **call[1]))
+        if getattr(f_cached, 'threadsafeQ', False):
+            return f_cached(*call[0], **call[1])
+        with self.lock:
+            return f_cached(*call[0], **call[1])
+
+    def fetch(self, f, f_cached, call):
+        '''
+        Fetch a call missing the cache and store its result.
+        A call already being fetched by another thread is
+        not made again: its result is waited for.
+        :param f: the function memoized
+        :param f_cached: the memoized function
+        :param call: a pair of args, kwargs
+        :return: the result of the call
+        '''
+        def fetch_and_store():
+            # the call may have been stored since it was planned
+            if self.cachedQ(f_cached, call):
+                return self.lookup(f_cached, call)
+            if self.coalescing is None or not self.coalescing.measuredQ():
+                return self.store(f_cached, call, f(*call[0], **call[1]))
+            start = time.perf_counter()
+            result = f(*call[0], **call[1])
+            self.observe(call, time.perf_counter() - start)
+            return self.store(f_cached, call, result)
+        return self.flights(f_cached.key(*call[0], **call[1]), fetch_and_store)
+
+    def results(self, f, f_cached, args, kwargs, calls, request=None):
+        '''
+        Make the calls to the memoized function and trim their results.
+        With an executor, the calls that miss the cache
+        are fetched concurrently while the hits are served
+        :param f: the function memoized
+        :param f_cached: the memoized function
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :param calls: the list of pairs args, kwargs
+        :param request: if not None, the RequestMetrics accounting
+               for the hits and misses
+        :return: the list of trimmed results in the order of the calls
+        '''
+        if not self.introspectableQ(f_cached):
+            misses = set()
+        else:
+            misses = {k for k, call in enumerate(calls) if not self.cachedQ(f_cached, call)}
+        futures = {}
+        if self.executor is not None and len(misses) > 1:
+            futures = {k: self.executor.submit(self.fetch, f, f_cached, calls[k]) for k in misses}
+        results = [None] * len(calls)
+        # the hits are served first: storing the misses
+        # may evict them from the cache
+        for k in sorted(range(len(calls)), key=lambda k: k in misses):
+            call = calls[k]
+            with Timer() as timer:
+                if k in futures:
+                    results[k] = futures[k].result()
+                elif k in misses:
+                    results[k] = self.fetch(f, f_cached, call)
+                elif not self.introspectableQ(f_cached):
+                    results[k] = f_cached(*call[0], **call[1])
+                else:
+                    results[k] = self.lookup(f_cached, call)
+            if self.debugQ:
+                print('Timer to demonstrate caching:')
+                timer.display(printQ=True)
+            if request is not None:
+                request.latencies['fetch' if k in misses else 'lookup'] += timer.interval
+        if request is not None: start = time.perf_counter()
+        results = self.trim(args, kwargs, results)
+        if request is not None:
+            request.lap('aggregate', start)
+            # the rows served are those within the intervals requested
+            for k, result in enumerate(results):
+                request.served(result, k not in misses)
+            request.coverage = self.coverage(calls, misses, self.binder.bind(*args, **kwargs)[2])
+        return results
+
+    def stream(self, f, f_cached, *args, **kwargs):
+        '''
+        Serve a request fragment by fragment: the results of the calls,
+        cached or fetched, trimmed, are yielded in the order of their
+        intervals without being aggregated. With an executor, the misses
+        of the next max_workers calls are fetched ahead concurrently.
+        Only the results yielded and fetched ahead are held, plus the
+        memoization: a bounded one, e.g. with an eviction or an archive,
+        lets a consumer writing to disk or reducing incrementally go
+        through ranges larger than the memory.
+        :param f: the function memoized
+        :param f_cached: the memoized function
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :return: a generator of the results
+        '''
+        if self.partials is not None:
+            raise Exception('The partial aggregates are served as a whole, not streamed')
+        request = self.metrics.request() if self.metrics is not None else None
+        calls = self.plan(f_cached, args, kwargs, request)
+        if not self.introspectableQ(f_cached):
+            misses = set()
+        else:
+            misses = {k for k, call in enumerate(calls) if not self.cachedQ(f_cached, call)}
+        futures = {}
+        ahead = self.max_workers if self.executor is not None else 0
+        try:
+            for k, call in enumerate(calls):
+                for j in range(k, min(k + 1 + ahead, len(calls))):
+                    if ahead and j in misses and j not in futures:
+                        futures[j] = self.executor.submit(self.fetch, f, f_cached, calls[j])
+                with Timer() as timer:
+                    if k in futures:
+                        result = futures.pop(k).result()
+                    elif k in misses:
+                        result = self.fetch(f, f_cached, call)
+                    elif not self.introspectableQ(f_cached):
+                        result = f_cached(*call[0], **call[1])
+                    else:
+                        result = self.lookup(f_cached, call)
+                if request is not None:
+                    request.latencies['fetch' if k in misses else 'lookup'] += timer.interval
+                    start = time.perf_counter()
+                result = self.trim(args, kwargs, [result])[0]
+                if request is not None:
+                    request.lap('aggregate', start)
+                    request.served(result, k not in misses)
+                yield result
+        finally:
+            # also when the consumer stops early
+            for future in futures.values():
+                future.cancel()
+            if request is not None:
+                request.coverage = self.coverage(calls, misses, self.binder.bind(*args, **kwargs)[2])
+                self.metrics.commit(request)
+            if self.index_path is not None and self.dirtyQ:
+                self.save_index()
+
+    def coverage(self, calls, misses, intervals=None):
+        '''
+        :param calls: the calls of a request
+        :param misses: the indices of the calls missing the cache
+        :param intervals: the intervals requested, in the order of the
+               interval parameters. The calls are measured within them:
+               the parts of the fragments cached beyond the request
+               are not served
+        :return: the share of the intervals requested served from the
+                 cache, by their length, or by number of calls for
+                 intervals without a finite length
+        '''
+        if len(calls) == 0: return 1.
+        if intervals is None: intervals = [None] * len(self.binder.slots)
+        measure = lambda i, requested: interval_length(i) if requested is None else overlap_length(i, requested)
+        lengths = [math.prod(measure((kwargs if namedQ else args)[slot], requested)
+                             for (namedQ, slot), requested in zip(self.binder.slots, intervals))
+                   for args, kwargs in calls]
+        total = sum(lengths)
+        if not 0 < total < math.inf:
+            return 1. - len(misses) / len(calls)
+        return sum(length for k, length in enumerate(lengths) if k not in misses) / total
+
+    def aggregate_partials(self, f, f_cached, args, kwargs, request=None):
+        '''
+        Serve a request from the tree of partial aggregates of its
+        non-interval arguments, fetching the buckets missing first
+        :param f: the function memoized
+        :param f_cached: the memoized function, keying the trees
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :param request: if not None, the RequestMetrics timing the stages
+        :return: the aggregate over the interval requested,
+                 None for an empty interval
+        '''
+        if request is not None: start = time.perf_counter()
+        args_fixed, kwargs_fixed, (interval,) = self.binder.bind(*args, **kwargs)
+        # the buckets are closed as the interval requested
+        key = (self.recorders_key(f_cached, args_fixed, kwargs_fixed), self.partials.closed(interval))
+        tree = self.trees.get(key, self.partials.tree)
+        if request is not None: start = request.lap('bind', start)
+        a, b = self.partials.positions(interval)
+        _, missing = tree.query(a, b)
+        if request is not None: start = request.lap('plan', start)
+        calls = {k: self.binder.call(args_fixed, kwargs_fixed, (self.partials.bucket(interval, k),))
+                 for k in missing}
+
+        def fetch(k):
+            def fetch_and_add():
+                result = f(*calls[k][0], **calls[k][1])
+                tree.add(k, result)
+                return result
+            return self.flights((key, k), fetch_and_add)
+
+        if self.executor is not None and len(missing) > 1:
+            results = list(self.executor.map(fetch, missing))
+        else:
+            results = [fetch(k) for k in missing]
+        if request is not None:
+            start = request.lap('fetch', start)
+            for result in results:
+                request.served(result, False)
+            request.hits += b - a - len(missing)
+            request.coverage = 1. - len(missing) / (b - a) if b > a else 1.
+        result, _ = tree.query(a, b)
+        if request is not None: request.lap('aggregate', start)
+        return result
+
+    def prefetch(self, f, f_cached, args, kwargs):
+        '''
+        Account for a request in the prefetcher and fetch in the
+        background the gaps of the next requests it predicts
+        :param f: the function memoized
+        :param f_cached: the memoized function
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :return: the future of the number of calls prefetched, or None
+        '''
+        args_fixed, kwargs_fixed, intervals = self.binder.bind(*args, **kwargs)
+        key = self.recorders_key(f_cached, args_fixed, kwargs_fixed)
+        predicted = self.prefetching.observe(key, intervals)
+        if len(predicted) == 0: return None
+
+        def prefetch():
+            fetched = 0
+            for intervals_next in predicted:
+                # planned as a request: the recorders record the gaps
+                for call in self.plan(f_cached, *self.binder.call(args_fixed, kwargs_fixed, intervals_next)):
+                    if not self.cachedQ(f_cached, call):
+                        self.fetch(f, f_cached, call)
+                        fetched += 1
+            return fetched
+
+        # the windows ending in the future are prefetched once they end
+        return self.prefetching.submit(key, prefetch, self.prefetching.delay(predicted))
+
+    def memoize(self, f):
+        '''
+        :param f: the function to memoize
+        :return: the memoized function
+        '''
+        if self.binder is None:
+            self.binder = Binder(f, self.pos_args_itvl, self.names_kwargs_itvl, self.query_recorder)
+
+        @self.memoization
+        def f_cached(*args, **kwargs):
+            '''
+            The memoised function, storing as well the results
+            fetched outside of it, e.g. concurrently
+            '''
+            result = getattr(self.fetched, 'result', NotFetched)
+            if result is not NotFetched:
+                return result
+            return f(*args, **kwargs)
+
+        return f_cached
+
+    def plan(self, f_cached, args, kwargs, request=None):
+        '''
+        Split a call with interval parameters in calls
+        with the intervals already cached and the gaps.
+        :param f_cached: the memoized function
+        :param args: the args of the original call
+        :param kwargs: the kwargs of the original call
+        :param request: if not None, the RequestMetrics timing the stages
+        :return: the list of pairs args, kwargs to call
+                 the memoized function with
+        '''
+        # formatting the arguments may be costly
+        if self.debugQ:
+            loguru.logger.debug(f'args passed: {args}')
+            loguru.logger.debug(f'kwargs passed: {kwargs}')
+        if request is not None: start = time.perf_counter()
+        # 1. Bind the call: the fixed arguments, with
+        # the QueryRecorder in place of the intervals,
+        # and the intervals
+        args_fixed, kwargs_fixed, intervals = self.binder.bind(*args, **kwargs)
+        if request is not None: start = request.lap('bind', start)
+        # the recorders are created once per set of non-interval
+        # arguments. Each recorder then locks itself while planning.
+        args_with_ri, kwargs_with_ri = self.recorders_call(f_cached, args_fixed, kwargs_fixed)
+        if self.introspectableQ(f_cached):
+            self.expire(f_cached, args_with_ri, kwargs_with_ri)
+        if self.boxesQ:
+            boxes = self.box_recorder(args_with_ri, kwargs_with_ri)(intervals)
+            calls = [self.binder.call(args_fixed, kwargs_fixed, box) for box in boxes]
+            if request is not None: request.lap('plan', start)
+            return calls
+        # 2. Now get the the actual list of intervals
+        lists_intervals = []
+        for (namedQ, slot), interval in zip(self.binder.slots, intervals):
+            recorder = (kwargs_with_ri if namedQ else args_with_ri)[slot]
+            if self.coalescing is None or len(self.binder.slots) > 1:
+                lists_intervals.append(recorder(interval))
+                continue
+            # the gaps are coalesced before another request
+            # is planned with the fragments just recorded
+            with recorder.lock:
+                lists_intervals.append(self.coalesce(f_cached, args_fixed, kwargs_fixed, recorder, recorder(interval)))
+        # 3. Then generate all combination of intervals
+        calls = [self.binder.call(args_fixed, kwargs_fixed, combination)
+                 for combination in itertools.product(*lists_intervals)]
+        if request is not None: request.lap('plan', start)
+        return calls
+
+    def coalesce(self, f_cached, args_fixed, kwargs_fixed, recorder, tiles):
+        '''
+        Join the gaps planned into fewer calls, as decided by the
+        cost model of coalescing. The recorder stores the spans of
+        the calls joined and the intervals cached they include are
+        removed from the cache.
+        :param f_cached: the memoized function
+        :param args_fixed, kwargs_fixed: the fixed arguments of the call
+        :param recorder: the recorder of the only interval parameter,
+               locked by the caller
+        :param tiles: the intervals it planned
+        :return: the intervals to call the memoized function with
+        '''
+        calls = [self.binder.call(args_fixed, kwargs_fixed, (tile,)) for tile in tiles]
+        missesQ = [not self.cachedQ(f_cached, call) for call in calls]
+        if sum(missesQ) < 2: return tiles
+        planned = []
+        for group in self.coalescing(tiles, missesQ, getattr(recorder, 'max_width', None)):
+            if len(group) == 1:
+                planned.append(tiles[group[0]])
+                continue
+            for k in group:
+                if not missesQ[k]: self.discard(f_cached, calls[k])
+            # the span joined is fetched again
+            planned.append(recorder.merge([tiles[k] for k in group], freshQ=True))
+        return planned
+
+    def recorders_key(self, f_cached, args, kwargs):
+        '''
+        :param f_cached: the memoized function
+        :param args: the args with QueryRecorder for the intervals
+        :param kwargs: the kwargs with QueryRecorder for the intervals
+        :return: the key of the interval recorders in the registry,
+                 by the keymap of the memoization if it has one
+        '''
+        if hasattr(f_cached, 'key'):
+            return f_cached.key(*args, **kwargs)
+        return self.keymapper(*args, **kwargs)
+
+    def recorders_call(self, f_cached, args, kwargs):
+        '''
+        :param f_cached: the memoized function
+        :param args: the args with QueryRecorder for the intervals
+        :param kwargs: the kwargs with QueryRecorder for the intervals
+        :return: the pair args, kwargs with the interval recorders
+                 in place of the QueryRecorder, from the registry
+        '''
+        key = self.recorders_key(f_cached, args, kwargs)
+
+        def factory():
+            entry = self.adopt(f_cached, key, args, kwargs) if len(self.loaded) else None
+            if entry is not None: return entry
+            if self.boxesQ:
+                return self.binder.call(args, kwargs,
+                                        [self.classrecorder(**self.kwargsrecorder)] * len(self.binder.slots))
+            return self.binder.call(args, kwargs, [self.classrecorder(**self.kwargsrecorder)
+                                                   for _ in self.binder.slots])
+
+        return self.index.get(key, factory)
+
+    def box_recorder(self, args_with_ri, kwargs_with_ri):
+        '''
+        :return: the recorder shared by the interval parameters
+                 of a pair of the index, with RecordBoxes
+        '''
+        namedQ, slot = self.binder.slots[0]
+        return (kwargs_with_ri if namedQ else args_with_ri)[slot]
+
+    def box(self, args, kwargs):
+        '''
+        :return: the tuple of the intervals of a call, in the
+                 order of the interval parameters
+        '''
+        return tuple((kwargs if namedQ else args)[slot] for namedQ, slot in self.binder.slots)
+
+    def recorders(self):
+        '''
+        :return: the pairs args, kwargs of the registry, with the
+                 interval recorders in place of the intervals
+        '''
+        return self.index.values()
+
+    def dimensions(self, args_with_ri, kwargs_with_ri):
+        '''
+        :return: the pairs (args or kwargs, position or name)
+                 of the interval parameters
+        '''
+        return [(args_with_ri, i) for i in self.pos_args_itvl] + \
+               [(kwargs_with_ri, name) for name in self.names_kwargs_itvl]
+
+    def calls_fragment(self, args_with_ri, kwargs_with_ri, d, fragment):
+        '''
+        :param args_with_ri, kwargs_with_ri: a pair of the index
+        :param d: the rank of an interval parameter
+        :param fragment: an interval of its recorder
+        :return: the calls with that fragment for that parameter
+                 and the fragments of the other interval parameters
+        '''
+        dimensions = self.dimensions(args_with_ri, kwargs_with_ri)
+        others = [[None] if e == d else c[p].fragments() for e, (c, p) in enumerate(dimensions)]
+        calls = []
+        for fragments in itertools.product(*others):
+            args, kwargs = list(args_with_ri), dict(kwargs_with_ri)
+            for e, (c, p) in enumerate(dimensions):
+                (args if c is args_with_ri else kwargs)[p] = fragment if e == d else fragments[e]
+            calls.append((args, kwargs))
+        return calls
+
+    def expire(self, f_cached, args_with_ri, kwargs_with_ri):
+        '''
+        Remove the fragments past their time to live from the
+        cache and from the interval recorders: they are gaps,
+        fetched again when requested
+        :param f_cached: the memoized function
+        :param args_with_ri, kwargs_with_ri: a pair of the index
+        :return: the number of fragments expired
+        '''
+        expired = 0
+        if self.boxesQ:
+            recorder = self.box_recorder(args_with_ri, kwargs_with_ri)
+            with recorder.lock:
+                for box in recorder.expired():
+                    self.discard(f_cached, self.binder.call(args_with_ri, kwargs_with_ri, box))
+                    recorder.remove(box)
+                    expired += 1
+            if expired:
+                self.dirtyQ = True
+            return expired
+        for d, (container, position) in enumerate(self.dimensions(args_with_ri, kwargs_with_ri)):
+            recorder = container[position]
+            with recorder.lock:
+                for fragment in recorder.expired():
+                    for call in self.calls_fragment(args_with_ri, kwargs_with_ri, d, fragment):
+                        self.discard(f_cached, call)
+                    recorder.remove(fragment)
+                    expired += 1
+        if expired:
+            self.dirtyQ = True
+        return expired
+
+    def reconcile(self, f_cached):
+        '''
+        Remove from the interval recorders the fragments
+        whose results are not in the cache any more
+        :param f_cached: the memoized function
+        :return: the number of fragments removed
+        '''
+        return sum(self.reconcile_entry(f_cached, args_with_ri, kwargs_with_ri)
+                   for args_with_ri, kwargs_with_ri in self.recorders())
+
+    def reconcile_entry(self, f_cached, args_with_ri, kwargs_with_ri):
+        '''
+        Reconcile the recorders of a pair of the index
+        :param f_cached: the memoized function
+        :param args_with_ri, kwargs_with_ri: a pair of the index
+        :return: the number of fragments removed
+        '''
+        removed = 0
+        if self.boxesQ:
+            recorder = self.box_recorder(args_with_ri, kwargs_with_ri)
+            with recorder.lock:
+                for box in recorder.fragments():
+                    if not self.cachedQ(f_cached, self.binder.call(args_with_ri, kwargs_with_ri, box)):
+                        recorder.remove(box)
+                        removed += 1
+            return removed
+        for d, (container, position) in enumerate(self.dimensions(args_with_ri, kwargs_with_ri)):
+            recorder = container[position]
+            with recorder.lock:
+                for fragment in recorder.fragments():
+                    calls = self.calls_fragment(args_with_ri, kwargs_with_ri, d, fragment)
+                    if not all(self.cachedQ(f_cached, call) for call in calls):
+                        recorder.remove(fragment)
+                        removed += 1
+        return removed
+
+    def save_index(self):
+        '''
+        Save the index in index_path index_delay seconds from now,
+        in the background, unless a save is already pending
+        '''
+        if self.index_delay is None:
+            return self.write_index()
+        with self.lock:
+            if self.index_timer is not None: return
+            self.index_timer = threading.Timer(self.index_delay, self.write_index)
+            self.index_timer.daemon = True
+            self.index_timer.start()
+
+    def write_index(self):
+        '''
+        Write the index in index_path. The file is replaced
+        at once: it is never found partially written.
+        Only the recorders are saved, by key: the non-interval
+        arguments, e.g. connections, may not be picklable
+        '''
+        with self.index_lock:
+            with self.lock:
+                if self.index_timer is not None:
+                    self.index_timer.cancel()
+                    self.index_timer = None
+                self.dirtyQ = False
+            entries = self.index.items()
+            # the recorders loaded and not requested since
+            index = dict(self.loaded)
+            for key, (args_with_ri, kwargs_with_ri) in entries:
+                recorders = self.box(args_with_ri, kwargs_with_ri)
+                for recorder in recorders: recorder.lock.acquire()
+                try:
+                    index[key] = pickle.dumps(recorders)
+                finally:
+                    for recorder in recorders: recorder.lock.release()
+            path_tmp = f'{self.index_path}.{os.getpid()}.tmp'
+            with open(path_tmp, 'wb') as f:
+                pickle.dump(index, f)
+            os.replace(path_tmp, self.index_path)
+
+    def close(self):
+        '''
+        Save the index now if results were stored since the last save
+        '''
+        if self.index_path is not None and (self.index_timer is not None or self.dirtyQ):
+            self.write_index()
+
+    def load_index(self, f_cached):
+        '''
+        Load the index saved in index_path. The recorders of a key
+        join the registry with the non-interval arguments of its first
+        request, keeping only the fragments still in the cache
+        :param f_cached: the memoized function
+        '''
+        with open(self.index_path, 'rb') as f:
+            self.loaded = pickle.load(f)
+
+    def adopt(self, f_cached, key, args, kwargs):
+        '''
+        :param f_cached: the memoized function
+        :param key: the key of the non-interval arguments
+        :param args: the args with QueryRecorder for the intervals
+        :param kwargs: the kwargs with QueryRecorder for the intervals
+        :return: the pair args, kwargs with the recorders loaded for
+                 the key in place of the QueryRecorder, None if none
+        '''
+        entry = self.loaded.pop(key, None)
+        if entry is None: return None
+        recorders = pickle.loads(entry)
+        args_with_ri, kwargs_with_ri = self.binder.call(args, kwargs, recorders)
+        if self.reconcile_entry(f_cached, args_with_ri, kwargs_with_ri):
+            self.dirtyQ = True
+        return args_with_ri, kwargs_with_ri
+
+    def compact(self, f_cached, min_fragments=2, backgroundQ=False):
+        '''
+        Merge the runs of adjacent fragments in the cache.
+        Incremental requests leave many small adjacent intervals
+        cached, which a wide request then looks up and aggregates
+        one by one. The results of a run are aggregated once and
+        stored as a single call, the interval recorder stores the
+        merged interval and the fragments are removed from the cache.
+        The aggregation must accept its own results, as pd.concat.
+        Fragments missing from the cache, e.g. evicted, break the runs.
+        With several interval parameters, a run of one parameter is
+        merged for all the fragments of the others.
+        The boxes of RecordBoxes are not compacted.
+        :param f_cached: the memoized function
+        :param min_fragments: the minimum number of fragments merged
+        :param backgroundQ: if True, the compaction runs in a
+               background thread. A compaction already running
+               is not started again
+        :return: the number of runs merged, or the future
+                 of that number when run in the background
+        '''
+        if not self.introspectableQ(f_cached):
+            raise Exception('The compaction requires a memoization giving access to its cache and keys')
+        if backgroundQ:
+            with self.lock:
+                if self.compaction is None or self.compaction.done():
+                    if self.compactor is None:
+                        self.compactor = ThreadPoolExecutor(max_workers=1)
+                    self.compaction = self.compactor.submit(self.compact, f_cached, min_fragments)
+                return self.compaction
+        merged = 0
+        for args_with_ri, kwargs_with_ri in self.recorders():
+            for d, (container, position) in enumerate(self.dimensions(args_with_ri, kwargs_with_ri)):
+                recorder = container[position]
+                # no request is planned with this recorder while its
+                # fragments are being replaced in the cache
+                with recorder.lock:
+                    for run in recorder.runs():
+                        # split the run at the fragments not cached
+                        subruns = [[]]
+                        for fragment in run:
+                            calls = self.calls_fragment(args_with_ri, kwargs_with_ri, d, fragment)
+                            if len(calls) and all(self.cachedQ(f_cached, call) for call in calls):
+                                subruns[-1].append(fragment)
+                            elif len(subruns[-1]):
+                                subruns.append([])
+                        for subrun in subruns:
+                            if len(subrun) < max(2, min_fragments): continue
+                            calls_subrun = [self.calls_fragment(args_with_ri, kwargs_with_ri, d, fragment)
+                                            for fragment in subrun]
+                            results = [self.aggregation([self.lookup(f_cached, calls[k]) for calls in calls_subrun])
+                                       for k in range(len(calls_subrun[0]))]
+                            merged_interval = recorder.merge(subrun)
+                            # discarded first, not to be evicted with
+                            # the merged interval from the recorder
+                            for calls in calls_subrun:
+                                for call in calls:
+                                    self.discard(f_cached, call)
+                            calls_merged = self.calls_fragment(args_with_ri, kwargs_with_ri, d, merged_interval)
+                            for call, result in zip(calls_merged, results):
+                                self.store(f_cached, call, result)
+                            merged += 1
+        if merged and self.index_path is not None:
+            self.save_index()
+        return merged
 
     def __call__(self, f):
         '''
@@ -107,92 +997,47 @@ class MemoizationWithIntervals(object):
         :param f: the function to memoize
         :return: the wrapper to the memoized function
         '''
-        if self.argssolver is None:
-            self.argssolver = ci.Functions.ArgsSolver(f, split_args_kwargsQ=True)
-
-        @self.memoization
-        def f_cached(*args, **kwargs):
-            '''
-            The cached function is used for a double purpose:
-            1. for standard calls, will act as the memoised function in a traditional way
-            2. Additively when pass parameters of type QueryRecorder, it will create
-               or retrieve the interval recorders associated with the values of
-               non-interval parameters.
-               In this context, we use the cached function as we would a dictionary.
-            '''
-            QueryRecorderQ = False
-            args_new = []
-            kwargs_new = {}
-            '''
-            check whether this is a standard call to the user function
-            or a request for the interval recorders
-            '''
-            for i,arg in enumerate(args):
-                if isinstance(arg, QueryRecorder):
-                   args_new.append(self.classrecorder(**self.kwargsrecorder))
-                   QueryRecorderQ = True
-                else:
-                    args_new.append(args[i])
-            for name in kwargs:
-                if isinstance(kwargs[name], QueryRecorder):
-                    kwargs_new[name] = self.classrecorder(**self.kwargsrecorder)
-                    QueryRecorderQ = True
-                else:
-                    kwargs_new[name] = kwargs[name]
-            if QueryRecorderQ:
-                return args_new, kwargs_new
-            return f(*args, **kwargs)
+        f_cached = self.memoize(f)
+        if self.eviction is not None and not self.introspectableQ(f_cached):
+            raise Exception('The eviction requires a memoization giving access to its cache and keys')
+        if self.coalescing is not None and not self.introspectableQ(f_cached):
+            raise Exception('The coalescing requires a memoization giving access to its cache and keys')
+        if self.prefetching is not None and not self.introspectableQ(f_cached):
+            raise Exception('The prefetching requires a memoization giving access to its cache and keys')
+        if self.partials is not None and len(self.binder.slots) != 1:
+            raise Exception('The partial aggregates apply to functions with one interval parameter')
+        if self.index_path is not None and os.path.exists(self.index_path):
+            self.load_index(f_cached)
 
         def wrapper(*args, **kwargs):
             if kwargs.get('get_function_cachedQ', False):
                 return f_cached
-            #loguru.logger.debug(f'function passed: {f_cached}')
-            loguru.logger.debug(f'args passed: {args}')
-            loguru.logger.debug(f'kwargs passed: {kwargs}')
-            # First pass: resolve the recorders
-            dargs_exp, kwargs_exp = self.argssolver(*args, **kwargs)
-            # Intervals are identified by position and keyword name
-            # 1. First get the interval recorders
-            args_exp = list(dargs_exp.values())
-            args_exp_copy = args_exp.copy()
-            kwargs_exp_copy = kwargs_exp.copy()
-            for i in self.pos_args_itvl:
-                args_exp_copy[i] = self.query_recorder
-            for name in self.names_kwargs_itvl:
-                    kwargs_exp_copy[name] = self.query_recorder
-            args_with_ri, kwargs_with_ri = f_cached(*args_exp_copy, **kwargs_exp_copy)
-            # 2. Now get the the actual list of intervals
-            for i in self.pos_args_itvl:
-                # reuse args_exp_copy to store the list
-                args_exp_copy[i] = args_with_ri[i](args_exp[i])
-            for name in self.names_kwargs_itvl:
-                    # reuse kwargs_exp_copy to store the list
-                    kwargs_exp_copy[name] = kwargs_with_ri[name](kwargs_exp[name])
-            '''3. Then generate all combination of parameters
-            3.a - args'''
-            ns_args = range(len(args_exp))
-            lists_possible_args = [[args_exp[i]]  if i not in self.pos_args_itvl else args_exp_copy[i] for i in ns_args]
-            # Take the cartesian product of these
-            calls_args = list( map(list,itertools.product(*lists_possible_args)))
-            '''3.b kwargs'''
-            #kwargs_exp_vals = kwargs_exp_copy.values()
-            names_kwargs = list(kwargs_exp_copy.keys())
-            lists_possible_kwargs = [[kwargs_exp[name]]  if name not in self.names_kwargs_itvl
-                                   else kwargs_exp_copy[name] for name in names_kwargs]
-            calls_kwargs = list(map(lambda l: dict(zip(names_kwargs,l)), itertools.product(*lists_possible_kwargs)))
-            calls = list(itertools.product(calls_args, calls_kwargs))
-            if self.debugQ:
-                results = []
-                for call in calls:
-                    with Timer() as timer:
-                        results.append(f_cached(*call[0], **call[1]) )
-                    print('Timer to demonstrate caching:')
-                    timer.display(printQ=True)
-            else:
-                results = [f_cached(*call[0], **call[1]) for call in calls]
+            request = self.metrics.request() if self.metrics is not None else None
+            if self.partials is not None:
+                result = self.aggregate_partials(f, f_cached, args, kwargs, request)
+                if request is not None: self.metrics.commit(request)
+                return result
+            calls = self.plan(f_cached, args, kwargs, request)
+            results = self.results(f, f_cached, args, kwargs, calls, request)
+            if request is not None: start = time.perf_counter()
             result = self.aggregation(results)
+            if request is not None:
+                request.lap('aggregate', start)
+                self.metrics.commit(request)
+            if self.index_path is not None and self.dirtyQ:
+                self.save_index()
+            if self.compact_above is not None and len(calls) > self.compact_above:
+                self.compact(f_cached, backgroundQ=True)
+            if self.prefetching is not None:
+                self.prefetch(f, f_cached, args, kwargs)
             return result
 
+        wrapper.flights = self.flights
+        wrapper.prefetching = self.prefetching
+        wrapper.metrics = self.metrics
+        wrapper.stream = functools.partial(self.stream, f, f_cached)
+        wrapper.compact = functools.partial(self.compact, f_cached)
+        wrapper.close = self.close
         return wrapper
 
 
@@ -0,0 +1,184 @@
+import bisect
+import collections
+import functools
+import threading
+import time
+
+from CacheIntervals.utils import sizeof
+
+HistogramInfo = collections.namedtuple('HistogramInfo', ['count', 'total', 'max', 'p50', 'p90', 'p99'])
+MetricsInfo = collections.namedtuple('MetricsInfo', ['requests', 'hits', 'misses',
+                                                     'rows_cached', 'rows_fetched',
+                                                     'bytes_cached', 'bytes_fetched',
+                                                     'coverage'])
+
+STAGES = ('bind', 'plan', 'lookup', 'fetch', 'aggregate')
+
+
+class Histogram:
+    '''
+    A histogram of latencies in buckets growing by powers of two,
+    from a microsecond to a minute: recording a latency is a
+    binary search and an increment, whatever their number.
+    The quantiles are the upper bounds of their buckets.
+    '''
+    bounds = [1e-6 * 2 ** k for k in range(27)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+
+    def quantile(self, q):
+        '''
+        :param q: a probability
+        :return: the upper bound of the bucket of the quantile q
+        '''
+        if self.count == 0: return 0.
+        rank = q * self.count
+        cumulated = 0
+        for bound, count in zip(self.bounds + [self.max], self.counts):
+            cumulated += count
+            if cumulated >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def info(self):
+        return HistogramInfo(self.count, self.total, self.max,
+                             self.quantile(.5), self.quantile(.9), self.quantile(.99))
+
+
+class RequestMetrics:
+    '''
+    The metrics of a single request to a function memoized
+    with intervals, passed to the callback of the Metrics:
+    - hits, misses: the number of calls served from the cache
+      and fetched;
+    - rows_cached, rows_fetched, bytes_cached, bytes_fetched:
+      the rows and bytes of their results;
+    - coverage: the share of the intervals requested served from
+      the cache, by their length, or by number of calls for the
+      intervals without length;
+    - latencies: the seconds spent by stage, bind, plan, lookup,
+      fetch and aggregate.
+    '''
+
+    def __init__(self, sizeof):
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.rows_cached = 0
+        self.rows_fetched = 0
+        self.bytes_cached = 0
+        self.bytes_fetched = 0
+        self.coverage = 1.
+        self.latencies = dict.fromkeys(STAGES, 0.)
+
+    def lap(self, stage, start):
+        '''
+        :param stage: the name of a stage
+        :param start: the time.perf_counter() at its start
+        :return: the time.perf_counter() now
+        '''
+        now = time.perf_counter()
+        self.latencies[stage] += now - start
+        return now
+
+    def served(self, result, hitQ):
+        '''
+        Account for the result of a call
+        :param result: the result
+        :param hitQ: whether it was served from the cache
+        '''
+        rows = len(result) if hasattr(result, '__len__') else 1
+        nbytes = self.sizeof(result)
+        if hitQ:
+            self.hits += 1
+            self.rows_cached += rows
+            self.bytes_cached += nbytes
+        else:
+            self.misses += 1
+            self.rows_fetched += rows
+            self.bytes_fetched += nbytes
+
+    def __repr__(self):
+        return f'<RequestMetrics hits: {self.hits}, misses: {self.misses}, coverage: {self.coverage:.2f}, ' \
+               f'latencies: {self.latencies}>'
+
+
+class Metrics:
+    '''
+    The metrics of a function memoized with intervals, passed
+    as the metrics parameter of MemoizationWithIntervals.
+    The totals over the requests are read with info and the
+    latencies by stage with latencies. A callback may also
+    be given the RequestMetrics of each request, e.g. to
+    export them to a monitoring system.
+    Without metrics, the requests are not instrumented at all.
+    '''
+
+    def __init__(self, callback=None, sizeof=functools.partial(sizeof, deep=False)):
+        '''
+        :param callback: if not None, a function called
+               with the RequestMetrics of each request
+        :param sizeof: the function measuring the size of a result,
+               by default DataFrame.memory_usage(deep=False), which
+               does not visit the objects of the columns on every
+               request: functools.partial(sizeof, deep=True) does
+        '''
+        self.callback = callback
+        self.sizeof = sizeof
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.totals = collections.Counter()
+        self.coverages = 0.
+        self.lock = threading.Lock()
+
+    def request(self):
+        '''
+        :return: the metrics of a new request
+        '''
+        return RequestMetrics(self.sizeof)
+
+    def commit(self, request):
+        '''
+        Add the metrics of a request to the totals
+        and pass them to the callback
+        '''
+        with self.lock:
+            for name in MetricsInfo._fields[1:-1]:
+                self.totals[name] += getattr(request, name)
+            self.totals['requests'] += 1
+            self.coverages += request.coverage
+            for stage, seconds in request.latencies.items():
+                self.histograms[stage].observe(seconds)
+        if self.callback is not None:
+            self.callback(request)
+
+    def info(self):
+        '''
+        :return: the totals over the requests, with the mean coverage
+        '''
+        with self.lock:
+            requests = self.totals['requests']
+            return MetricsInfo(requests, *[self.totals[name] for name in MetricsInfo._fields[1:-1]],
+                               self.coverages / requests if requests else 1.)
+
+    def latencies(self):
+        '''
+        :return: the HistogramInfo of each stage
+        '''
+        with self.lock:
+            return {stage: histogram.info() for stage, histogram in self.histograms.items()}
+
+    def clear(self):
+        with self.lock:
+            self.histograms = {stage: Histogram() for stage in STAGES}
+            self.totals.clear()
+            self.coverages = 0.
@@ -0,0 +1,192 @@
+import collections
+import concurrent.futures
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import portion
+
+from CacheIntervals.Intervals import interval_bounds
+
+PrefetchInfo = collections.namedtuple('PrefetchInfo', ['predictions', 'prefetched', 'keys'])
+
+
+def shift(i, stride):
+    '''
+    :param i: a pandas interval or an atomic portion interval
+    :param stride: the shifts of its lower and upper bounds
+    :return: the interval shifted, closed as i
+    '''
+    lower, upper, _, _ = interval_bounds(i)
+    if isinstance(i, pd.Interval):
+        return pd.Interval(lower + stride[0], upper + stride[1], closed=i.closed)
+    return portion.Interval.from_atomic(i.left, lower + stride[0], upper + stride[1], i.right)
+
+
+class StridePrefetcher:
+    '''
+    A prefetcher of a function memoized with intervals, passed as the
+    prefetching parameter of MemoizationWithIntervals.
+    It follows the intervals requested for each set of non-interval
+    arguments. When the bounds of the last requests advance by the same
+    stride, e.g. the last 24 hours every 5 minutes, the intervals of the
+    next requests are predicted, planned and their gaps fetched in the
+    background: they are stored in the cache and recorded by the interval
+    recorders before they are requested, which are then served from the
+    cache. A request arriving while its gap is being prefetched waits for
+    that fetch rather than making it again.
+    The data of an interval of dates ending after now is not all there
+    yet: its prefetch is delayed until the end of the interval, so that
+    no partial result is cached.
+    '''
+
+    def __init__(self, history=3, ahead=1, tolerance=None, maxsize=1024):
+        '''
+        :param history: the number of consecutive strides that must
+               match for the next requests to be predicted
+        :param ahead: the number of requests predicted
+        :param tolerance: if not None, the largest difference between
+               strides still matching, e.g. pd.Timedelta(seconds=5) for
+               requests made on a timer rather than on a grid
+        :param maxsize: the maximum number of sets of arguments followed,
+               the least recently requested being forgotten
+        '''
+        self.history = history
+        self.ahead = ahead
+        self.tolerance = tolerance
+        self.maxsize = maxsize
+        # key -> the intervals of the last requests
+        self.requests = collections.OrderedDict()
+        # key -> the future of its prefetch, run one at a time
+        self.pending = {}
+        self.executor = None
+        self.predictions = 0
+        self.prefetched = 0
+        self.lock = threading.Lock()
+
+    def matchQ(self, stride, other):
+        if self.tolerance is None: return stride == other
+        return all(abs(s - o) <= self.tolerance for s, o in zip(stride, other))
+
+    def strides(self, requests):
+        '''
+        :param requests: the intervals of consecutive requests
+        :return: the stride of each interval parameter, pairs of shifts
+                 of the lower and upper bounds, if all the strides
+                 between the requests match and they move, else None
+        '''
+        strides = []
+        for d in range(len(requests[0])):
+            bounds = [interval_bounds(intervals[d])[:2] for intervals in requests]
+            steps = [(lower - previous[0], upper - previous[1]) for previous, (lower, upper) in zip(bounds, bounds[1:])]
+            if not all(self.matchQ(steps[-1], step) for step in steps[:-1]): return None
+            strides.append(steps[-1])
+        if all(lower == upper == 0 * lower for lower, upper in strides): return None
+        return strides
+
+    def observe(self, key, intervals):
+        '''
+        Account for a request
+        :param key: the key of its non-interval arguments
+        :param intervals: the intervals requested
+        :return: the intervals of the next requests predicted,
+                 none if no stride is found
+        '''
+        with self.lock:
+            requests = self.requests.get(key)
+            if requests is None:
+                requests = self.requests[key] = collections.deque(maxlen=self.history + 1)
+                while len(self.requests) > self.maxsize:
+                    forgotten, _ = self.requests.popitem(last=False)
+                    self.pending.pop(forgotten, None)
+            else:
+                self.requests.move_to_end(key)
+            requests.append(tuple(intervals))
+            if len(requests) <= self.history: return []
+            requests = list(requests)
+        try:
+            strides = self.strides(requests)
+        except TypeError:
+            # bounds without differences
+            return []
+        if strides is None: return []
+        with self.lock:
+            self.predictions += 1
+        predicted = []
+        for n in range(1, self.ahead + 1):
+            predicted.append(tuple(shift(i, (n * stride[0], n * stride[1])) for i, stride in zip(requests[-1], strides)))
+        return predicted
+
+    @staticmethod
+    def delay(predicted):
+        '''
+        :param predicted: the intervals of the requests predicted
+        :return: the seconds until the last of their upper bounds
+                 that are dates, 0 if they are all past
+        '''
+        delay = 0.
+        for intervals in predicted:
+            for i in intervals:
+                upper = interval_bounds(i)[1]
+                if isinstance(upper, datetime.datetime):
+                    upper = pd.Timestamp(upper)
+                    delay = max(delay, (upper - pd.Timestamp.now(tz=upper.tz)).total_seconds())
+        return delay
+
+    def submit(self, key, prefetch, delay=0.):
+        '''
+        Run a prefetch in the background, unless one of
+        the same key is still pending
+        :param key: the key of the non-interval arguments
+        :param prefetch: a function returning the number of calls fetched
+        :param delay: the seconds to wait before running it
+        :return: its future, or None if not run
+        '''
+        def run():
+            try:
+                fetched = prefetch()
+            except Exception as e:
+                # nobody waits for the prefetch: the request will fetch again
+                logging.getLogger(__name__).error(f'Prefetch failed: {e}', exc_info=True)
+                return 0
+            with self.lock:
+                self.prefetched += fetched
+            return fetched
+
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None and not future.done(): return None
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+            if delay <= 0:
+                future = self.pending[key] = self.executor.submit(run)
+                return future
+            future = self.pending[key] = concurrent.futures.Future()
+
+        def start():
+            if not future.set_running_or_notify_cancel(): return
+            future.set_result(run())
+
+        # the timer only hands the prefetch over to the executor
+        timer = threading.Timer(delay, lambda: self.executor.submit(start))
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def wait(self):
+        '''
+        Wait for the prefetches running
+        '''
+        with self.lock:
+            futures = list(self.pending.values())
+        concurrent.futures.wait(futures)
+
+    def info(self):
+        '''
+        :return: the number of predictions, of calls prefetched
+                 and of sets of arguments followed
+        '''
+        with self.lock:
+            return PrefetchInfo(self.predictions, self.prefetched, len(self.requests))
@@ -0,0 +1,225 @@
+import bisect
+import functools
+import threading
+
+import portion
+import pendulum as pdl
+import pandas as pd
+
+from CacheIntervals.Intervals import po2pd, pd2po, snap_interval
+
+
+class RecordBoxes:
+    '''
+    The interval recorder of a function with several interval
+    parameters, passed as the classrecorder of MemoizationWithIntervals.
+    A recorder per parameter tracks each dimension independently: the
+    calls are the cartesian product of the intervals planned for each
+    one, although the results cached are the boxes actually called.
+    This recorder stores the boxes themselves, i.e. the tuples of the
+    intervals of the calls, in the order of the interval parameters.
+    A request is served by:
+    - the boxes stored that overlap it, called as they were stored,
+      the trim_on of the memoization slicing their results;
+    - the smallest boxes covering the rest of the request, found by
+      sweeping the elementary cells delimited by the bounds of the
+      boxes overlapping, merged along each dimension in turn.
+    The boxes stored are disjoint. They are sorted by their lower bound
+    in the first dimension, along with the running maximum of their
+    upper bounds in it: the boxes that may overlap a request, those
+    starting before its end and after the last one ending before its
+    start, are found by two binary searches.
+    The intervals are pandas or portion intervals, as passed.
+    '''
+    # the memoization passes it the intervals of all
+    # the parameters at once, rather than one each
+    boxesQ = True
+
+    def __init__(self,
+                 ttl=None,
+                 bucket=None):
+        '''
+        :param ttl: the time to live of the boxes stored, after which
+               they are fetched again, or a function of a box returning
+               it. None means never
+        :param bucket: if not None, the intervals requested are snapped
+               outward to a grid, see RecordIntervals. A list gives
+               the grid of each dimension, None for none
+        '''
+        self.ttl = ttl
+        self.bucket = bucket
+        # the boxes stored as tuples of portion intervals, sorted by the
+        # lower bound of their first interval, the boxes as stored,
+        # the lower bounds of their first intervals, the running maximum
+        # of the upper bounds of their first intervals and their stamps
+        self.boxes = []
+        self.originals = []
+        self.lowers = []
+        self.uppers = []
+        self.stamps = []
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        # recorders may be stored in a persistent cache
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def to_portion(box):
+        return tuple(pd2po(i) if isinstance(i, pd.Interval) else i for i in box)
+
+    def snap(self, box):
+        '''
+        :return: the box with its intervals snapped to their grids
+        '''
+        if self.bucket is None: return box
+        buckets = self.bucket if isinstance(self.bucket, (list, tuple)) else [self.bucket] * len(box)
+        return tuple(i if bucket is None else snap_interval(i, bucket) for i, bucket in zip(box, buckets))
+
+    def overlapping(self, box):
+        '''
+        :param box: a tuple of portion intervals
+        :return: the indices of the boxes stored overlapping it
+        '''
+        start = bisect.bisect_left(self.uppers, box[0].lower)
+        end = bisect.bisect_right(self.lowers, box[0].upper)
+        return [k for k in range(start, end)
+                if all(not (i & s).empty for i, s in zip(box, self.boxes[k]))]
+
+    def maxima(self, k):
+        '''
+        Update the running maximum of the upper bounds
+        of the first intervals from the box k on
+        '''
+        del self.uppers[k:]
+        for box in self.boxes[k:]:
+            self.uppers.append(box[0].upper if len(self.uppers) == 0 else max(self.uppers[-1], box[0].upper))
+
+    @staticmethod
+    def atoms(i, boxes, d):
+        '''
+        :param i: an atomic portion interval
+        :param boxes: boxes overlapping it in dimension d
+        :param d: a dimension
+        :return: the consecutive elementary intervals partitioning i
+                 delimited by the bounds of the boxes: each one is
+                 either inside or outside of each box
+        '''
+        points = {i.lower, i.upper}
+        for box in boxes:
+            points.update([box[d].lower, box[d].upper])
+        points = sorted(p for p in points if p not in (portion.inf, -portion.inf))
+        pieces = [portion.open(-portion.inf, points[0] if len(points) else portion.inf)]
+        for k, point in enumerate(points):
+            pieces.append(portion.singleton(point))
+            pieces.append(portion.open(point, points[k + 1] if k + 1 < len(points) else portion.inf))
+        return [atom for atom in (piece & i for piece in pieces) if not atom.empty]
+
+    def uncovered(self, box, boxes, d=0):
+        '''
+        :param box: a tuple of portion intervals
+        :param boxes: the boxes stored overlapping it
+        :param d: the first dimension swept
+        :return: boxes covering the part of box outside of boxes in
+                 the dimensions from d on: the cells sharing the same
+                 uncovered boxes in the next dimensions are merged
+                 along dimension d
+        '''
+        if len(boxes) == 0: return [tuple(box[d:])]
+        if d == len(box): return []
+        merged = []
+        # the boxes of the next dimensions still open: box -> atoms
+        running = {}
+        for atom in self.atoms(box[d], boxes, d):
+            inside = [s for s in boxes if atom in s[d]]
+            current = {}
+            for rest in self.uncovered(box, inside, d + 1):
+                current[rest] = running.pop(rest, []) + [atom]
+            merged.extend((functools.reduce(lambda x, y: x | y, atoms),) + rest for rest, atoms in running.items())
+            running = current
+        merged.extend((functools.reduce(lambda x, y: x | y, atoms),) + rest for rest, atoms in running.items())
+        return merged
+
+    def store(self, box, original):
+        k = bisect.bisect_right(self.lowers, box[0].lower)
+        self.boxes.insert(k, box)
+        self.originals.insert(k, original)
+        self.lowers.insert(k, box[0].lower)
+        self.stamps.insert(k, pdl.now())
+        self.maxima(k)
+
+    def __call__(self, box):
+        '''
+        :param box: the tuple of the intervals requested
+        :return: the boxes to call, sorted, those stored
+                 overlapping the box and the gaps, stored
+        '''
+        box = self.snap(tuple(box))
+        pandasQ = [isinstance(i, pd.Interval) for i in box]
+        box_po = self.to_portion(box)
+        if any(i.empty for i in box_po): return []
+        with self.lock:
+            overlapping = self.overlapping(box_po)
+            calls = [self.originals[k] for k in overlapping]
+            for gap in self.uncovered(box_po, [self.boxes[k] for k in overlapping]):
+                original = tuple(po2pd(i) if pdQ else i for i, pdQ in zip(gap, pandasQ))
+                self.store(gap, original)
+                calls.append(original)
+        return sorted(calls, key=lambda call: tuple(i.lower for i in self.to_portion(call)))
+
+    def fragments(self):
+        '''
+        :return: the boxes stored, each one the box of a cached call
+        '''
+        with self.lock:
+            return list(self.originals)
+
+    def runs(self):
+        '''
+        Boxes are not compacted
+        '''
+        return []
+
+    def remove(self, box):
+        '''
+        Forget a box: it is no longer covered and
+        will be fetched again when requested.
+        A box not stored, e.g. forgotten with its recorder, is ignored
+        :param box: the box removed
+        '''
+        box = self.to_portion(box)
+        with self.lock:
+            if box not in self.boxes: return
+            k = self.boxes.index(box)
+            for values in (self.boxes, self.originals, self.lowers, self.stamps):
+                del values[k]
+            self.maxima(k)
+
+    def expired(self):
+        '''
+        :return: the boxes stored for longer than their time to live
+        '''
+        if self.ttl is None: return []
+        now = pdl.now()
+        with self.lock:
+            items = list(zip(self.originals, self.stamps))
+        expired = []
+        for box, stamp in items:
+            ttl = self.ttl(box) if callable(self.ttl) else self.ttl
+            if ttl is not None and pd.Timedelta(now - stamp) > pd.Timedelta(ttl):
+                expired.append(box)
+        return expired
+
+
+if __name__ == "__main__":
+    recorder = RecordBoxes()
+    print(recorder((pd.Interval(0, 10), pd.Interval(0, 10))))
+    # the L-shaped gap around the box stored is fetched in 2 calls,
+    # the product of the intervals of each dimension would make 3
+    print(recorder((pd.Interval(0, 20), pd.Interval(0, 20))))
+    print(recorder((pd.Interval(5, 15), pd.Interval(5, 15))))
@@ -1,9 +1,12 @@
 import itertools
+import threading
 import portion
 import pendulum as pdl
+import pandas as pd
 
 from CacheIntervals.utils import flatten
-from CacheIntervals.Intervals import po2pd, pd2po
+from CacheIntervals.utils.SetsAndIterators import pairwise
+from CacheIntervals.Intervals import po2pd, pd2po, interval_bounds, snap_interval
 
 class RecordIntervals:
     '''
@@ -26,7 +29,10 @@ class RecordIntervals:
     def __init__(self,
                  rounding=None,
                  subintervals_requiredQ=False,
-                 subinterval_minQ=False):
+                 subinterval_minQ=False,
+                 ttl=None,
+                 max_width=None,
+                 bucket=None):
         '''
         :param time_between_calls allows not updating the
             calls unless a minimum time has passed
@@ -34,19 +40,52 @@ class RecordIntervals:
         returns:
            - the whole interval (subinterval_requiredQ=False)
            - replace the existing interval by the intersection and complement
+        :param ttl: the time to live of the intervals stored, after
+            which they are fetched again, or a function of an interval
+            returning it. None means never
+        :param max_width: if not None, the gaps wider than this are
+            split in calls of at most this width, stored and cached
+            independently. A last chunk below the rounding tolerance
+            is left to the previous one
+        :param bucket: if not None, the intervals requested are snapped
+            outward to a grid, a pandas offset or its alias for dates,
+            e.g. 'h', 'D', 'B' or 'MS', an integer for integers: the
+            intervals stored have the bounds of the grid whatever the
+            bounds requested
         The storage of intervals is done through a portion.IntervalDict
         see https://github.com/AlexandreDecan/portion
         '''
         # IntervalDict prevent merge of adjacent or overalapping intervales
         # an undesirable feature give the fact that a interval correpsond to an actual call of the function.
         self.intervals = portion.IntervalDict()
-        # calls is the latest
-        self.calls = []
         self.tol = rounding
         self.subintervalsQ = subintervals_requiredQ
         self.subintervals_minQ = subinterval_minQ
+        self.ttl = ttl
+        self.max_width = max_width
+        self.bucket = bucket
+        # the keys of the intervals stored are their stamps:
+        # chunks stored at once must not share one
+        self.last_stamp = None
+        # the calls are local to each planning, the lock
+        # protects the stored intervals while planning
+        self.lock = threading.RLock()
 
-    def disjunct(self, i):
+    def __getstate__(self):
+        # recorders may be stored in a persistent cache
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        # recorders saved before these options
+        state.setdefault('max_width', None)
+        state.setdefault('last_stamp', None)
+        state.setdefault('bucket', None)
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def disjunct(self, i, calls):
         '''
         if i is disjunct from all previously
         stored intervals:
@@ -56,14 +95,50 @@ class RecordIntervals:
         :param i: an interval that
                has no overlap wih
                any previously stored interval
+        :param calls: the calls being planned
         '''
         if self.tol is not None:
             if i.upper - i.lower <= self.tol: return
 
-        self.intervals[i] = pdl.now()
-        self.calls.append(i)
+        for chunk in self.chunks(i):
+            self.intervals[chunk] = self.stamp()
+            calls.append(chunk)
+
+    def stamp(self):
+        '''
+        :return: the time of a call, later than the previous one
+        '''
+        now = pdl.now()
+        if self.last_stamp is not None and now <= self.last_stamp:
+            now = self.last_stamp.add(microseconds=1)
+        self.last_stamp = now
+        return now
+
+    def chunks(self, i):
+        '''
+        :param i: an atomic interval to call
+        :return: the consecutive intervals of at most max_width
+                 covering it. The bounds between them belong to
+                 the next one if i is closed on the left, to the
+                 previous one otherwise
+        '''
+        if self.max_width is None or i.lower == -portion.inf or i.upper == portion.inf \
+                or i.upper - i.lower <= self.max_width:
+            return [i]
+        bounds = [i.lower]
+        while i.upper - bounds[-1] > self.max_width:
+            bounds.append(bounds[-1] + self.max_width)
+        if self.tol is not None and i.upper - bounds[-1] <= self.tol:
+            bounds.pop()
+        bounds.append(i.upper)
+        inner_left = portion.CLOSED if i.left == portion.CLOSED else portion.OPEN
+        inner_right = portion.OPEN if i.left == portion.CLOSED else portion.CLOSED
+        n = len(bounds) - 1
+        return [portion.Interval.from_atomic(i.left if k == 0 else inner_left, lower, upper,
+                                             i.right if k == n - 1 else inner_right)
+                for k, (lower, upper) in enumerate(pairwise(bounds))]
 
-    def contained(self, s):
+    def contained(self, s, calls):
         '''
         if i is contained in one of the
         stored intervals:
@@ -74,9 +149,9 @@ class RecordIntervals:
                   contains the interval
                   passed originally as
                   argument to the function
+        :param calls: the calls being planned
         '''
-        self.calls.append(list(s))
-        pass
+        calls.append(list(s))
 
     def __call__(self, i):
         '''
@@ -85,14 +160,24 @@ class RecordIntervals:
                 as parameter to the function
         :return: the calls to be made
         '''
-        # reinitialise calls.
-        self.calls = []
+        if self.bucket is not None:
+            i = snap_interval(i, self.bucket)
+        with self.lock:
+            return self.plan(i)
+
+    def plan(self, i):
+        '''
+        :param i: the original interval passed
+                as parameter to the function
+        :return: the calls to be made
+        '''
+        calls = []
         try:
             itvls_overlap = self.intervals[i]
         except Exception as e:
             logging.getLogger(__name__).error(f'{e}', exc_info=True)
         if len(itvls_overlap.keys()) == 0:
-            self.disjunct(i)
+            self.disjunct(i, calls)
         else:
             if not self.subintervalsQ:
                 ''' 
@@ -102,13 +187,13 @@ class RecordIntervals:
                 can be faster than querying again
                 '''
                 for s in self.intervals.keys():
-                    if not (i & s).empty: self.contained(s)
+                    if not (i & s).empty: self.contained(s, calls)
                 intervals = portion.empty()
                 for s in itvls_overlap.keys():
                     intervals = intervals | s  # itertools.accumulate(itvls_overlap, lambda i,o: i | o   )
                 disjuncts = i - intervals
                 for s in disjuncts:
-                    if not s.empty: self.disjunct(s)
+                    if not s.empty: self.disjunct(s, calls)
             else:
                 '''
                 if a subset of an existing interval is requested then break it down
@@ -124,10 +209,10 @@ class RecordIntervals:
                     for s in self.intervals:
                         if s in i:
                             intervals_contained |= s
-                            self.contained(s)
+                            self.contained(s, calls)
                     disjuncts = i - intervals_contained
                     for s in disjuncts:
-                        if not s.empty: self.disjunct(s)
+                        if not s.empty: self.disjunct(s, calls)
                 else:
                     '''
                     both overlapping intervals will be split
@@ -142,19 +227,98 @@ class RecordIntervals:
                     if len(diff):
                         diff = diff[-1]
                         for s in diff:
-                            self.disjunct(s)
+                            self.disjunct(s, calls)
                     inter = []
                     for s in self.intervals:
                         inter = s & i
                         for ii in inter:
                             if ii not in self.intervals:
-                                self.disjunct(ii)
+                                self.disjunct(ii, calls)
                             else:
-                                if ii not in self.calls:
-                                    self.contained(ii)
+                                if ii not in calls:
+                                    self.contained(ii, calls)
 
-        calls = sorted(flatten(self.calls))
-        return calls
+        return sorted(flatten(calls))
+
+    def fragments(self):
+        '''
+        :return: the atomic intervals stored, sorted.
+                 Each one is the interval of a cached call
+        '''
+        with self.lock:
+            return sorted(flatten([list(s) for s in self.intervals.keys()]))
+
+    def runs(self):
+        '''
+        :return: the runs of adjacent fragments, as lists
+                 of at least two fragments
+        '''
+        with self.lock:
+            fragments = sorted(flatten([list(s) for s in self.intervals.keys()]))
+        runs = []
+        run = []
+        for s in fragments:
+            if len(run) and not (run[-1] | s).atomic:
+                if len(run) > 1: runs.append(run)
+                run = []
+            run.append(s)
+        if len(run) > 1: runs.append(run)
+        return runs
+
+    def merge(self, run, freshQ=False):
+        '''
+        Store a run of adjacent fragments as a single interval,
+        as if it had been called at once, when its oldest fragment was:
+        merging does not refresh the data, which expires as before
+        :param run: a list of adjacent fragments
+        :param freshQ: whether the merged interval is fetched again,
+               in which case it is stamped now
+        :return: the merged interval
+        '''
+        union = portion.empty()
+        for s in run:
+            union = union | s
+        with self.lock:
+            if freshQ:
+                stamp = self.stamp()
+            else:
+                stamp = min(stamp for s, stamp in self.intervals.items() if not (s & union).empty)
+            self.intervals[union] = stamp
+        return union
+
+    def remove(self, i):
+        '''
+        Forget an interval: it is no longer covered and
+        will be fetched again when requested
+        :param i: the interval removed
+        '''
+        with self.lock:
+            del self.intervals[i]
+
+    def time_to_live(self, fragment):
+        '''
+        :param fragment: a fragment stored
+        :return: its time to live, None if it never expires
+        '''
+        return self.ttl(fragment) if callable(self.ttl) else self.ttl
+
+    def expired(self):
+        '''
+        :return: the fragments stored for longer than their time
+                 to live. The time of the call is the value stored
+                 with the intervals
+        '''
+        if self.ttl is None: return []
+        now = pdl.now()
+        with self.lock:
+            items = list(self.intervals.items())
+        expired = []
+        for s, stamp in items:
+            for fragment in s:
+                ttl = self.time_to_live(fragment)
+                if ttl is not None and pd.Timedelta(now - stamp) > pd.Timedelta(ttl):
+                    expired.append(fragment)
+        return sorted(expired)
 
 
 class RecordIntervalsPandas(RecordIntervals):
@@ -165,20 +329,59 @@ class RecordIntervalsPandas(RecordIntervals):
     def __init__(self,
                  rounding=None,
                  subintervals_requiredQ=False,
-                 subinterval_minQ=False):
+                 subinterval_minQ=False,
+                 ttl=None,
+                 max_width=None,
+                 bucket=None):
         '''
         :param time_between_calls allows not updating the
             calls unless a minimum time has passed
         The storage of intervals is done through a portion.IntervalDict
         see https://github.com/AlexandreDecan/portion
         '''
-        super().__init__(rounding, subintervals_requiredQ, subinterval_minQ)
+        super().__init__(rounding, subintervals_requiredQ, subinterval_minQ, ttl, max_width, bucket)
 
     def __call__(self, i):
         calls = super().__call__(pd2po(i))
         calls = list(map(po2pd, flatten(calls)))
         return calls
 
+    def fragments(self):
+        return list(map(po2pd, super().fragments()))
+
+    def runs(self):
+        return [list(map(po2pd, run)) for run in super().runs()]
+
+    def merge(self, run, freshQ=False):
+        return po2pd(super().merge(list(map(pd2po, run)), freshQ))
+
+    def remove(self, i):
+        super().remove(pd2po(i))
+
+    def time_to_live(self, fragment):
+        return super().time_to_live(po2pd(fragment))
+
+    def expired(self):
+        return list(map(po2pd, super().expired()))
+
+
+def ttl_recent(live, horizon, history=None):
+    '''
+    A time to live depending on how recent the data of an interval is:
+    recent data may still change, older data does not.
+    :param live: the time to live of the intervals ending
+           less than horizon ago, or later
+    :param horizon: e.g. a week
+    :param history: the time to live of the older intervals,
+           None for never
+    :return: the function of an interval to pass as ttl
+    '''
+    def ttl(i):
+        upper = pd.Timestamp(interval_bounds(i)[1])
+        return live if upper > pd.Timestamp.now(tz=upper.tz) - pd.Timedelta(horizon) else history
+    return ttl
+
+
 if __name__ == "__main__":
     import logging
     import daiquiri
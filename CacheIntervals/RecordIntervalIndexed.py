@@ -0,0 +1,196 @@
+import bisect
+import portion
+
+from CacheIntervals.utils import flatten
+from CacheIntervals.RecordInterval import RecordIntervals, RecordIntervalsPandas
+
+
+class IntervalIndex:
+    '''
+    A sorted index of the intervals stored by a recorder.
+    It is a drop-in replacement for the portion.IntervalDict
+    used by RecordIntervals:
+    - the stored domain is kept as a list of disjoint atomic
+      intervals (the pieces) sorted by lower bound, along with
+      the value (time of call) each piece was stored with;
+    - since the pieces are disjoint, they are also sorted by
+      upper bound, so that the pieces overlapping an interval
+      are found by bisection on the upper bounds followed by
+      a walk over the overlapping pieces only: O(log n + k)
+    - the pieces sharing a value make up a key, exactly as
+      the keys of a portion.IntervalDict
+    '''
+
+    def __init__(self):
+        self.pieces = []
+        self.uppers = []
+        self.values = []
+        self.by_value = {}
+
+    def __len__(self):
+        return len(self.by_value)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return list(self.by_value.values())
+
+    def items(self):
+        return [(key, value) for value, key in self.by_value.items()]
+
+    def _span(self, i):
+        '''
+        :param i: an atomic interval
+        :return: the range of indices of the pieces that
+                 may overlap i
+        '''
+        start = bisect.bisect_left(self.uppers, i.lower)
+        end = start
+        n = len(self.pieces)
+        while end < n and self.pieces[end].lower <= i.upper:
+            end += 1
+        return start, end
+
+    def values_overlapping(self, i):
+        '''
+        :param i: an atomic interval
+        :return: the values of the keys overlapping i
+                 in the order the pieces are met
+        '''
+        values = {}
+        start, end = self._span(i)
+        for k in range(start, end):
+            if (self.pieces[k] & i).empty: continue
+            values[self.values[k]] = None
+        return list(values)
+
+    def keys_overlapping(self, i):
+        '''
+        :param i: an atomic interval
+        :return: the keys, i.e. the (possibly non-atomic) interval
+                 stored with a given value, overlapping i
+        '''
+        return [self.by_value[v] for v in self.values_overlapping(i)]
+
+    def _replace(self, i, value=None):
+        '''
+        Removes the atomic interval i from the stored domain
+        and, if a value is passed, stores i with that value.
+        '''
+        start, end = self._span(i)
+        pieces = []
+        values = []
+        for k in range(start, end):
+            piece, v = self.pieces[k], self.values[k]
+            if (piece & i).empty:
+                pieces.append(piece)
+                values.append(v)
+                continue
+            remainder = piece - i
+            self.by_value[v] = self.by_value[v] - i
+            if self.by_value[v].empty: del self.by_value[v]
+            for r in remainder:
+                pieces.append(r)
+                values.append(v)
+        if value is not None:
+            position = 0
+            while position < len(pieces) and pieces[position] < i:
+                position += 1
+            pieces.insert(position, i)
+            values.insert(position, value)
+            self.by_value[value] = self.by_value.get(value, portion.empty()) | i
+        self.pieces[start:end] = pieces
+        self.values[start:end] = values
+        self.uppers[start:end] = [p.upper for p in pieces]
+
+    def __setitem__(self, i, value):
+        for atomic in i:
+            self._replace(atomic, value)
+
+    def __delitem__(self, i):
+        for atomic in i:
+            self._replace(atomic)
+
+    def domain(self):
+        return portion.Interval(*self.pieces)
+
+    def as_intervaldict(self):
+        '''
+        :return: the equivalent portion.IntervalDict
+        '''
+        intervals = portion.IntervalDict()
+        for piece, value in zip(self.pieces, self.values):
+            intervals[piece] = value
+        return intervals
+
+
+class RecordIntervalsIndexed(RecordIntervals):
+    '''
+    Same planning as RecordIntervals, with the three strategies,
+    but the stored intervals are kept in a sorted IntervalIndex.
+    RecordIntervals scans every stored interval on each call,
+    so the planning cost grows with the number of fragments ever
+    recorded. Here only the stored intervals overlapping the
+    requested one are visited.
+    '''
+
+    def __init__(self,
+                 rounding=None,
+                 subintervals_requiredQ=False,
+                 subinterval_minQ=False,
+                 ttl=None,
+                 max_width=None,
+                 bucket=None):
+        super().__init__(rounding, subintervals_requiredQ, subinterval_minQ, ttl, max_width, bucket)
+        self.intervals = IntervalIndex()
+
+    def plan(self, i):
+        '''
+        :param i: the original interval passed
+                as parameter to the function
+        :return: the calls to be made
+        '''
+        calls = []
+        itvls_overlap = self.intervals.keys_overlapping(i)
+        if len(itvls_overlap) == 0:
+            self.disjunct(i, calls)
+        elif not self.subintervalsQ:
+            # the whole stored intervals are returned
+            intervals = portion.empty()
+            for s in itvls_overlap:
+                self.contained(s, calls)
+                intervals = intervals | s
+            for s in i - intervals:
+                if not s.empty: self.disjunct(s, calls)
+        elif not self.subintervals_minQ:
+            # the stored intervals contained in i are reused,
+            # the new intervals called are not split
+            intervals_contained = portion.empty()
+            for s in itvls_overlap:
+                if s in i:
+                    intervals_contained |= s
+                    self.contained(s, calls)
+            for s in i - intervals_contained:
+                if not s.empty: self.disjunct(s, calls)
+        else:
+            # both overlapping intervals are split
+            intervals = portion.empty()
+            for s in itvls_overlap:
+                intervals = intervals | s
+            for s in i - intervals:
+                self.disjunct(s, calls)
+            for s in itvls_overlap:
+                for ii in s & i:
+                    if ii not in calls:
+                        self.contained(ii, calls)
+
+        return sorted(flatten(calls))
+
+
+class RecordIntervalsIndexedPandas(RecordIntervalsPandas, RecordIntervalsIndexed):
+    '''
+    Adapter allows to pass pandas interval to the
+    RecordIntervalsIndexed class.
+    '''
+    pass
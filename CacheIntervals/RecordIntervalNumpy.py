@@ -0,0 +1,396 @@
+import time
+import numpy as np
+import pandas as pd
+
+from CacheIntervals.RecordInterval import RecordIntervals
+
+# the units of Timestamps, from the finest
+units = ['ns', 'us', 'ms', 's']
+lattice_min, lattice_max = np.iinfo(np.int64).min + 1, np.iinfo(np.int64).max - 1
+
+
+class RecordIntervalsNumpy(RecordIntervals):
+    '''
+    A drop-in replacement for RecordIntervalsPandas for intervals
+    of pandas Timestamps or integers, that does not go through
+    portion intervals.
+
+    The bounds are stored as int64 in sorted numpy arrays, the
+    Timestamps in the finest of the units of those passed, e.g.
+    microseconds, so that the doubled lattice below spans their
+    whole range rather than about 146 years around 1970 in
+    nanoseconds. A Timestamp of a finer unit rescales the stored
+    bounds. The closedness is folded into the
+    bounds by working on a doubled integer lattice: a value v
+    maps to 2v, the open stretch just after it to 2v+1 and the
+    one just before it to 2v-1. Any interval then becomes the
+    closed integer interval [L, U], e.g.:
+        [a, b] -> [2a, 2b]
+        (a, b] -> [2a+1, 2b]
+        [a, b) -> [2a, 2b-1]
+    so that overlaps and differences are exact integer comparisons,
+    computed with vectorized operations.
+    pandas Intervals are only built for the calls returned.
+
+    The stored intervals are disjoint. Each one belongs to a key,
+    i.e. the call that stored it, as the keys of the
+    portion.IntervalDict used by RecordIntervals: the calls
+    returned are the same for the three strategies.
+    '''
+
+    def __init__(self,
+                 rounding=None,
+                 subintervals_requiredQ=False,
+                 subinterval_minQ=False,
+                 ttl=None,
+                 max_width=None,
+                 bucket=None):
+        '''
+        :param rounding: the tolerance, a Timedelta for Timestamps
+               and an integer for integer intervals
+        :param max_width: the maximum width of the calls, a Timedelta
+               for Timestamps and an integer for integer intervals
+        see RecordIntervals
+        '''
+        super().__init__(rounding, subintervals_requiredQ, subinterval_minQ, ttl, max_width, bucket)
+        # the storage is done in the arrays below
+        self.intervals = None
+        self.lowers = np.empty(0, dtype=np.int64)
+        self.uppers = np.empty(0, dtype=np.int64)
+        self.keyids = np.empty(0, dtype=np.int64)
+        self.stamps = np.empty(0, dtype=np.float64)
+        self.nextid = 0
+        # set by the first interval passed
+        self.timestampsQ = None
+        self.tz = None
+        # the unit of the Timestamps on the lattice
+        self.unit = None
+        self.rounding = rounding
+        # the maximum width on the doubled lattice
+        self.width = None
+        if max_width is not None and isinstance(max_width, (int, np.integer)):
+            self.width = 2 * int(max_width)
+
+    def in_unit(self, delta):
+        '''
+        :param delta: a Timedelta or its alias
+        :return: the number of units of the lattice in it
+        '''
+        return pd.Timedelta(delta) // pd.Timedelta(1, unit=self.unit)
+
+    def rescale(self, unit):
+        '''
+        Move the stored bounds to a finer unit of Timestamps
+        :param unit: 's', 'ms', 'us' or 'ns'
+        '''
+        if self.unit is not None:
+            factor = pd.Timedelta(1, unit=self.unit) // pd.Timedelta(1, unit=unit)
+            limit = lattice_max // factor - 1
+            if len(self.lowers) and max(abs(int(self.lowers[0])), abs(int(self.uppers[-1]))) > limit:
+                raise Exception(f'The intervals stored are too far apart to be recorded in {unit}')
+            # the open bounds stay just after a value for the
+            # lower bounds and just before one for the upper bounds
+            odd = self.lowers % 2
+            self.lowers = (self.lowers - odd) * factor + odd
+            odd = self.uppers % 2
+            self.uppers = (self.uppers + odd) * factor - odd
+        self.unit = unit
+        if self.rounding is not None and not isinstance(self.rounding, (int, np.integer)):
+            self.tol = self.in_unit(self.rounding)
+        if self.max_width is not None and not isinstance(self.max_width, (int, np.integer)):
+            self.width = 2 * self.in_unit(self.max_width)
+
+    def encode(self, i):
+        '''
+        :param i: a pandas Interval
+        :return: the bounds of i on the doubled lattice
+        '''
+        if not isinstance(i, pd.Interval): raise Exception('Not a pandas interval')
+        if self.timestampsQ is None:
+            self.timestampsQ = isinstance(i.left, pd.Timestamp)
+            self.tz = i.left.tz if self.timestampsQ else None
+        if self.timestampsQ:
+            unit = min(i.left.unit, i.right.unit, key=units.index) if self.unit is None else \
+                min(i.left.unit, i.right.unit, self.unit, key=units.index)
+            if unit != self.unit: self.rescale(unit)
+            lower, upper = (int(t.as_unit(unit).asm8.astype(np.int64)) for t in (i.left, i.right))
+        elif isinstance(i.left, (int, np.integer)):
+            lower, upper = int(i.left), int(i.right)
+        else:
+            raise Exception(f'Unsupported interval bounds: {i}')
+        lower, upper = 2 * lower + (0 if i.closed_left else 1), 2 * upper - (0 if i.closed_right else 1)
+        if not (lattice_min <= lower <= lattice_max and lattice_min <= upper <= lattice_max):
+            raise Exception(f'The bounds of {i} are out of the range of the doubled lattice')
+        return lower, upper
+
+    def decode(self, lowers, uppers):
+        '''
+        :param lowers: bounds on the doubled lattice
+        :param uppers: bounds on the doubled lattice
+        :return: the list of pandas Intervals
+        '''
+        values_lower = (lowers >> 1).tolist()
+        values_upper = ((uppers + 1) >> 1).tolist()
+        closed_left = (lowers % 2 == 0).tolist()
+        closed_right = (uppers % 2 == 0).tolist()
+        closed = {(True, True): 'both', (True, False): 'left',
+                  (False, True): 'right', (False, False): 'neither'}
+        if self.timestampsQ:
+            to_value = lambda v: pd.Timestamp(np.datetime64(v, self.unit)).tz_localize('UTC').tz_convert(self.tz) \
+                if self.tz is not None else pd.Timestamp(np.datetime64(v, self.unit))
+        else:
+            to_value = int
+        return [pd.Interval(to_value(lower), to_value(upper), closed=closed[(cl, cr)])
+                for lower, upper, cl, cr in zip(values_lower, values_upper, closed_left, closed_right)]
+
+    @staticmethod
+    def gaps(lower, upper, lowers, uppers):
+        '''
+        :param lower, upper: the requested interval
+        :param lowers, uppers: sorted disjoint stored intervals
+        :return: the parts of the requested interval not covered
+        '''
+        gaps_lower = np.concatenate(([lower], uppers + 1))
+        gaps_upper = np.concatenate((lowers - 1, [upper]))
+        nonempty = gaps_lower <= gaps_upper
+        return gaps_lower[nonempty], gaps_upper[nonempty]
+
+    @staticmethod
+    def starts_adjacent(lowers, uppers, keyids):
+        '''
+        :return: the mask of the intervals not following
+                 an adjacent interval from a same key
+        '''
+        return np.concatenate(([True], (lowers[1:] != uppers[:-1] + 1) | (keyids[1:] != keyids[:-1])))
+
+    @staticmethod
+    def merge_adjacent(lowers, uppers, keyids):
+        '''
+        Adjacent intervals from a same key are a single interval
+        of that key.
+        '''
+        if len(lowers) < 2: return lowers, uppers
+        starts = RecordIntervalsNumpy.starts_adjacent(lowers, uppers, keyids)
+        ends = np.concatenate((starts[1:], [True]))
+        return lowers[starts], uppers[ends]
+
+    def overlapping(self, lower, upper):
+        '''
+        :return: the range of the stored intervals overlapping
+                 [lower, upper], and the masks of those in that range
+                 extending beyond it on the left and on the right
+        '''
+        start = np.searchsorted(self.uppers, lower, 'left')
+        end = np.searchsorted(self.lowers, upper, 'right')
+        lowers, uppers = self.lowers[start:end], self.uppers[start:end]
+        left = lowers < lower
+        right = uppers > upper
+        return start, end, left, right
+
+    def store(self, lower, upper, stamp=None):
+        '''
+        Store the interval [lower, upper] under a new key,
+        overwriting the stored intervals it overlaps.
+        :param stamp: the time of its call, by default now
+        '''
+        start, end, left, right = self.overlapping(lower, upper)
+        lowers, uppers = self.lowers[start:end], self.uppers[start:end]
+        keyids, stamps = self.keyids[start:end], self.stamps[start:end]
+        self.lowers = np.concatenate((self.lowers[:start], lowers[left], [lower],
+                                      np.maximum(lowers[right], upper + 1), self.lowers[end:]))
+        self.uppers = np.concatenate((self.uppers[:start], np.minimum(uppers[left], lower - 1), [upper],
+                                      uppers[right], self.uppers[end:]))
+        self.keyids = np.concatenate((self.keyids[:start], keyids[left], [self.nextid],
+                                      keyids[right], self.keyids[end:]))
+        self.stamps = np.concatenate((self.stamps[:start], stamps[left], [time.time() if stamp is None else stamp],
+                                      stamps[right], self.stamps[end:]))
+        self.nextid += 1
+
+    def remove(self, i):
+        '''
+        Forget an interval: it is no longer covered
+        :param i: a pandas Interval
+        '''
+        lower, upper = self.encode(i)
+        with self.lock:
+            start, end, left, right = self.overlapping(lower, upper)
+            lowers, uppers = self.lowers[start:end], self.uppers[start:end]
+            keyids, stamps = self.keyids[start:end], self.stamps[start:end]
+            self.lowers = np.concatenate((self.lowers[:start], lowers[left],
+                                          np.maximum(lowers[right], upper + 1), self.lowers[end:]))
+            self.uppers = np.concatenate((self.uppers[:start], np.minimum(uppers[left], lower - 1),
+                                          uppers[right], self.uppers[end:]))
+            self.keyids = np.concatenate((self.keyids[:start], keyids[left], keyids[right], self.keyids[end:]))
+            self.stamps = np.concatenate((self.stamps[:start], stamps[left], stamps[right], self.stamps[end:]))
+
+    def expired(self):
+        '''
+        :return: the fragments stored for longer than their
+                 time to live, as pandas Intervals
+        '''
+        if self.ttl is None: return []
+        now = time.time()
+        with self.lock:
+            lowers, uppers, keyids, stamps = self.lowers, self.uppers, self.keyids, self.stamps
+        if len(lowers) == 0: return []
+        starts = self.starts_adjacent(lowers, uppers, keyids)
+        ends = np.concatenate((starts[1:], [True]))
+        fragments = self.decode(lowers[starts], uppers[ends])
+        expired = []
+        for fragment, stamp in zip(fragments, stamps[starts].tolist()):
+            ttl = self.time_to_live(fragment)
+            if ttl is not None and now - stamp > pd.Timedelta(ttl).total_seconds():
+                expired.append(fragment)
+        return expired
+
+    def disjunct(self, i, calls):
+        '''
+        Store and call the intervals, skipping those below tolerance
+        :param i: a pair of arrays of intervals on the doubled lattice
+        :param calls: the calls being planned
+        '''
+        lowers, uppers = i
+        if self.tol is not None:
+            above = ((uppers + 1) >> 1) - (lowers >> 1) > self.tol
+            lowers, uppers = lowers[above], uppers[above]
+        if self.width is not None and len(lowers) and (uppers - lowers > self.width).any():
+            lowers, uppers = self.chunks_lattice(lowers, uppers)
+        for lower, upper in zip(lowers.tolist(), uppers.tolist()):
+            self.store(lower, upper)
+        calls.append((lowers, uppers))
+
+    def chunks_lattice(self, lowers, uppers):
+        '''
+        :param lowers, uppers: intervals on the doubled lattice
+        :return: the intervals split in chunks of at most max_width.
+                 The chunks start every 2 * max_width from the lower
+                 bound, with its parity: the bounds between them
+                 belong to the next chunk if the interval is closed
+                 on the left, to the previous one otherwise. The upper
+                 bound of a closed interval belongs to the last chunk
+        '''
+        chunks_lowers, chunks_uppers = [], []
+        for lower, upper in zip(lowers.tolist(), uppers.tolist()):
+            starts = np.arange(lower, upper + 1, self.width, dtype=np.int64)
+            # the chunk of the upper bound alone is left to the previous one
+            if len(starts) > 1 and starts[-1] == upper:
+                starts = starts[:-1]
+            # a last chunk below tolerance is left to the previous one
+            if self.tol is not None and len(starts) > 1 and ((upper + 1) >> 1) - (int(starts[-1]) >> 1) <= self.tol:
+                starts = starts[:-1]
+            chunks_lowers.append(starts)
+            chunks_uppers.append(np.concatenate((starts[1:] - 1, [upper])))
+        return np.concatenate(chunks_lowers), np.concatenate(chunks_uppers)
+
+    def contained(self, s, calls):
+        '''
+        :param s: a pair of arrays of stored intervals
+                  on the doubled lattice
+        :param calls: the calls being planned
+        '''
+        calls.append(s)
+
+    def plan(self, i):
+        '''
+        :param i: the original pandas interval passed
+                as parameter to the function
+        :return: the calls to be made as pandas intervals
+        '''
+        calls = []
+        lower, upper = self.encode(i)
+        if lower > upper: return []
+        start = np.searchsorted(self.uppers, lower, 'left')
+        end = np.searchsorted(self.lowers, upper, 'right')
+        if start == end:
+            self.disjunct((np.array([lower]), np.array([upper])), calls)
+        elif not self.subintervalsQ:
+            # the whole stored intervals of the keys overlapping i
+            inkeys = np.isin(self.keyids, np.unique(self.keyids[start:end]))
+            gaps = self.gaps(lower, upper, self.lowers[start:end], self.uppers[start:end])
+            self.contained(self.merge_adjacent(self.lowers[inkeys], self.uppers[inkeys], self.keyids[inkeys]), calls)
+            self.disjunct(gaps, calls)
+        elif not self.subintervals_minQ:
+            # the keys whose stored intervals are all contained in i
+            candidates = np.unique(self.keyids[start:end])
+            inkeys = np.isin(self.keyids, candidates)
+            outside = inkeys & ((self.lowers < lower) | (self.uppers > upper))
+            inkeys &= ~np.isin(self.keyids, self.keyids[outside])
+            lowers, uppers = self.lowers[inkeys], self.uppers[inkeys]
+            gaps = self.gaps(lower, upper, lowers, uppers)
+            self.contained(self.merge_adjacent(lowers, uppers, self.keyids[inkeys]), calls)
+            self.disjunct(gaps, calls)
+        else:
+            # the stored intervals are split by i
+            lowers = np.maximum(self.lowers[start:end], lower)
+            uppers = np.minimum(self.uppers[start:end], upper)
+            gaps = self.gaps(lower, upper, self.lowers[start:end], self.uppers[start:end])
+            self.contained(self.merge_adjacent(lowers, uppers, self.keyids[start:end]), calls)
+            self.disjunct(gaps, calls)
+
+        lowers = np.concatenate([c[0] for c in calls])
+        uppers = np.concatenate([c[1] for c in calls])
+        order = np.argsort(lowers, kind='stable')
+        return self.decode(lowers[order], uppers[order])
+
+    def fragments(self):
+        '''
+        :return: the intervals stored, sorted, as pandas Intervals
+        '''
+        with self.lock:
+            lowers, uppers = self.merge_adjacent(self.lowers, self.uppers, self.keyids)
+            return self.decode(lowers, uppers)
+
+    def runs(self):
+        '''
+        :return: the runs of adjacent fragments, as lists
+                 of at least two pandas Intervals
+        '''
+        with self.lock:
+            lowers, uppers = self.merge_adjacent(self.lowers, self.uppers, self.keyids)
+        breaks = np.flatnonzero(lowers[1:] != uppers[:-1] + 1) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(lowers)]))
+        return [self.decode(lowers[start:end], uppers[start:end])
+                for start, end in zip(starts.tolist(), ends.tolist()) if end - start > 1]
+
+    def merge(self, run, freshQ=False):
+        '''
+        Store a run of adjacent fragments under a single key,
+        stamped as its oldest fragment, see RecordIntervals.merge
+        :param run: a list of adjacent pandas Intervals
+        :param freshQ: whether the merged interval is fetched again
+        :return: the merged interval
+        '''
+        lower, _ = self.encode(run[0])
+        _, upper = self.encode(run[-1])
+        with self.lock:
+            start, end, _, _ = self.overlapping(lower, upper)
+            self.store(lower, upper, None if freshQ else self.stamps[start:end].min())
+        return self.decode(np.array([lower]), np.array([upper]))[0]
+
+
+if __name__ == "__main__":
+    import logging
+    import daiquiri
+    from CacheIntervals.RecordInterval import RecordIntervalsPandas
+    from CacheIntervals.utils.Timer import Timer
+
+    daiquiri.setup(logging.INFO)
+
+    #                Benchmark against the portion based recorder
+    if True:
+        days = pd.date_range('2021-01-01', periods=1000, freq='D', tz='UTC')
+        for subQ, minQ in [(False, False), (True, False), (True, True)]:
+            print(f'subintervals_requiredQ={subQ}, subinterval_minQ={minQ}')
+            for classrecorder in [RecordIntervalsPandas, RecordIntervalsNumpy]:
+                itvals = classrecorder(subintervals_requiredQ=subQ, subinterval_minQ=minQ)
+                # incremental daily calls
+                with Timer() as timer_incremental:
+                    for left, right in zip(days[:-1], days[1:]):
+                        itvals(pd.Interval(left, right, closed='left'))
+                # wide reads over the recorded fragments
+                with Timer() as timer_wide:
+                    for k in range(0, 900, 30):
+                        calls = itvals(pd.Interval(days[k], days[k + 90], closed='left'))
+                print(f'{classrecorder.__name__:>24}: incremental {timer_incremental.interval:.3f}s, '
+                      f'wide reads {timer_wide.interval:.3f}s, {len(calls)} calls')
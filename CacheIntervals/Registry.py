@@ -0,0 +1,92 @@
+import collections
+import threading
+
+RegistryInfo = collections.namedtuple('RegistryInfo', ['size', 'maxsize', 'evictions'])
+
+
+class RecorderRegistry:
+    '''
+    The interval recorders of a function memoized with intervals,
+    by key of its non-interval arguments.
+    They are kept apart from the results: finding them is a dictionary
+    access rather than a call to the memoized function, and they do not
+    compete with the results for the slots of the memoization.
+    Beyond maxsize, the recorders of the least recently used arguments
+    are dropped: their intervals are fetched again when requested.
+    '''
+
+    def __init__(self, maxsize=None):
+        '''
+        :param maxsize: if not None, the maximum number of sets
+               of non-interval arguments whose recorders are kept
+        '''
+        self.maxsize = maxsize
+        # key -> (args, kwargs) with the recorders in place
+        # of the intervals, least recently used first
+        self.entries = collections.OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, factory):
+        '''
+        :param key: the key of the non-interval arguments
+        :param factory: a function returning new recorders
+        :return: the pair args, kwargs of the key, created
+                 by the factory if there is none
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = factory()
+                self.trim()
+            elif self.maxsize is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def peek(self, key):
+        '''
+        :return: the pair args, kwargs of the key, or None,
+                 without marking it as used
+        '''
+        with self.lock:
+            return self.entries.get(key)
+
+    def trim(self):
+        while self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        with self.lock:
+            return self.entries[key]
+
+    def __setitem__(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.trim()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries.keys())
+
+    def values(self):
+        with self.lock:
+            return list(self.entries.values())
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        with self.lock:
+            return RegistryInfo(len(self.entries), self.maxsize, self.evictions)
@@ -12,4 +12,11 @@ import sys
 
 sys.path.append('.')
 
-from .MemoizationIntervals import MemoizationWithIntervals
\ No newline at end of file
+from .MemoizationIntervals import MemoizationWithIntervals
+from .AsyncMemoizationIntervals import AsyncMemoizationWithIntervals
+from .Eviction import ByteBudget
+from .Registry import RecorderRegistry
+from .Metrics import Metrics
+from .Coalescing import GapCoalescing
+from .AggregateTree import PartialAggregates
+from .Prefetching import StridePrefetcher
@@ -0,0 +1,54 @@
+import sys
+import numpy as np
+import pandas as pd
+
+from CacheIntervals.Intervals import interval_bounds
+
+
+def trim_frame(df, on, interval):
+    '''
+    Slice a frame to the rows within an interval
+    :param df: a DataFrame or a Series
+    :param on: the name of the column, or of the index,
+               holding the values to compare to the interval
+    :param interval: a pandas or portion interval
+    :return: the rows of df within the interval. If the values
+             are sorted, they are found by binary search and
+             the slice is a view rather than a copy. Arrow tables
+             are sliced by trim_table
+    '''
+    if type(df).__module__.startswith('pyarrow') and type(df).__name__ == 'Table':
+        # pyarrow is only required for Arrow results
+        from CacheIntervals.ColumnarCache import trim_table
+        return trim_table(df, on, interval)
+    if not isinstance(df, (pd.DataFrame, pd.Series)): return df
+    if isinstance(df, pd.DataFrame) and on in df.columns:
+        values = df[on]
+    elif on == df.index.name or on == 'index':
+        values = df.index
+    else:
+        raise Exception(f'No column or index named {on} to trim on')
+    lower, upper, closed_left, closed_right = interval_bounds(interval)
+    if values.is_monotonic_increasing:
+        start = values.searchsorted(lower, side='left' if closed_left else 'right')
+        end = values.searchsorted(upper, side='right' if closed_right else 'left')
+        return df.iloc[start:end]
+    inside = (values >= lower if closed_left else values > lower) & \
+             (values <= upper if closed_right else values < upper)
+    return df[np.asarray(inside)]
+
+
+def sizeof(result, deep=True):
+    '''
+    :param result: a result of a memoized function
+    :param deep: whether the objects referenced by the columns of
+           DataFrames, e.g. strings, are measured, which visits them
+    :return: its size in bytes
+    '''
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=deep).sum())
+    if isinstance(result, (pd.Series, pd.Index)):
+        return int(result.memory_usage(deep=deep))
+    if type(result).__module__.startswith('pyarrow') and hasattr(result, 'nbytes'):
+        return int(result.nbytes)
+    return sys.getsizeof(result)
@@ -55,6 +55,102 @@ class ArgsSolver:
         if self.split_args_kwargsQ: return args_only_and_values, kwargs_and_values
         return args_and_values
 
+
+class Binder:
+    '''
+    Binds the arguments of a call to a function memoized with intervals
+    in a single call to a function generated once from its signature,
+    rather than walking the signature on every call as ArgsSolver.
+    The call is laid out as the memoized function is called:
+    - the positional arguments: the parameters without default, or all
+      the positional parameters followed by *args if the function has some;
+    - the named arguments: the other parameters, including the
+      keyword-only ones, followed by **kwargs sorted by name.
+    The interval parameters are indexed in these positional or named
+    arguments, as the pos_args and names_kwarg of MemoizationWithIntervals.
+    '''
+
+    def __init__(self, f, pos_args, names_kwarg, placeholder=None):
+        '''
+        :param f: the function memoized
+        :param pos_args: the indices of the interval parameters
+               in the positional arguments
+        :param names_kwarg: the names of the interval parameters
+               in the named arguments
+        :param placeholder: the value put in place of the intervals
+               in the fixed arguments
+        '''
+        P = inspect.Parameter
+        name_f = getattr(f, '__qualname__', type(f).__qualname__)
+        params = list(inspect.signature(f).parameters.values())
+        varargs = [p.name for p in params if p.kind == P.VAR_POSITIONAL]
+        varkw = [p.name for p in params if p.kind == P.VAR_KEYWORD]
+        positional = [p.name for p in params
+                      if p.kind == P.POSITIONAL_ONLY or
+                      (p.kind == P.POSITIONAL_OR_KEYWORD and (varargs or p.default is p.empty))]
+        named = [p.name for p in params
+                 if p.kind in (P.POSITIONAL_OR_KEYWORD, P.KEYWORD_ONLY) and p.name not in positional]
+        self.pos_args = list(pos_args)
+        self.names_kwarg = list(names_kwarg)
+        for i in self.pos_args:
+            if not 0 <= i < len(positional):
+                raise Exception(f'No positional parameter {i} in the signature of {name_f}: {positional}')
+        for name in self.names_kwarg:
+            if name not in named:
+                raise Exception(f'No named parameter {name} in the signature of {name_f}: {named}')
+        self.positional = positional
+        self.named = named
+        # the ranks of the interval parameters in the positional and named arguments
+        self.slots = [(False, i) for i in self.pos_args] + [(True, name) for name in self.names_kwarg]
+        # the parameters, with the defaults read from a dictionary
+        defaults = {p.name: p.default for p in params if p.default is not p.empty}
+        last_positional_only = ([p.name for p in params if p.kind == P.POSITIONAL_ONLY] or [None])[-1]
+        source_params = []
+        for p in params:
+            if p.kind == P.VAR_POSITIONAL:
+                source_params.append(f'*{p.name}')
+                continue
+            if p.kind == P.VAR_KEYWORD:
+                source_params.append(f'**{p.name}')
+                continue
+            if p.kind == P.KEYWORD_ONLY and not varargs and '*' not in source_params:
+                source_params.append('*')
+            source_params.append(p.name if p.default is p.empty else f'{p.name}=__defaults[{p.name!r}]')
+            if p.name == last_positional_only:
+                source_params.append('/')
+        pos_set, names_set = set(self.pos_args), set(self.names_kwarg)
+        items_args = ['__placeholder' if i in pos_set else name for i, name in enumerate(positional)]
+        items_args += [f'*{name}' for name in varargs]
+        items_kwargs = [f'{name!r}: ' + ('__placeholder' if name in names_set else name) for name in named]
+        items_kwargs += [f'**__dict(__sorted({name}.items()))' for name in varkw]
+        items_intervals = [positional[i] for i in self.pos_args] + list(self.names_kwarg)
+        def as_tuple(items):
+            return f'({", ".join(items)},)' if items else '()'
+        self.source = (f'def bind({", ".join(source_params)}):\n'
+                       f'    return {as_tuple(items_args)}, {{{", ".join(items_kwargs)}}}, {as_tuple(items_intervals)}\n')
+        namespace = {'__defaults': defaults, '__placeholder': placeholder, '__dict': dict, '__sorted': sorted}
+        exec(compile(self.source, f'<binder of {name_f}>', 'exec'), namespace)
+        self.bind = namespace['bind']
+
+    def __call__(self, *args, **kwargs):
+        '''
+        :return: the positional arguments as a tuple and the named arguments
+                 as a dictionary, with the placeholder in place of the intervals,
+                 and the tuple of the intervals
+        '''
+        return self.bind(*args, **kwargs)
+
+    def call(self, args_fixed, kwargs_fixed, intervals):
+        '''
+        :param args_fixed, kwargs_fixed: the fixed arguments of a call
+        :param intervals: the values of the interval parameters
+        :return: the pair args, kwargs of the call with these intervals
+        '''
+        args, kwargs = list(args_fixed), dict(kwargs_fixed)
+        for (namedQ, slot), interval in zip(self.slots, intervals):
+            (kwargs if namedQ else args)[slot] = interval
+        return args, kwargs
+
 if __name__ == '__main__':
     import loguru
     import daiquiri
@@ -0,0 +1,72 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+FlightInfo = namedtuple('FlightInfo', ['fetches', 'coalesced', 'inflight'])
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls sharing a key:
+    the first caller makes the call while the
+    following ones wait for its result instead
+    of making the same call again.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.fetches = 0
+        self.coalesced = 0
+
+    def __call__(self, key, fn, *args, **kwargs):
+        '''
+        :param key: a hashable identifying the call
+        :param fn: the function to call
+        :return: the result of fn(*args, **kwargs), possibly
+                 computed by a concurrent caller
+        '''
+        with self.lock:
+            future = self.inflight.get(key)
+            leaderQ = future is None
+            if leaderQ:
+                future = Future()
+                self.inflight[key] = future
+                self.fetches += 1
+            else:
+                self.coalesced += 1
+        if not leaderQ:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.inflight[key]
+
+    def info(self):
+        '''
+        :return: the number of calls made, of calls
+                 coalesced and of calls in flight
+        '''
+        with self.lock:
+            return FlightInfo(self.fetches, self.coalesced, len(self.inflight))
+
+
+if __name__ == '__main__':
+    import time
+    flights = SingleFlight()
+
+    def slow_square(x):
+        time.sleep(1)
+        return x * x
+
+    threads = [threading.Thread(target=flights, args=('square', slow_square, 3)) for _ in range(5)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    print(flights.info())
@@ -3,6 +3,8 @@ import sys
 
 sys.path.append(".")
 from .Dates import pdl2pd, pd2pdl
-from .Functions import get_signature, ArgsSolver
+from .Functions import get_signature, ArgsSolver, Binder
 from .SetsAndIterators import flatten
-from .Timer import Timer
\ No newline at end of file
+from .Timer import Timer
+from .SingleFlight import SingleFlight
+from .Frames import trim_frame, sizeof
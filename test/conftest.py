@@ -0,0 +1,57 @@
+import klepto
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Loader:
+    '''
+    A loader of a row per day of the period, keeping track of its calls
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, period=pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 1, 2))):
+        self.calls.append(period)
+        dates = pd.date_range(period.left, period.right, freq='D', inclusive='right')
+        return pd.DataFrame({'name': name, 'date': dates, 'value': np.arange(len(dates))})
+
+
+class PeriodLoader:
+    '''
+    A loader returning the list of its period, keeping track of its calls
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, period=pd.Interval(0, 1)):
+        self.calls.append(period)
+        return [period]
+
+
+@pytest.fixture
+def new_memoization():
+    '''
+    :return: a factory of memoizations of their own
+    '''
+    def factory():
+        return klepto.lru_cache(
+            maxsize=500,
+            cache=klepto.archives.dict_archive(),
+            keymap=klepto.keymaps.stringmap(typed=False, flat=False))
+    return factory
+
+
+@pytest.fixture
+def loader():
+    return Loader()
+
+
+@pytest.fixture
+def days():
+    return pd.date_range('2021-01-01', periods=11, freq='D')
+
+
+@pytest.fixture
+def period_loader():
+    return PeriodLoader()
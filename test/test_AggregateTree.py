@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals, PartialAggregates, Metrics
+from CacheIntervals.AggregateTree import AggregateTree
+
+
+def test_blocks():
+    assert AggregateTree.blocks(0, 8) == [(3, 0)]
+    assert AggregateTree.blocks(-3, 13) == [(0, -3), (1, -1), (3, 0), (2, 2), (0, 12)]
+    for a, b in [(0, 1), (5, 37), (-17, 4)]:
+        blocks = AggregateTree.blocks(a, b)
+        assert sum(2 ** level for level, _ in blocks) == b - a
+        assert len(blocks) <= 2 * (b - a).bit_length()
+
+
+def test_query():
+    # concatenation is not commutative: the order is checked as well
+    tree = AggregateTree(lambda x, y: x + y)
+    for k in range(-5, 40):
+        if k not in (7, 20): tree.add(k, [k])
+    for a, b in [(-5, 40), (0, 7), (8, 20), (3, 33)]:
+        result, missing = tree.query(a, b)
+        assert result == [k for k in range(a, b) if k not in (7, 20)]
+        assert missing == [k for k in (7, 20) if a <= k < b]
+    tree.add(7, [7])
+    assert tree.query(0, 16) == (list(range(16)), [])
+    tree.remove(3)
+    assert tree.query(0, 8) == ([0, 1, 2, 4, 5, 6, 7], [3])
+    assert len(tree) == 43
+
+
+def sales(names, period=pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1), closed='left')):
+    dates = pd.date_range(period.left, period.right, freq='h', inclusive='left')
+    return pd.Series({name: float(sum(date.day for date in dates)) for name in names})
+
+
+def test_partial_aggregates():
+    calls = []
+
+    def sales_logged(names, period=None):
+        calls.append(period)
+        return sales(names, period)
+
+    metrics = Metrics()
+    sales_cached = MemoizationWithIntervals(
+        [], ['period'],
+        partials=PartialAggregates('D'),
+        metrics=metrics)(sales_logged)
+    january = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1), closed='left')
+    week = pd.Interval(pd.Timestamp(2021, 1, 4), pd.Timestamp(2021, 1, 11), closed='left')
+    assert sales_cached(('A', 'B'), week).equals(sales(('A', 'B'), week))
+    assert len(calls) == 7
+    assert sales_cached(('A', 'B'), january).equals(sales(('A', 'B'), january))
+    assert len(calls) == 31
+    assert sales_cached(('A', 'B'), week).equals(sales(('A', 'B'), week))
+    assert len(calls) == 31
+    assert metrics.info().hits == 7 + 7
+    with pytest.raises(Exception):
+        sales_cached(('A', 'B'), pd.Interval(pd.Timestamp(2021, 1, 4, 12), pd.Timestamp(2021, 1, 11)))
+
+
+def test_partial_aggregates_local_days():
+    calls = []
+
+    def sales_logged(names, period=None):
+        calls.append(period)
+        return sales(names, period)
+
+    sales_cached = MemoizationWithIntervals(
+        [], ['period'],
+        partials=PartialAggregates('D'))(sales_logged)
+    # the days of Paris, the 28th of March lasting 23 hours
+    week = pd.Interval(pd.Timestamp(2021, 3, 25, tz='Europe/Paris'), pd.Timestamp(2021, 4, 1, tz='Europe/Paris'),
+                       closed='left')
+    assert sales_cached(('A',), week).equals(sales(('A',), week))
+    assert len(calls) == 7
+    assert all(call.left.hour == 0 and call.right.hour == 0 for call in calls)
+    assert calls[3].length == pd.Timedelta(hours=23)
+    days = pd.Interval(pd.Timestamp(2021, 3, 27, tz='Europe/Paris'), pd.Timestamp(2021, 3, 30, tz='Europe/Paris'),
+                       closed='left')
+    assert sales_cached(('A',), days).equals(sales(('A',), days))
+    assert len(calls) == 7
+
+
+def test_partial_aggregates_integers():
+    def total(period):
+        return sum(range(period.left, period.right))
+
+    total_cached = MemoizationWithIntervals(
+        [0],
+        partials=PartialAggregates(10, combine=lambda x, y: x + y),
+        max_workers=4)(total)
+    for lower, upper in [(0, 100), (-50, 50), (30, 230)]:
+        assert total_cached(pd.Interval(lower, upper, closed='left')) == sum(range(lower, upper))
+
+
+def test_partial_aggregates_closed():
+    def total(name, period=None):
+        return sum(k for k in range(period.left - 1, period.right + 2) if k in period)
+
+    total_cached = MemoizationWithIntervals(
+        [], ['period'],
+        partials=PartialAggregates(1, combine=lambda x, y: x + y))(total)
+    # the default closedness of pandas intervals
+    assert total_cached('a', pd.Interval(0, 4)) == 10
+    assert total_cached('a', pd.Interval(0, 4, closed='left')) == 6
+    assert total_cached('a', pd.Interval(2, 6)) == 18
+    assert total_cached('a', pd.Interval(2, 6, closed='left')) == 14
+    for closed in ['both', 'neither']:
+        with pytest.raises(Exception):
+            total_cached('a', pd.Interval(0, 4, closed=closed))
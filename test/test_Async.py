@@ -0,0 +1,98 @@
+import asyncio
+
+import pandas as pd
+
+from CacheIntervals import AsyncMemoizationWithIntervals
+from CacheIntervals.utils.Timer import Timer
+
+delay = 0.5
+
+
+class Loader:
+    '''
+    An async loader keeping track of the calls awaited concurrently
+    '''
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.ncalls = 0
+
+    async def __call__(self, name, period=pd.Interval(0, 1)):
+        self.ncalls += 1
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(delay)  # simulating a long SQL request
+        self.running -= 1
+        return [period]
+
+
+def test_async_gaps_awaited_concurrently(new_memoization):
+    loader = Loader()
+
+    @AsyncMemoizationWithIntervals([], ['period'], aggregation=lambda l: sum(l, []),
+                                   memoization=new_memoization())
+    async def load(name, period=pd.Interval(0, 1)):
+        return await loader(name, period)
+
+    async def scenario():
+        await asyncio.gather(*[load('test', period=pd.Interval(k, k + 1)) for k in [1, 3, 5]])
+        with Timer() as timer:
+            periods = await load('test', period=pd.Interval(0, 7))
+        return periods, timer
+
+    periods, timer = asyncio.run(scenario())
+    assert periods == [pd.Interval(k, k + 1) for k in range(7)]
+    assert timer.interval < 2 * delay
+    assert loader.ncalls == 3 + 4
+
+
+def test_async_concurrency_limit(new_memoization):
+    loader = Loader()
+
+    @AsyncMemoizationWithIntervals([], ['period'], aggregation=lambda l: sum(l, []),
+                                   memoization=new_memoization(),
+                                   max_concurrency=2)
+    async def load(name, period=pd.Interval(0, 1)):
+        return await loader(name, period)
+
+    async def scenario():
+        return await asyncio.gather(*[load(name, period=pd.Interval(0, 1)) for name in 'abcde'])
+
+    asyncio.run(scenario())
+    assert loader.ncalls == 5
+    assert loader.max_running == 2
+
+
+def test_async_concurrency_limit_loops(new_memoization):
+    loader = Loader()
+
+    @AsyncMemoizationWithIntervals([], ['period'], aggregation=lambda l: sum(l, []),
+                                   memoization=new_memoization(),
+                                   max_concurrency=2)
+    async def load(name, period=pd.Interval(0, 1)):
+        return await loader(name, period)
+
+    async def scenario(names):
+        return await asyncio.gather(*[load(name, period=pd.Interval(0, 1)) for name in names])
+
+    # each asyncio.run has a loop of its own
+    asyncio.run(scenario('abc'))
+    asyncio.run(scenario('def'))
+    assert loader.ncalls == 6
+    assert loader.max_running == 2
+
+
+def test_async_single_flight(new_memoization):
+    loader = Loader()
+
+    @AsyncMemoizationWithIntervals([], ['period'], aggregation=lambda l: sum(l, []),
+                                   memoization=new_memoization())
+    async def load(name, period=pd.Interval(0, 1)):
+        return await loader(name, period)
+
+    async def scenario():
+        return await asyncio.gather(*[load('test', period=pd.Interval(0, 10)) for _ in range(3)])
+
+    # the requests following the first one await its fetch
+    assert asyncio.run(scenario()) == [[pd.Interval(0, 10)]] * 3
+    assert loader.ncalls == 1
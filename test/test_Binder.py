@@ -0,0 +1,48 @@
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.utils import ArgsSolver, Binder
+
+
+def test_bind():
+    def f(con, name, flag=False, period=pd.Interval(0, 1)):
+        pass
+
+    binder = Binder(f, [], ['period'], placeholder='P')
+    solver = ArgsSolver(f)
+    for args, kwargs in [(('c', 'a'), {}), (('c', 'a', True), {}), (('c', 'a'), {'period': pd.Interval(0, 2)}),
+                         (('c', 'a', True, pd.Interval(0, 3)), {})]:
+        args_fixed, kwargs_fixed, intervals = binder(*args, **kwargs)
+        dargs, dkwargs = solver(*args, **kwargs)
+        assert list(args_fixed) == list(dargs.values())
+        assert kwargs_fixed == {**dkwargs, 'period': 'P'}
+        assert intervals == (dkwargs['period'],)
+        assert binder.call(args_fixed, kwargs_fixed, intervals) == (list(dargs.values()), dict(dkwargs))
+    # the parameters without default passed by name are positional in the calls
+    assert binder('c', name='a') == binder('c', 'a')
+
+
+def test_keyword_only_and_varargs():
+    def f(con, *names, period, step=1, **options):
+        pass
+
+    binder = Binder(f, [], ['period'], placeholder='P')
+    args_fixed, kwargs_fixed, intervals = binder('c', 'a', 'b', period=pd.Interval(0, 1), y=2, x=1)
+    assert args_fixed == ('c', 'a', 'b')
+    # the options are sorted: the order they are passed in does not change the key
+    assert list(kwargs_fixed.items()) == [('period', 'P'), ('step', 1), ('x', 1), ('y', 2)]
+    assert intervals == (pd.Interval(0, 1),)
+
+
+def test_memoization():
+    calls = []
+
+    @MemoizationWithIntervals([], ['period'], aggregation=list)
+    def get_period(name, *, period, scale=1):
+        calls.append(period)
+        return period.length * scale
+
+    assert get_period('a', period=pd.Interval(0, 2)) == [2]
+    assert get_period('a', period=pd.Interval(0, 3), scale=1) == [2, 1]
+    assert calls == [pd.Interval(0, 2), pd.Interval(2, 3)]
+    assert get_period('a', period=pd.Interval(0, 3), scale=2) == [6]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.Intervals import snap
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+recorders = [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy]
+day = pd.Timestamp(2021, 1, 15)
+
+
+def test_snap():
+    ts = day + pd.Timedelta('10h30min')
+    assert (snap(ts, 'h'), snap(ts, 'h', upQ=True)) == (day + pd.Timedelta('10h'), day + pd.Timedelta('11h'))
+    assert (snap(ts, 'MS'), snap(ts, 'MS', upQ=True)) == (pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    # a Friday to the next business day
+    assert snap(ts, 'B', upQ=True) == pd.Timestamp(2021, 1, 18)
+    assert snap(pd.Timestamp(2021, 2, 1), 'MS', upQ=True) == pd.Timestamp(2021, 2, 1)
+    assert (snap(7, 5), snap(7, 5, upQ=True), snap(10, 5, upQ=True)) == (5, 10, 10)
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+def test_bucket(classrecorder):
+    recorder = classrecorder(bucket='h')
+    assert recorder(pd.Interval(day + pd.Timedelta('9h'), day + pd.Timedelta('17h'))) == \
+           [pd.Interval(day + pd.Timedelta('9h'), day + pd.Timedelta('17h'))]
+    # only the hour before is fetched
+    assert recorder(pd.Interval(day + pd.Timedelta('8h30min'), day + pd.Timedelta('16h45min'))) == \
+           [pd.Interval(day + pd.Timedelta('8h'), day + pd.Timedelta('9h')),
+            pd.Interval(day + pd.Timedelta('9h'), day + pd.Timedelta('17h'))]
+
+
+def test_bucket_trimmed():
+    calls = []
+
+    def get_minutes(name, period=pd.Interval(day, day + pd.Timedelta('1h'))):
+        calls.append(period)
+        dates = pd.date_range(period.left, period.right, freq='min', inclusive='right')
+        return pd.DataFrame({'date': dates, 'value': np.arange(len(dates))})
+
+    get_minutes_bucketed = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=pd.concat,
+        trim_on='date',
+        bucket='D')(get_minutes)
+    first = get_minutes_bucketed('A', pd.Interval(day + pd.Timedelta('9h'), day + pd.Timedelta('17h')))
+    second = get_minutes_bucketed('A', pd.Interval(day + pd.Timedelta('8h30min'), day + pd.Timedelta('16h45min')))
+    assert calls == [pd.Interval(day, day + pd.Timedelta('1D'))]
+    assert first['date'].min() == day + pd.Timedelta('9h1min') and len(first) == 8 * 60
+    assert second['date'].max() == day + pd.Timedelta('16h45min') and len(second) == 8 * 60 + 15
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals, GapCoalescing
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+
+def get_values_coalesced(loader, classrecorder, coalescing, memoization):
+    return MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        memoization=memoization,
+        coalescing=coalescing)(loader)
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy])
+def test_coalesce(classrecorder, new_memoization, loader, days):
+    coalescing = GapCoalescing(per_call=1., per_unit=.1, unit=pd.Timedelta(days=1))
+    get_values = get_values_coalesced(loader, classrecorder, coalescing, new_memoization())
+    get_values('A', pd.Interval(days[1], days[2]))
+    get_values('A', pd.Interval(days[3], days[4]))
+    # three gaps around the two days cached: a single call
+    values = get_values('A', pd.Interval(days[0], days[5]))
+    assert loader.calls[2:] == [pd.Interval(days[0], days[5])]
+    assert values['date'].tolist() == list(days[1:6])
+    f_cached = get_values(get_function_cachedQ=True)
+    assert len(f_cached.__cache__()) == 1
+    get_values('A', pd.Interval(days[0], days[5]))
+    assert len(loader.calls) == 3
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsNumpy])
+def test_not_coalesced(classrecorder, new_memoization, loader, days):
+    # refetching a day costs more than a call
+    coalescing = GapCoalescing(per_call=1., per_unit=2., unit=pd.Timedelta(days=1))
+    get_values = get_values_coalesced(loader, classrecorder, coalescing, new_memoization())
+    get_values('A', pd.Interval(days[1], days[2]))
+    get_values('A', pd.Interval(days[3], days[5]))
+    values = get_values('A', pd.Interval(days[0], days[6]))
+    assert loader.calls[2:] == [pd.Interval(days[0], days[1]), pd.Interval(days[2], days[3]),
+                                pd.Interval(days[5], days[6])]
+    assert values['date'].tolist() == list(days[1:7])
+
+
+def test_max_island(new_memoization, loader, days):
+    coalescing = GapCoalescing(per_call=1., per_unit=0., max_island=pd.Timedelta(days=1))
+    get_values = get_values_coalesced(loader, RecordIntervalsPandas, coalescing, new_memoization())
+    get_values('A', pd.Interval(days[1], days[2]))
+    get_values('A', pd.Interval(days[3], days[5]))
+    get_values('A', pd.Interval(days[0], days[6]))
+    # the first island joined, the second one too wide
+    assert loader.calls[2:] == [pd.Interval(days[0], days[3]), pd.Interval(days[5], days[6])]
+
+
+def test_measured_costs():
+    coalescing = GapCoalescing(min_samples=4)
+    coalescing.observe(10, 0.6)
+    assert coalescing.costs() is None
+    for width in [20, 30, 40]:
+        coalescing.observe(width, 0.5 + 0.01 * width)
+    per_call, per_unit = coalescing.costs()
+    assert np.isclose(per_call, 0.5) and np.isclose(per_unit, 0.01)
+    tiles = [pd.Interval(0, 1), pd.Interval(1, 11), pd.Interval(11, 12), pd.Interval(12, 112), pd.Interval(112, 113)]
+    # an island of 10 costs 0.1 to fetch again, one of 100 costs 1
+    assert coalescing(tiles, [True, False, True, False, True]) == [[0, 1, 2], [3], [4]]
+
+
+def test_max_width(new_memoization, loader, days):
+    coalescing = GapCoalescing(per_call=1., per_unit=0.)
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        memoization=new_memoization(),
+        coalescing=coalescing,
+        max_width=pd.Timedelta(days=2))(loader)
+    get_values('A', pd.Interval(days[0], days[5]))
+    # the chunks are not joined again
+    assert loader.calls == [pd.Interval(days[0], days[2]), pd.Interval(days[2], days[4]),
+                            pd.Interval(days[4], days[5])]
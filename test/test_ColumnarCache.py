@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.ColumnarCache import ColumnarCache, ColumnarStore, concat_tables, trim_table
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, period=pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 1, 2))):
+        self.calls.append(period)
+        dates = pd.date_range(period.left, period.right, freq='h', inclusive='right')
+        return pd.DataFrame({'name': name, 'date': dates, 'value': np.arange(len(dates), dtype=float)})
+
+
+def test_columnar_store(tmp_path):
+    store = ColumnarStore(str(tmp_path))
+    df = pd.DataFrame({'a': np.arange(5.)}, index=pd.Index(list('vwxyz'), name='letter'))
+    store['frame'] = df
+    store['other'] = ['not', 'a', 'frame']
+    assert 'frame' in store and 'other' in store
+    pd.testing.assert_frame_equal(store['frame'], df, check_index_type=False)
+    assert store['other'] == ['not', 'a', 'frame']
+    # the frames are found again by a new store on the same directory
+    store_reopened = ColumnarStore(str(tmp_path))
+    assert store_reopened.keys() == ['frame']
+    pd.testing.assert_frame_equal(store_reopened['frame'], df, check_index_type=False)
+    del store['frame']
+    assert 'frame' not in store_reopened
+    assert len(store) == 1
+
+
+def test_columnar_cache(tmp_path):
+    loader = Loader()
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        memoization=ColumnarCache(str(tmp_path)))(loader)
+    january = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    expected = get_values('A', january)
+    february = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 3, 1))
+    values = get_values('A', february)
+    assert loader.calls == [january, pd.Interval(pd.Timestamp(2021, 2, 1), pd.Timestamp(2021, 3, 1))]
+    pd.testing.assert_frame_equal(values.iloc[:len(expected)], expected)
+    f_cached = get_values(get_function_cachedQ=True)
+    info = f_cached.info()
+    assert info.miss == 2  # two fragments, the interval recorder is not cached
+    assert info.load == 1
+
+
+def test_concurrent_hits(tmp_path, monkeypatch):
+    loader = Loader()
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        memoization=ColumnarCache(str(tmp_path)))(loader)
+    january = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    for name in ['A', 'B']:
+        get_values(name, january)
+    # each read waits for the other one: served one at a time, they would time out
+    barrier = threading.Barrier(2, timeout=5)
+    getitem = ColumnarStore.__getitem__
+
+    def getitem_together(store, key):
+        barrier.wait()
+        return getitem(store, key)
+
+    monkeypatch.setattr(ColumnarStore, '__getitem__', getitem_together)
+    results = {}
+
+    def hit(name):
+        results[name] = get_values(name, january)
+
+    threads = [threading.Thread(target=hit, args=(name,)) for name in ['A', 'B']]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not barrier.broken
+    assert sorted(results) == ['A', 'B']
+    assert (results['B'].name == 'B').all()
+    assert len(loader.calls) == 2
+
+
+def test_warm_restart(tmp_path):
+    index_path = str(tmp_path / 'index.pkl')
+
+    def decorate(loader):
+        return MemoizationWithIntervals(
+            [], ['period'],
+            memoization=ColumnarCache(str(tmp_path / 'fragments')),
+            index_path=index_path)(loader)
+
+    loader = Loader()
+    get_values = decorate(loader)
+    january = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    february = pd.Interval(pd.Timestamp(2021, 2, 1), pd.Timestamp(2021, 3, 1))
+    get_values('A', january)
+    get_values('A', february)
+    # a fragment lost, e.g. evicted, while the process was down
+    f_cached = get_values(get_function_cachedQ=True)
+    del f_cached.__cache__()[f_cached.key('A', period=february)]
+    get_values.close()
+    # the restarted process plans against the fragments on disk
+    loader_restarted = Loader()
+    get_values_restarted = decorate(loader_restarted)
+    values = get_values_restarted('A', pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 3, 1)))
+    assert loader_restarted.calls == [february]
+    assert len(values) == (31 + 28) * 24
+
+
+def test_trim_table():
+    dates = pd.date_range(pd.Timestamp(2021, 1, 1), periods=10, freq='D')
+    table = pa.table({'date': dates, 'value': np.arange(10)})
+    trimmed = trim_table(table, 'date', pd.Interval(dates[2], dates[5]))
+    assert trimmed['value'].to_pylist() == [3, 4, 5]
+    # a slice sharing the buffers of the table
+    assert trimmed['value'].chunks[0].buffers()[1].address == table['value'].chunks[0].buffers()[1].address
+    shuffled = table.take([5, 1, 3, 8])
+    assert trim_table(shuffled, 'date', pd.Interval(dates[2], dates[5], closed='left'))['value'].to_pylist() == [3]
+    assert trim_table(table, 'date', pd.Interval(dates[-1], dates[-1] + pd.Timedelta('1D'))).num_rows == 0
+
+
+def test_arrow_aggregation(tmp_path):
+    loader = Loader()
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=concat_tables,
+        trim_on='date',
+        memoization=ColumnarCache(str(tmp_path), arrowQ=True))(loader)
+    january = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    february = pd.Interval(pd.Timestamp(2021, 2, 1), pd.Timestamp(2021, 3, 1))
+    get_values('A', january)
+    get_values('A', february)
+    values = get_values('A', pd.Interval(pd.Timestamp(2021, 1, 15), pd.Timestamp(2021, 3, 1)))
+    assert isinstance(values, pa.Table)
+    # a chunk by fragment, not concatenated
+    assert values['value'].num_chunks == 2
+    expected = loader('A', pd.Interval(pd.Timestamp(2021, 1, 15), pd.Timestamp(2021, 3, 1)))
+    assert len(loader.calls) == 3
+    # the values count the rows of each call
+    assert list(values.to_pandas()['date']) == list(expected['date'])
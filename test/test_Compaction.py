@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy])
+def test_compact(classrecorder, new_memoization, loader, days):
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        memoization=new_memoization())(loader)
+    for left, right in zip(days[:-1], days[1:]):
+        get_values('A', pd.Interval(left, right))
+        get_values('B', pd.Interval(left, right))
+    wide = pd.Interval(days[0], days[-1])
+    expected = get_values('A', wide)
+    assert get_values.compact() == 2
+    f_cached = get_values(get_function_cachedQ=True)
+    assert len(f_cached.__cache__()) == 2  # one entry per name
+    n_calls = len(loader.calls)
+    compacted = get_values('A', wide)
+    assert len(loader.calls) == n_calls
+    pd.testing.assert_frame_equal(compacted.reset_index(drop=True), expected.reset_index(drop=True))
+    # the merged interval keeps growing incrementally
+    get_values('A', pd.Interval(days[-1], days[-1] + pd.Timedelta('1D')))
+    assert get_values.compact() == 1
+    assert len(get_values('A', pd.Interval(days[0], days[-1] + pd.Timedelta('1D')))) == 11
+
+
+def test_compact_background(new_memoization, loader, days):
+    get_values = MemoizationWithIntervals(
+        [], ['period'],
+        memoization=new_memoization(),
+        compact_above=4)(loader)
+    for left, right in zip(days[:-1], days[1:]):
+        get_values('A', pd.Interval(left, right))
+    # the wide request is served from ten fragments, then compacted
+    get_values('A', pd.Interval(days[0], days[-1]))
+    # waits for the compaction running, if any
+    get_values.compact(backgroundQ=True).result()
+    f_cached = get_values(get_function_cachedQ=True)
+    assert len(f_cached.__cache__()) == 1
+    assert len(get_values('A', pd.Interval(days[0], days[-1]))) == 10
+    assert len(loader.calls) == 10
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.utils.Timer import Timer
+
+delay = 0.5
+
+
+def get_period(name, period=pd.Interval(0, 1)):
+    time.sleep(delay)  # simulating a long SQL request
+    return period
+
+
+########################################################################################################
+#
+#                     Testing concurrent fetching of the cache misses
+#
+########################################################################################################
+
+def test_parallel_misses(new_memoization):
+    get_period_parallel = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=list,
+        memoization=new_memoization(),
+        max_workers=4)(get_period)
+    for lower in [1, 3, 5]:
+        get_period_parallel('test', pd.Interval(lower, lower + 1))
+    with Timer() as timer:
+        periods = get_period_parallel('test', pd.Interval(0, 7))
+    # four gaps fetched concurrently, three hits
+    assert periods == [pd.Interval(k, k + 1) for k in range(7)]
+    assert timer.interval < 2 * delay
+    f_cached = get_period_parallel(get_function_cachedQ=True)
+    assert f_cached.info().miss == 7
+
+
+########################################################################################################
+#
+#                     Testing coalescing of concurrent fetches of a same interval
+#
+########################################################################################################
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, name, period=pd.Interval(0, 1)):
+        with self.lock:
+            self.calls.append(period)
+        time.sleep(delay)  # simulating a long SQL request
+        return period
+
+
+def test_coalesced_fetches(new_memoization):
+    loader = CountingLoader()
+    get_period_coalesced = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=list,
+        memoization=new_memoization())(loader)
+    results = {}
+
+    def request(name, period):
+        results[period] = get_period_coalesced(name, period)
+
+    first = threading.Thread(target=request, args=('test', pd.Interval(0, 4)))
+    second = threading.Thread(target=request, args=('test', pd.Interval(0, 6)))
+    first.start()
+    time.sleep(delay / 5)
+    # the second request waits for (0, 4] and only fetches (4, 6]
+    second.start()
+    first.join()
+    second.join()
+    assert sorted(loader.calls) == [pd.Interval(0, 4), pd.Interval(4, 6)]
+    assert results[pd.Interval(0, 6)] == [pd.Interval(0, 4), pd.Interval(4, 6)]
+    assert get_period_coalesced.flights.info().coalesced == 1
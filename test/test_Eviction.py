@@ -0,0 +1,39 @@
+import klepto
+import numpy as np
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals, ByteBudget
+from CacheIntervals.utils import sizeof
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, period=pd.Interval(0, 1)):
+        self.calls.append(period)
+        # a row per unit of the interval
+        return pd.DataFrame({'x': np.arange(period.left, period.right, dtype=np.int64)})
+
+
+def test_byte_budget():
+    loader = Loader()
+    # three frames of ten rows
+    budget = ByteBudget(3 * sizeof(loader('A', pd.Interval(0, 10))))
+    loader.calls = []
+    get_rows = MemoizationWithIntervals(
+        [], ['period'],
+        memoization=klepto.inf_cache(
+            cache=klepto.archives.dict_archive(),
+            keymap=klepto.keymaps.stringmap(typed=False, flat=False)),
+        eviction=budget)(loader)
+    for lower in range(0, 40, 10):
+        get_rows('A', pd.Interval(lower, lower + 10))
+    assert budget.info().evictions == 1
+    assert budget.info().size == 3
+    # the fragment evicted is fetched again, and only it
+    rows = get_rows('A', pd.Interval(0, 40))
+    assert loader.calls[4:] == [pd.Interval(0, 10)]
+    assert rows['x'].tolist() == list(range(40))
+    f_cached = get_rows(get_function_cachedQ=True)
+    assert len(f_cached.__cache__()) == 3
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import time
+
+import klepto
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.KeyMaps import FastKeyMap
+from CacheIntervals.MemoizationIntervals import QueryRecorder
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+
+def test_recorders_not_evicted(new_memoization, period_loader):
+    memoization = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=lambda results: sum(results, []),
+        memoization=new_memoization())
+    get_periods = memoization(period_loader)
+    get_periods('A', pd.Interval(0, 1))
+    # the recorders are in their registry, not in the cache
+    f_cached = get_periods(get_function_cachedQ=True)
+    assert len(f_cached.__cache__()) == 1
+    assert f_cached.key('A', period=QueryRecorder()) in memoization.index
+    get_periods('A', pd.Interval(0, 2))
+    assert period_loader.calls == [pd.Interval(0, 1), pd.Interval(1, 2)]
+
+
+def test_max_recorders(period_loader):
+    memoization = MemoizationWithIntervals([], ['period'], aggregation=lambda results: sum(results, []), max_recorders=2)
+    get_periods = memoization(period_loader)
+    for name in 'ABA':
+        get_periods(name, pd.Interval(0, 1))
+    get_periods('C', pd.Interval(0, 1))
+    # B was the least recently used
+    assert memoization.index.info() == (2, 2, 1)
+    get_periods('B', pd.Interval(0, 2))
+    # the intervals of B are planned again, the results still cached are served
+    assert period_loader.calls == [pd.Interval(0, 1)] * 3 + [pd.Interval(0, 2)]
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy])
+def test_reconcile(classrecorder, new_memoization, period_loader):
+    memoization = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=lambda results: sum(results, []),
+        memoization=new_memoization())
+    get_periods = memoization(period_loader)
+    for lower in range(4):
+        get_periods('A', pd.Interval(lower, lower + 1))
+    f_cached = get_periods(get_function_cachedQ=True)
+    del f_cached.__cache__()[f_cached.key('A', period=pd.Interval(1, 2))]
+    assert memoization.reconcile(f_cached) == 1
+    (args_with_ri, kwargs_with_ri), = memoization.recorders()
+    assert kwargs_with_ri['period'].fragments() == [pd.Interval(0, 1), pd.Interval(2, 3), pd.Interval(3, 4)]
+    assert get_periods('A', pd.Interval(0, 4)) == [pd.Interval(k, k + 1) for k in range(4)]
+    assert period_loader.calls[4:] == [pd.Interval(1, 2)]
+
+
+def test_index_unpicklable_arguments(tmp_path):
+    index_path = str(tmp_path / 'index.pkl')
+    archive = klepto.archives.dict_archive()
+    conn = sqlite3.connect(':memory:')
+
+    def get_periods(conn, name, period=pd.Interval(0, 1)):
+        calls.append(period)
+        return [period]
+
+    def decorate(tokens):
+        # each process has a keymap of its own
+        return MemoizationWithIntervals(
+            [], ['period'],
+            aggregation=lambda results: sum(results, []),
+            memoization=klepto.lru_cache(cache=archive, keymap=FastKeyMap(tokens)),
+            index_path=index_path)(get_periods)
+
+    # the connection is keyed by a token function, the same in every process
+    tokens = {sqlite3.Connection: lambda conn: 'memory'}
+    calls = []
+    get_periods_cached = decorate(tokens)
+    get_periods_cached(conn, 'A', pd.Interval(0, 2))
+    get_periods_cached(conn, 'B', pd.Interval(0, 1))
+    get_periods_cached.close()
+    # the restarted process plans against the recorders saved
+    calls = []
+    get_periods_restarted = decorate(tokens)
+    assert get_periods_restarted(conn, 'A', pd.Interval(0, 3)) == [pd.Interval(0, 2), pd.Interval(2, 3)]
+    assert calls == [pd.Interval(2, 3)]
+    get_periods_restarted.close()
+    # the recorders of B, not requested yet, are saved again
+    calls = []
+    assert decorate(tokens)(conn, 'B', pd.Interval(0, 1)) == [pd.Interval(0, 1)]
+    assert calls == []
+    # the identity tokens differ from one process to the other:
+    # without a token function, nothing saved is found again
+    calls = []
+    assert decorate(None)(conn, 'B', pd.Interval(0, 1)) == [pd.Interval(0, 1)]
+    assert calls == [pd.Interval(0, 1)]
+
+
+def test_index_delayed(tmp_path, period_loader):
+    index_path = str(tmp_path / 'index.pkl')
+    memoization = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=lambda results: sum(results, []),
+        index_path=index_path,
+        index_delay=0.2)
+    get_periods = memoization(period_loader)
+    for lower in range(10):
+        get_periods('A', pd.Interval(lower, lower + 1))
+    # the requests of the delay are saved at once, in the background
+    assert not os.path.exists(index_path)
+    time.sleep(0.5)
+    assert os.path.exists(index_path) and not memoization.dirtyQ
+    mtime = os.stat(index_path).st_mtime_ns
+    # nothing stored, nothing saved
+    get_periods('A', pd.Interval(0, 10))
+    get_periods.close()
+    assert os.stat(index_path).st_mtime_ns == mtime
+    get_periods('A', pd.Interval(0, 11))
+    get_periods.close()
+    assert memoization.index_timer is None and os.stat(index_path).st_mtime_ns > mtime
@@ -0,0 +1,57 @@
+import sqlite3
+
+import klepto
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.KeyMaps import FastKeyMap
+
+
+def test_keys():
+    keymap = FastKeyMap()
+    period = pd.Interval(pd.Timestamp(2021, 1, 1, tz='UTC'), pd.Timestamp(2021, 1, 2, tz='UTC'))
+    assert keymap('a', period=period) == keymap('a', period=pd.Interval(period.left, period.right))
+    assert keymap('a', period=period) != keymap('a', period=pd.Interval(period.left, period.right, closed='both'))
+    assert keymap(pd.Timestamp(2021, 1, 1)) != keymap(pd.Timestamp(2021, 1, 1, tz='UTC'))
+    assert keymap(True) != keymap(1)
+    # the containers are told apart from the tags of the others
+    assert keymap(('B', True)) != keymap(True)
+    assert keymap(('L', ('a',))) != keymap(['a'])
+    assert keymap((True,)) != keymap((1,))
+    assert keymap(('a', 1)) == keymap(('a', 1))
+    assert keymap(['a', 'b'], {'x': [1]}) == keymap(['a', 'b'], {'x': [1]})
+    df = pd.DataFrame({'x': [1, 2]})
+    assert keymap(df) == keymap(df.copy())
+    assert keymap(df) != keymap(df + 1)
+    hash(keymap(['a'], {'x': {1, 2}}, df=df))
+
+
+def test_identity_tokens():
+    keymap = FastKeyMap()
+    con, other = sqlite3.connect(':memory:'), sqlite3.connect(':memory:')
+    assert keymap(con) == keymap(con)
+    assert keymap(con) != keymap(other)
+    # the same token for all the connections, e.g. to a same database
+    keymap.register(sqlite3.Connection, lambda con: 'db')
+    assert keymap(con) == keymap(other)
+    assert keymap(con) == FastKeyMap(tokens={sqlite3.Connection: lambda con: 'db'})(con)
+
+
+def test_memoization():
+    calls = []
+
+    def get_period(con, name, period=pd.Interval(0, 1)):
+        calls.append(period)
+        return [period]
+
+    get_period_cached = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=lambda results: sum(results, []),
+        memoization=klepto.lru_cache(
+            maxsize=500,
+            cache=klepto.archives.dict_archive(),
+            keymap=FastKeyMap()))(get_period)
+    con = sqlite3.connect(':memory:')
+    get_period_cached(con, 'test', pd.Interval(0, 2))
+    assert get_period_cached(con, 'test', pd.Interval(0, 3)) == [pd.Interval(0, 2), pd.Interval(2, 3)]
+    assert calls == [pd.Interval(0, 2), pd.Interval(2, 3)]
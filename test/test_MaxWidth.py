@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+recorders = [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy]
+days = pd.date_range('2021-01-01', periods=30, freq='D')
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+def test_chunks(classrecorder):
+    recorder = classrecorder(max_width=pd.Timedelta(days=10))
+    calls = recorder(pd.Interval(days[0], days[25]))
+    assert calls == [pd.Interval(days[0], days[10]), pd.Interval(days[10], days[20]),
+                     pd.Interval(days[20], days[25])]
+    # each chunk is stored on its own
+    assert recorder.fragments() == calls
+    calls = recorder(pd.Interval(days[0], days[29], closed='both'))
+    assert calls[-1] == pd.Interval(days[25], days[29])
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+def test_chunks_closed(classrecorder):
+    recorder = classrecorder(max_width=10)
+    # a closed interval of max_width is not split
+    assert recorder(pd.Interval(0, 10, closed='both')) == [pd.Interval(0, 10, closed='both')]
+    # its upper bound belongs to the last chunk
+    assert recorder(pd.Interval(20, 40, closed='both')) == [pd.Interval(20, 30, closed='left'),
+                                                            pd.Interval(30, 40, closed='both')]
+    assert recorder(pd.Interval(50, 75, closed='both')) == [pd.Interval(50, 60, closed='left'),
+                                                            pd.Interval(60, 70, closed='left'),
+                                                            pd.Interval(70, 75, closed='both')]
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+def test_chunks_tolerance(classrecorder):
+    recorder = classrecorder(max_width=4, rounding=1)
+    # the last unit is left to the previous chunk, not dropped
+    assert recorder(pd.Interval(0, 9, closed='left')) == [pd.Interval(0, 4, closed='left'),
+                                                          pd.Interval(4, 9, closed='left')]
+
+
+def test_chunked_fetches():
+    calls = []
+
+    def get_period(name, period=pd.Interval(0, 1)):
+        calls.append(period)
+        return [period]
+
+    get_period_chunked = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=lambda results: sum(results, []),
+        max_workers=4,
+        max_width=10)(get_period)
+    assert get_period_chunked('A', pd.Interval(0, 35)) == [pd.Interval(0, 10), pd.Interval(10, 20),
+                                                           pd.Interval(20, 30), pd.Interval(30, 35)]
+    assert sorted(calls) == [pd.Interval(0, 10), pd.Interval(10, 20), pd.Interval(20, 30), pd.Interval(30, 35)]
@@ -0,0 +1,69 @@
+import asyncio
+
+import pandas as pd
+
+from CacheIntervals import MemoizationWithIntervals, AsyncMemoizationWithIntervals, Metrics
+from CacheIntervals.Metrics import Histogram
+
+
+def get_rows(name, period=pd.Interval(0, 10)):
+    return pd.DataFrame({'x': range(int(period.left), int(period.right))})
+
+
+def test_metrics():
+    requests = []
+    metrics = Metrics(callback=requests.append)
+    get_rows_cached = MemoizationWithIntervals([], ['period'], aggregation=pd.concat, metrics=metrics)(get_rows)
+    get_rows_cached('A', pd.Interval(0, 10))
+    get_rows_cached('A', pd.Interval(0, 40))
+    assert (requests[1].hits, requests[1].misses) == (1, 1)
+    assert (requests[1].rows_cached, requests[1].rows_fetched) == (10, 30)
+    assert requests[1].coverage == 0.25
+    info = get_rows_cached.metrics.info()
+    assert (info.requests, info.hits, info.misses) == (2, 1, 2)
+    assert info.rows_fetched == 40 and info.bytes_cached > 0
+    assert info.coverage == (0 + 0.25) / 2
+    latencies = metrics.latencies()
+    assert set(latencies) == {'bind', 'plan', 'lookup', 'fetch', 'aggregate'}
+    assert all(histogram.count == 2 for histogram in latencies.values())
+    assert latencies['fetch'].total > 0
+    # the fragment cached is measured within the request
+    get_rows_cached('A', pd.Interval(30, 50))
+    assert (requests[2].hits, requests[2].misses) == (1, 1)
+    assert requests[2].coverage == 0.5
+
+
+def test_trimmed_metrics():
+    requests = []
+    get_rows_cached = MemoizationWithIntervals([], ['period'], aggregation=pd.concat, trim_on='x',
+                                               metrics=Metrics(callback=requests.append))(get_rows)
+    get_rows_cached('A', pd.Interval(0, 10))
+    get_rows_cached('A', pd.Interval(5, 20))
+    # the rows are counted once trimmed to the interval requested
+    assert (requests[1].rows_cached, requests[1].rows_fetched) == (4, 10)
+    list(get_rows_cached.stream('A', pd.Interval(15, 20)))
+    assert (requests[2].rows_cached, requests[2].rows_fetched) == (4, 0)
+
+
+def test_async_metrics():
+    metrics = Metrics()
+
+    async def get_rows_async(name, period=pd.Interval(0, 10)):
+        return get_rows(name, period)
+
+    get_rows_cached = AsyncMemoizationWithIntervals([], ['period'], aggregation=pd.concat,
+                                                    metrics=metrics)(get_rows_async)
+    asyncio.run(get_rows_cached('B', pd.Interval(0, 10)))
+    asyncio.run(get_rows_cached('B', pd.Interval(5, 20)))
+    info = metrics.info()
+    assert (info.hits, info.misses, info.rows_cached, info.rows_fetched) == (1, 2, 10, 20)
+
+
+def test_histogram():
+    histogram = Histogram()
+    for seconds in [1e-5] * 90 + [1e-2] * 10:
+        histogram.observe(seconds)
+    info = histogram.info()
+    assert info.count == 100 and info.max == 1e-2
+    assert 1e-5 <= info.p50 < 2e-5
+    assert 1e-2 <= info.p99 <= 1e-2 * 2
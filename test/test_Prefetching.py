@@ -0,0 +1,96 @@
+import time
+
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals, Metrics, StridePrefetcher
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+recorders = [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy]
+start = pd.Timestamp(2021, 1, 1)
+hour = pd.Timedelta(hours=1)
+
+
+def window(k, step=pd.Timedelta(minutes=5)):
+    return pd.Interval(start + k * step, start + k * step + 24 * hour)
+
+
+def test_strides():
+    prefetcher = StridePrefetcher(history=2)
+    assert prefetcher.observe('A', (window(0),)) == []
+    assert prefetcher.observe('A', (window(1),)) == []
+    assert prefetcher.observe('A', (window(2),)) == [(window(3),)]
+    # irregular
+    assert prefetcher.observe('A', (window(5),)) == []
+    # a request repeated does not move
+    for _ in range(3):
+        assert prefetcher.observe('B', (window(0),)) == []
+    # expanding: only the upper bound moves
+    for k in range(3):
+        predicted = prefetcher.observe('C', (pd.Interval(0, 10 * (k + 1)),))
+    assert predicted == [(pd.Interval(0, 40),)]
+    tolerant = StridePrefetcher(history=2, ahead=2, tolerance=pd.Timedelta(seconds=5))
+    jitter = pd.Timedelta(seconds=2)
+    tolerant.observe('A', (window(0),))
+    tolerant.observe('A', (pd.Interval(window(1).left + jitter, window(1).right + jitter),))
+    assert len(tolerant.observe('A', (window(2),))) == 2
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+def test_prefetching(classrecorder):
+    calls = []
+
+    def get_minutes(name, period=window(0)):
+        calls.append(period)
+        dates = pd.date_range(period.left, period.right, freq='min', inclusive='right')
+        return pd.DataFrame({'date': dates, 'name': name})
+
+    metrics = Metrics()
+    prefetcher = StridePrefetcher()
+    get_minutes_cached = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=pd.concat,
+        trim_on='date',
+        metrics=metrics,
+        prefetching=prefetcher)(get_minutes)
+    for k in range(4):
+        get_minutes_cached('A', window(k))
+    prefetcher.wait()
+    assert metrics.info().misses == 4
+    assert calls[-1] == pd.Interval(window(3).right, window(4).right)
+    for k in range(4, 10):
+        df = get_minutes_cached('A', window(k))
+        assert len(df) == 24 * 60
+        prefetcher.wait()
+    # the foreground requests are pure hits
+    assert metrics.info().misses == 4
+    assert prefetcher.info().prefetched == 7
+
+
+def test_prefetching_live():
+    step = pd.Timedelta(milliseconds=200)
+    tick = pd.Timedelta(milliseconds=10)
+
+    def get_live(name, period=window(0)):
+        # the rows up to now only
+        now = pd.Timestamp.now()
+        dates = pd.date_range(period.left.ceil(tick), period.right, freq=tick)
+        dates = dates[(dates > period.left) & (dates <= min(period.right, now))]
+        return pd.DataFrame({'date': dates, 'name': name})
+
+    prefetcher = StridePrefetcher()
+    get_live_cached = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=pd.concat,
+        trim_on='date',
+        prefetching=prefetcher)(get_live)
+    base = pd.Timestamp.now().ceil(step) + step
+    for k in range(8):
+        right = base + k * step
+        time.sleep(max(0., (right - pd.Timestamp.now()).total_seconds()))
+        assert len(get_live_cached('A', pd.Interval(right - 10 * step, right))) == 200
+    assert prefetcher.info().predictions > 0
+    prefetcher.wait()
@@ -0,0 +1,76 @@
+import pandas as pd
+import portion
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.RecordBox import RecordBoxes
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+
+
+def box(l0, u0, l1, u1):
+    return pd.Interval(l0, u0), pd.Interval(l1, u1)
+
+
+def test_record_boxes():
+    recorder = RecordBoxes()
+    assert recorder(box(0, 10, 0, 10)) == [box(0, 10, 0, 10)]
+    assert recorder(box(0, 10, 0, 10)) == [box(0, 10, 0, 10)]
+    # the L-shaped gap in two boxes
+    assert recorder(box(0, 20, 0, 20)) == [box(0, 10, 0, 10), box(0, 10, 10, 20), box(10, 20, 0, 20)]
+    # a hole in the middle: the boxes around it
+    assert recorder(box(-10, 30, 5, 15)) == [box(-10, 0, 5, 15), box(0, 10, 0, 10), box(0, 10, 10, 20),
+                                             box(10, 20, 0, 20), box(20, 30, 5, 15)]
+    assert len(recorder.fragments()) == 5
+    recorder.remove(box(10, 20, 0, 20))
+    assert recorder(box(12, 14, 1, 2)) == [box(12, 14, 1, 2)]
+    # a box not stored, e.g. evicted after its recorder was dropped
+    recorder.remove(box(100, 200, 0, 20))
+    assert len(recorder.fragments()) == 5
+
+
+def test_record_boxes_overlapping():
+    recorder = RecordBoxes()
+    # a long box first, then a row of boxes after it
+    recorder(box(0, 100, 0, 1))
+    for k in range(10):
+        recorder(box(k * 10, (k + 1) * 10, 1, 2))
+    for lower, upper in [(0, 5), (42, 47), (95, 120), (100, 110), (200, 210)]:
+        request = RecordBoxes.to_portion(box(lower, upper, 0, 2))
+        expected = [k for k, stored in enumerate(recorder.boxes)
+                    if all(not (i & s).empty for i, s in zip(request, stored))]
+        assert recorder.overlapping(request) == expected
+    # the boxes ending before the request are skipped
+    assert recorder.overlapping(RecordBoxes.to_portion(box(200, 210, 0, 2))) == []
+    assert recorder.overlapping(RecordBoxes.to_portion(box(101, 102, 0, 2))) == []
+
+
+def test_record_boxes_portion():
+    recorder = RecordBoxes()
+    recorder((portion.closed(0, 10), portion.closed(0, 10)))
+    # the bounds of the box stored are excluded from the gaps
+    assert recorder((portion.closed(0, 20), portion.closed(0, 10))) == \
+           [(portion.closed(0, 10), portion.closed(0, 10)), (portion.openclosed(10, 20), portion.closed(0, 10))]
+
+
+def count_calls(classrecorder, requests):
+    calls = []
+
+    def function_with_interval_params(interval0, interval1):
+        calls.append((interval0, interval1))
+        return 0
+
+    cached = MemoizationWithIntervals([0, 1], aggregation=list, classrecorder=classrecorder)(
+        function_with_interval_params)
+    for request in requests:
+        cached(*request)
+    return calls
+
+
+def test_fewer_calls():
+    requests = [box(0, 10, 0, 10), box(5, 15, 5, 15), box(0, 20, 0, 20)]
+    calls_boxes = count_calls(RecordBoxes, requests)
+    calls_product = count_calls(RecordIntervalsPandas, requests)
+    assert len(calls_boxes) < len(calls_product)
+    # each point is fetched once
+    for x in [1, 7, 12, 17]:
+        for y in [1, 7, 12, 17]:
+            assert sum(x in i0 and y in i1 for i0, i1 in calls_boxes) == 1
@@ -0,0 +1,71 @@
+import itertools
+import random
+
+import portion
+import pendulum as pdl
+import pandas as pd
+
+from CacheIntervals.RecordInterval import RecordIntervals
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexed, RecordIntervalsIndexedPandas
+
+
+def random_interval(rng):
+    lower = rng.randint(-30, 30)
+    upper = lower + rng.randint(0, 10)
+    interval = rng.choice([portion.closed, portion.open, portion.closedopen, portion.openclosed])(lower, upper)
+    return interval if not interval.empty else portion.closed(lower, upper)
+
+
+def test_RII_0():
+    # Same as test_RI_0 with the indexed recorder
+    itvals = RecordIntervalsIndexed()
+    itvals(portion.closed(-2, 0))
+    itvals(portion.closed(-1, 0))
+    itvals(portion.closed(-3, -1))
+    itvals(portion.closed(-5, -4))
+    calls = itvals(portion.closed(-6, 0))
+    expected = [portion.closedopen(-6, -5),
+                portion.closed(-5, -4),
+                portion.open(-4, -3),
+                portion.closedopen(-3, -2),
+                portion.closed(-2, 0),
+                ]
+    assert calls == expected
+
+
+def test_RIIP_strategies():
+    # Same as the test_RIP_* tests with the indexed recorder
+    expected = {(False, False): [pd.Interval(-6, -4),
+                                 pd.Interval(-4, -3),
+                                 pd.Interval(-3, -2),
+                                 pd.Interval(-2, 0)],
+                (True, False): [pd.Interval(-5, -3),
+                                pd.Interval(-3, -2),
+                                pd.Interval(-2, -1)],
+                (True, True): [pd.Interval(-5, -4),
+                               pd.Interval(-4, -3),
+                               pd.Interval(-3, -2),
+                               pd.Interval(-2, -1)]}
+    for (subQ, minQ), expected_calls in expected.items():
+        itvals = RecordIntervalsIndexedPandas(subintervals_requiredQ=subQ, subinterval_minQ=minQ)
+        itvals(pd.Interval(-2, 0))
+        itvals(pd.Interval(-3, -2))
+        itvals(pd.Interval(-6, -4))
+        calls = itvals(pd.Interval(-5, -1))
+        assert calls == expected_calls
+
+
+def test_RII_same_calls_as_RI(monkeypatch):
+    # The stored values are times of call: make them deterministic
+    # so that both recorders group the stored intervals identically
+    counter = itertools.count()
+    monkeypatch.setattr(pdl, 'now', lambda: next(counter))
+    rng = random.Random(0)
+    for subQ, minQ in [(False, False), (True, False), (True, True)]:
+        for _ in range(50):
+            itvals = RecordIntervals(None, subQ, minQ)
+            itvals_indexed = RecordIntervalsIndexed(None, subQ, minQ)
+            for _ in range(15):
+                i = random_interval(rng)
+                assert itvals(i) == itvals_indexed(i)
+                assert itvals.intervals.domain() == itvals_indexed.intervals.domain()
@@ -0,0 +1,86 @@
+import itertools
+import random
+
+import pendulum as pdl
+import pandas as pd
+
+from CacheIntervals.utils.Dates import pdl2pd
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+
+def random_interval(rng, origin=None):
+    lower = rng.randint(-30, 30)
+    upper = lower + rng.randint(0, 10)
+    closed = rng.choice(['both', 'left', 'right', 'neither']) if lower < upper else 'both'
+    if origin is None:
+        return pd.Interval(lower, upper, closed=closed)
+    return pd.Interval(origin + pd.Timedelta(hours=lower), origin + pd.Timedelta(hours=upper), closed=closed)
+
+
+def test_RIN_0():
+    # Same as test_RIP_0 with the numpy recorder
+    itvals = RecordIntervalsNumpy()
+    itvals(pd.Interval(-2, 0))
+    itvals(pd.Interval(-3, -2))
+    itvals(pd.Interval(-6, -4))
+    calls = itvals(pd.Interval(-5, -1))
+    expected = [pd.Interval(-6, -4),
+                pd.Interval(-4, -3),
+                pd.Interval(-3, -2),
+                pd.Interval(-2, 0),
+                ]
+    assert calls == expected
+
+
+def test_RIN_1():
+    # test RecordIntervalsNumpy with dates
+    itvals = RecordIntervalsNumpy()
+    itvals(pd.Interval(pdl2pd(pdl.yesterday()), pdl2pd(pdl.today())))
+    calls = itvals(pd.Interval(pdl2pd(pdl.yesterday().add(days=-1)), pdl2pd(pdl.tomorrow())))
+    expected = [pd.Interval(pdl2pd(pdl.yesterday().add(days=-1)), pdl2pd(pdl.yesterday())),
+                pd.Interval(pdl2pd(pdl.yesterday()), pdl2pd(pdl.today())),
+                pd.Interval(pdl2pd(pdl.today()), pdl2pd(pdl.tomorrow()))]
+    assert calls == expected
+
+
+def test_RIN_same_calls_as_RIP(monkeypatch):
+    counter = itertools.count()
+    monkeypatch.setattr(pdl, 'now', lambda: next(counter))
+    rng = random.Random(0)
+    origin = pd.Timestamp(2021, 1, 1, tz='UTC')
+    for subQ, minQ in [(False, False), (True, False), (True, True)]:
+        for origin, rounding in [(None, None), (None, 2), (origin, None), (origin, pd.Timedelta('2h'))]:
+            for _ in range(20):
+                itvals = RecordIntervalsPandas(rounding, subQ, minQ)
+                itvals_numpy = RecordIntervalsNumpy(rounding, subQ, minQ)
+                for _ in range(15):
+                    i = random_interval(rng, origin)
+                    assert itvals(i) == itvals_numpy(i)
+
+
+def test_RIN_far_timestamps():
+    # the doubled lattice of nanoseconds would overflow beyond 2116
+    t = pd.Timestamp(2021, 1, 1)
+    requests = [pd.Interval(t, pd.Timestamp(2200, 1, 1)),
+                pd.Interval(pd.Timestamp(1800, 1, 1), pd.Timestamp(2250, 1, 1)),
+                pd.Interval(pd.Timestamp(1700, 1, 1, tz='UTC'), pd.Timestamp(2021, 1, 1, tz='UTC'))]
+    for request in requests:
+        itvals_numpy = RecordIntervalsNumpy(subintervals_requiredQ=True)
+        itvals_pandas = RecordIntervalsPandas(subintervals_requiredQ=True)
+        for i in [request, pd.Interval(request.left + pd.Timedelta(days=1), request.right + pd.Timedelta(days=1))]:
+            assert itvals_numpy(i) == itvals_pandas(i)
+
+
+def test_RIN_finer_unit():
+    # a Timestamp in nanoseconds rescales the microseconds stored
+    t = pd.Timestamp(2021, 1, 1)
+    us, ns = pd.Timedelta(microseconds=1), pd.Timedelta(nanoseconds=1)
+    requests = [pd.Interval(t, t + 10 * us, closed='left'),
+                pd.Interval(t + 20 * us, t + 30 * us, closed='neither'),
+                pd.Interval((t + 5 * us).as_unit('ns'), (t + 25 * us + ns).as_unit('ns'), closed='both')]
+    itvals_numpy = RecordIntervalsNumpy(subintervals_requiredQ=True, subinterval_minQ=True)
+    itvals_pandas = RecordIntervalsPandas(subintervals_requiredQ=True, subinterval_minQ=True)
+    for i in requests:
+        assert itvals_numpy(i) == itvals_pandas(i)
+    assert itvals_numpy.unit == 'ns'
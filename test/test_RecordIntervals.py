@@ -93,3 +93,35 @@ def test_RIP_1():
                 pd.Interval(pdl2pd(pdl.today()), pdl2pd(pdl.tomorrow()))]
     for a, b in zip(calls, expected):
         assert a == b
+
+
+def test_RI_threads():
+    # Concurrent planning on a same recorder
+    import sys
+    import random
+    import threading
+    itvals = RecordIntervals()
+    failures = []
+
+    def plan(seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            lower = rng.randint(-50, 50)
+            i = portion.closed(lower, lower + rng.randint(1, 10))
+            calls = itvals(i)
+            covered = portion.empty()
+            for call in calls:
+                # the calls are disjoint and cover the requested interval
+                if not (covered & call).empty: failures.append((i, calls))
+                covered |= call
+            if i not in covered: failures.append((i, calls))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=plan, args=(seed,)) for seed in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert failures == []
@@ -0,0 +1,63 @@
+import types
+
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals, Metrics
+from CacheIntervals.RecordInterval import RecordIntervalsPandas
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+recorders = [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy]
+start = pd.Timestamp(2021, 1, 1)
+day = pd.Timedelta(days=1)
+
+
+def get_days(name, period=pd.Interval(start, start + 10 * day)):
+    dates = pd.date_range(period.left, period.right, freq='D', inclusive='right')
+    return pd.DataFrame({'date': dates, 'name': name})
+
+
+@pytest.mark.parametrize('classrecorder', recorders)
+@pytest.mark.parametrize('max_workers', [None, 2])
+def test_stream(classrecorder, max_workers):
+    metrics = Metrics()
+    get_days_cached = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=pd.concat,
+        trim_on='date',
+        max_workers=max_workers,
+        metrics=metrics)(get_days)
+    for lower, upper in [(3, 5), (8, 12), (15, 16)]:
+        get_days_cached('A', pd.Interval(start + lower * day, start + upper * day))
+    period = pd.Interval(start + 4 * day, start + 20 * day)
+    fragments = get_days_cached.stream('A', period)
+    assert isinstance(fragments, types.GeneratorType)
+    fragments = list(fragments)
+    # the cached fragments trimmed and the gaps, in order
+    assert len(fragments) == 6
+    assert all(fragment['date'].is_monotonic_increasing for fragment in fragments)
+    assert all(previous['date'].max() < fragment['date'].min()
+               for previous, fragment in zip(fragments, fragments[1:]))
+    # the recorders may not keep the resolution of the dates
+    assert list(pd.concat(fragments)['date']) == list(get_days('A', period)['date'])
+    assert metrics.info().requests == 4
+    assert metrics.info().misses == 3 + 3
+
+
+def test_stream_stopped():
+    calls = []
+
+    def get_days_logged(name, period=None):
+        calls.append(period)
+        return get_days(name, period)
+
+    get_days_cached = MemoizationWithIntervals([], ['period'], aggregation=pd.concat)(get_days_logged)
+    get_days_cached('A', pd.Interval(start + 5 * day, start + 10 * day))
+    fragments = get_days_cached.stream('A', pd.Interval(start, start + 20 * day))
+    first = next(fragments)
+    assert first['date'].max() == start + 5 * day
+    fragments.close()
+    # the fragments not yet served are not fetched
+    assert len(calls) == 2
@@ -0,0 +1,78 @@
+import pandas as pd
+import pendulum as pdl
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.RecordInterval import RecordIntervalsPandas, ttl_recent
+from CacheIntervals.RecordIntervalIndexed import RecordIntervalsIndexedPandas
+from CacheIntervals.RecordIntervalNumpy import RecordIntervalsNumpy
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, period=pd.Interval(0, 1)):
+        self.calls.append(period)
+        return [(period, len(self.calls))]
+
+
+class Clock:
+    '''the time of the calls stored by the recorders'''
+    def __init__(self, monkeypatch):
+        self.now = pdl.datetime(2021, 1, 1)
+        monkeypatch.setattr(pdl, 'now', lambda tz=None: self.now)
+        monkeypatch.setattr('time.time', lambda: self.now.timestamp())
+
+    def advance(self, **kwargs):
+        self.now = self.now.add(**kwargs)
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy])
+def test_ttl(classrecorder, monkeypatch, new_memoization):
+    clock = Clock(monkeypatch)
+    loader = Loader()
+    get_periods = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=lambda results: sum(results, []),
+        memoization=new_memoization(),
+        # the intervals above 10 are live data
+        ttl=lambda i: pd.Timedelta(minutes=5) if i.right > 10 else None)(loader)
+    get_periods('A', pd.Interval(0, 10))
+    clock.advance(minutes=1)
+    get_periods('A', pd.Interval(10, 20))
+    clock.advance(minutes=1)
+    assert get_periods('A', pd.Interval(0, 20)) == [(pd.Interval(0, 10), 1), (pd.Interval(10, 20), 2)]
+    clock.advance(minutes=5)
+    # only the live fragment is fetched again
+    assert get_periods('A', pd.Interval(0, 20)) == [(pd.Interval(0, 10), 1), (pd.Interval(10, 20), 3)]
+    assert loader.calls == [pd.Interval(0, 10), pd.Interval(10, 20), pd.Interval(10, 20)]
+
+
+def test_ttl_recent():
+    ttl = ttl_recent(pd.Timedelta(minutes=5), pd.Timedelta(days=7))
+    now = pd.Timestamp.now(tz='UTC')
+    assert ttl(pd.Interval(now - pd.Timedelta(days=1), now)) == pd.Timedelta(minutes=5)
+    assert ttl(pd.Interval(now - pd.Timedelta(days=30), now - pd.Timedelta(days=20))) is None
+
+
+@pytest.mark.parametrize('classrecorder', [RecordIntervalsPandas, RecordIntervalsIndexedPandas, RecordIntervalsNumpy])
+def test_ttl_compaction(classrecorder, monkeypatch, new_memoization):
+    clock = Clock(monkeypatch)
+    loader = Loader()
+    get_periods = MemoizationWithIntervals(
+        [], ['period'],
+        classrecorder=classrecorder,
+        aggregation=lambda results: sum(results, []),
+        memoization=new_memoization(),
+        ttl=pd.Timedelta(minutes=5))(loader)
+    get_periods('A', pd.Interval(0, 10))
+    clock.advance(minutes=2)
+    get_periods('A', pd.Interval(10, 20))
+    clock.advance(minutes=2)
+    assert get_periods.compact() == 1
+    # the merged interval expires with its oldest fragment
+    clock.advance(minutes=2)
+    get_periods('A', pd.Interval(0, 20))
+    assert loader.calls == [pd.Interval(0, 10), pd.Interval(10, 20), pd.Interval(0, 20)]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CacheIntervals import MemoizationWithIntervals
+from CacheIntervals.utils import trim_frame
+
+
+def get_prices(name, period=pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 1, 2))):
+    dates = pd.date_range(period.left, period.right, freq='h')
+    return pd.DataFrame({'date': dates, 'price': np.arange(len(dates), dtype=float)})
+
+
+def test_trim_frame():
+    df = pd.DataFrame({'x': [0, 1, 2, 3, 4]})
+    assert trim_frame(df, 'x', pd.Interval(1, 3, closed='right'))['x'].tolist() == [2, 3]
+    assert trim_frame(df, 'x', pd.Interval(1, 3, closed='both'))['x'].tolist() == [1, 2, 3]
+    assert trim_frame(df, 'x', pd.Interval(1, 3, closed='neither'))['x'].tolist() == [2]
+    unsorted = df.iloc[::-1]
+    assert trim_frame(unsorted, 'x', pd.Interval(1, 3, closed='left'))['x'].tolist() == [2, 1]
+    assert trim_frame(df.set_index('x'), 'x', pd.Interval(3, 9)).index.tolist() == [4]
+    assert trim_frame('not a frame', 'x', pd.Interval(1, 3)) == 'not a frame'
+
+
+def test_trim_on(new_memoization):
+    get_prices_trimmed = MemoizationWithIntervals(
+        [], ['period'],
+        aggregation=pd.concat,
+        memoization=new_memoization(),
+        trim_on='date')(get_prices)
+    month = pd.Interval(pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 2, 1))
+    get_prices_trimmed('EUR', month)
+    day = pd.Interval(pd.Timestamp(2021, 1, 10), pd.Timestamp(2021, 1, 11))
+    prices = get_prices_trimmed('EUR', day)
+    # the whole month stored is served, sliced to the day requested
+    assert prices['date'].min() == pd.Timestamp(2021, 1, 10, 1)
+    assert prices['date'].max() == pd.Timestamp(2021, 1, 11)
+    assert len(prices) == 24
+    f_cached = get_prices_trimmed(get_function_cachedQ=True)
+    assert f_cached.info().miss == 1  # the month
+
+
+def test_trim_on_without_interval():
+    with pytest.raises(ValueError):
+        MemoizationWithIntervals([], [], aggregation=pd.concat, trim_on='date')